@@ -0,0 +1,116 @@
+# ============================================================================
+# SAFEHAVEN AI - BACKEND LOGIC
+# PART 2F: VISION ANALYSIS CACHE
+# ============================================================================
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Callable, Optional, Union
+
+# Must match the AI_COMPLETE call in safehaven_db_setup.sql.
+# Bump PROMPT_VERSION whenever the prompt text changes so stale results are not reused.
+VISION_MODEL = "llama-3.2-90b-vision"
+PROMPT_VERSION = "v1"
+VISION_PROMPT = (
+    'Analyze this home inspection image. Identify any defects. Return ONLY a JSON object with this '
+    'structure: {"defect": "name of defect", "severity": 0-100, "visual_description": "detailed description", '
+    '"recommended_fix": "how to fix"}. Do not add any markdown formatting.'
+)
+
+DEFAULT_CACHE_DIR = os.getenv(
+    "SAFEHAVEN_ANALYSIS_CACHE", os.path.join(tempfile.gettempdir(), "safehaven_analysis_cache")
+)
+
+
+def image_content_hash(image: Union[bytes, str]) -> str:
+    """
+    MD5 of the image bytes (or of the file at the given path), the same digest Snowflake
+    exposes as DIRECTORY(@INSPECTION_ASSETS).MD5, so local and warehouse caches share keys.
+    """
+    digest = hashlib.md5(usedforsecurity=False)
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        digest.update(image)
+    else:
+        with open(image, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+class AnalysisCache:
+    """
+    Content-addressed on-disk cache of raw vision-model output for demo/local mode.
+    Keyed by (image content hash, model, prompt version): re-uploads and duplicate photos
+    never reach the model twice.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, model: str = VISION_MODEL,
+                 prompt_version: str = PROMPT_VERSION):
+        self.cache_dir = cache_dir or DEFAULT_CACHE_DIR
+        self.model = model
+        self.prompt_version = prompt_version
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path(self, content_hash: str) -> str:
+        key = hashlib.sha256(f"{content_hash}|{self.model}|{self.prompt_version}".encode()).hexdigest()
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, content_hash: str) -> Optional[str]:
+        """Returns the cached raw analysis for a content hash, or None."""
+        try:
+            with open(self._path(content_hash)) as f:
+                return json.load(f)["ai_analysis_raw"]
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            return None
+
+    def put(self, content_hash: str, ai_analysis_raw: str) -> None:
+        path = self._path(content_hash)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        record = {
+            "content_hash": content_hash,
+            "model": self.model,
+            "prompt_version": self.prompt_version,
+            "ai_analysis_raw": ai_analysis_raw,
+            "created_at": time.time(),
+        }
+        # Write-then-rename so concurrent readers never see a partial entry.
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(record, f)
+        os.replace(tmp, path)
+
+    def get_or_analyze(self, image: Union[bytes, str], analyze: Callable[[Union[bytes, str]], str],
+                       content_hash: Optional[str] = None) -> str:
+        """
+        Returns the cached analysis for this image, calling `analyze(image)` (the vision model)
+        only on a miss. Pass `content_hash` when it is already known to skip re-hashing.
+        """
+        content_hash = content_hash or image_content_hash(image)
+        cached = self.get(content_hash)
+        with self._lock:
+            if cached is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if cached is not None:
+            return cached
+        raw = analyze(image)
+        self.put(content_hash, raw)
+        return raw
+
+    def stats(self) -> dict:
+        """Hit/miss counters for this process; `hit_rate` is the share of model calls avoided."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
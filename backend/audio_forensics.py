@@ -3,14 +3,65 @@
 # PART 2B: AUDIO FORENSICS UDF
 # ============================================================================
 
+import os
 import sys
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from math import gcd
 import numpy as np
 # Note: In Snowflake, we must ensure 'librosa' and 'soundfile' are present in the stage or Anaconda channel.
-import librosa
-import snowflake.snowpark.types as T
-from snowflake.snowpark.functions import udf
+# librosa (and its numba/scipy stack) is imported lazily: the default centroid pipeline below is
+# pure NumPy, so cold starts of the UDF and the Streamlit process don't pay for it.
+import soundfile as sf
 
-def analyze_wall_tap(audio_file_path: str) -> dict:
+_librosa = None
+
+
+def _load_librosa():
+    global _librosa
+    if _librosa is None:
+        import librosa
+        _librosa = librosa
+    return _librosa
+
+# Lower centroid implies duller sound (e.g., hollow void).
+# Threshold would need calibration in real-world scenarios.
+HOLLOWNESS_THRESHOLD_HZ = 1500
+
+# STFT geometry (librosa defaults)
+N_FFT = 2048
+HOP_LENGTH = 512
+
+# Batch analysis: native rates inside this range are analyzed as-is (no resampling);
+# anything else is resampled to TARGET_SR.
+TARGET_SR = 22050
+MIN_NATIVE_SR = 16000
+MAX_NATIVE_SR = 48000
+BATCH_DURATION_S = 5.0
+MAX_FRAMES_PER_FFT = 8192   # bounds the stacked STFT matrix (~64 MB float32)
+
+# Tap segmentation: short-time energy onsets, each impact scored on its own window.
+ONSET_FRAME = 512
+ONSET_HOP = 128
+ONSET_RISE_DB = 12.0        # onset must rise this far above the noise floor...
+ONSET_RANGE_DB = 30.0       # ...and be within this range of the loudest frame
+MIN_TAP_GAP_S = 0.08        # refractory period between impacts
+TAP_PRE_S = 0.005
+TAP_WINDOW_S = 0.15
+LOW_BAND_HZ = 500.0
+HIGH_BAND_HZ = 2000.0
+
+TAP_DTYPE = np.dtype([
+    ("onset_s", "f4"),
+    ("centroid_hz", "f4"),
+    ("low_ratio", "f4"),
+    ("mid_ratio", "f4"),
+    ("high_ratio", "f4"),
+    ("hollow", "?"),
+])
+
+def analyze_wall_tap(audio_file_path: str, advanced: bool = False) -> dict:
     """
     Analyzes an audio recording of a wall tap to detect structural anomalies.
     
@@ -22,6 +73,8 @@ def analyze_wall_tap(audio_file_path: str) -> dict:
     
     Args:
         audio_file_path (str): Path to the audio file (accessible to the UDF).
+        advanced (bool): Use librosa's loader and feature pipeline (imported on demand).
+            The default NumPy kernel computes the same centered-STFT centroid.
         
     Returns:
         dict: Analysis result with risk flag.
@@ -30,18 +83,20 @@ def analyze_wall_tap(audio_file_path: str) -> dict:
         # Load audio file (Load only first 5 seconds for efficiency)
         # In a real Snowflake UDF, you might read bytes from a StageFile object.
         # Here we simulate the loading logic assuming a local path or mapped stage path.
-        y, sr = librosa.load(audio_file_path, duration=5.0)
+        y, sr = (None, None) if advanced else _load_clip(audio_file_path, duration=5.0)
+        
+        if y is None:
+            librosa = _load_librosa()
+            y, sr = librosa.load(audio_file_path, duration=5.0)
+            spectral_centroids = librosa.feature.spectral_centroid(y=y, sr=sr)[0]
+        else:
+            spectral_centroids = spectral_centroid(y, sr)
         
         # Calculate Spectral Centroid
         # Returns an array of centroids for each frame; we take the mean.
-        spectral_centroids = librosa.feature.spectral_centroid(y=y, sr=sr)[0]
         avg_centroid = np.mean(spectral_centroids)
         
         # Threshold logic (Simplistic mock threshold for demonstration)
-        # Lower centroid implies duller sound (e.g., hollow void).
-        # Threshold would need calibration in real-world scenarios.
-        HOLLOWNESS_THRESHOLD_HZ = 1500 
-        
         is_hollow = avg_centroid < HOLLOWNESS_THRESHOLD_HZ
         
         return {
@@ -59,3 +114,338 @@ def analyze_wall_tap(audio_file_path: str) -> dict:
             "risk_detected": False,
             "diagnosis": f"Audio Analysis Failed: {str(e)}"
         }
+
+
+def _hann(n_fft: int) -> np.ndarray:
+    # Periodic Hann window (matches librosa/scipy 'hann' with fftbins=True)
+    return (0.5 - 0.5 * np.cos(2.0 * np.pi * np.arange(n_fft) / n_fft)).astype(np.float32)
+
+
+def _frame_centroids(frames: np.ndarray, sr: int) -> tuple:
+    """
+    Spectral centroid for a stack of frames in one vectorized FFT.
+    
+    Args:
+        frames (np.ndarray): (n_frames, n_fft) time-domain frames.
+        sr (int): Sample rate.
+        
+    Returns:
+        tuple: (centroids_hz, spectral_magnitude_sum) per frame. Silent frames have a zero sum.
+    """
+    n_fft = frames.shape[1]
+    mag = np.abs(np.fft.rfft(frames * _hann(n_fft), axis=1))
+    freqs = np.fft.rfftfreq(n_fft, d=1.0 / sr)
+    total = mag.sum(axis=1)
+    centroids = np.divide(mag @ freqs, total, out=np.zeros_like(total), where=total > 0)
+    return centroids, total
+
+
+def spectral_centroid(y: np.ndarray, sr: int) -> np.ndarray:
+    """
+    NumPy equivalent of librosa.feature.spectral_centroid(y=y, sr=sr)[0]:
+    centered frames (zero padded by N_FFT // 2), periodic Hann window, magnitude spectrum.
+    """
+    padded = np.pad(np.asarray(y, dtype=np.float32), N_FFT // 2)
+    frames = np.lib.stride_tricks.sliding_window_view(padded, N_FFT)[::HOP_LENGTH]
+    return _frame_centroids(frames, sr)[0]
+
+
+def _load_clip(audio_file_path: str, duration: float) -> tuple:
+    """
+    Decodes the start of a file as mono float32 at TARGET_SR (librosa.load's default rate).
+    Returns (None, None) for formats soundfile can't read so the caller can fall back to librosa.
+    """
+    try:
+        with sf.SoundFile(audio_file_path) as f:
+            sr = f.samplerate
+            y = f.read(frames=int(duration * sr), dtype='float32', always_2d=True).mean(axis=1)
+    except sf.LibsndfileError:
+        if not os.path.exists(audio_file_path):
+            raise
+        return None, None
+    if sr != TARGET_SR:
+        from scipy.signal import resample_poly
+        g = gcd(sr, TARGET_SR)
+        y = resample_poly(y, TARGET_SR // g, sr // g).astype(np.float32)
+    return y, TARGET_SR
+
+
+def _diagnosis(value_hz: float, is_hollow: bool) -> dict:
+    return {
+        "metric": "Spectral Centroid",
+        "value_hz": float(value_hz),
+        "risk_detected": bool(is_hollow),
+        "diagnosis": "Possible Tile Delamination / Void" if is_hollow else "Solid Substrate"
+    }
+
+
+def analyze_wall_tap_stream(audio_file_path: str, block_seconds: float = 2.0, window_seconds: float = 1.0) -> dict:
+    """
+    Streaming variant of analyze_wall_tap for multi-minute sweeps across a whole wall.
+    
+    The file is read in fixed-size blocks and per-frame centroids are computed incrementally,
+    so memory stays bounded by one block regardless of recording length. Frames are grouped
+    into `window_seconds` windows to build a hollowness timeline along the sweep.
+    Audio is analyzed at its native sample rate (no resampling).
+    
+    Args:
+        audio_file_path (str): Path to the audio file (accessible to the UDF).
+        block_seconds (float): Decode block length.
+        window_seconds (float): Timeline resolution.
+        
+    Returns:
+        dict: Same keys as analyze_wall_tap plus 'duration_s', 'hollow_fraction' and
+        'timeline' (list of {start_s, end_s, value_hz, risk_detected}).
+    """
+    try:
+        timeline = []
+        total_sum, total_count = 0.0, 0
+        win_sum, win_count, win_index = 0.0, 0, 0
+        
+        def close_window():
+            if win_count:
+                value = win_sum / win_count
+                timeline.append({
+                    "start_s": round(win_index * window_seconds, 3),
+                    "end_s": round((win_index + 1) * window_seconds, 3),
+                    "value_hz": float(value),
+                    "risk_detected": bool(value < HOLLOWNESS_THRESHOLD_HZ)
+                })
+        
+        with sf.SoundFile(audio_file_path) as f:
+            sr = f.samplerate
+            frames_per_window = max(1, int(round(window_seconds * sr / HOP_LENGTH)))
+            blocksize = max(N_FFT, int(block_seconds * sr))
+            carry = np.zeros(0, dtype=np.float32)
+            frame_index = 0
+            
+            for block in f.blocks(blocksize=blocksize, dtype='float32', always_2d=True):
+                buf = np.concatenate([carry, block.mean(axis=1)])
+                if buf.shape[0] < N_FFT:
+                    carry = buf
+                    continue
+                frames = np.lib.stride_tricks.sliding_window_view(buf, N_FFT)[::HOP_LENGTH]
+                carry = buf[frames.shape[0] * HOP_LENGTH:]
+                centroids, energy = _frame_centroids(frames, sr)
+                
+                # Fold frames into timeline windows; silent frames carry no information.
+                windows = (frame_index + np.arange(frames.shape[0])) // frames_per_window
+                frame_index += frames.shape[0]
+                voiced = energy > 0
+                for w in np.unique(windows):
+                    if w != win_index:
+                        close_window()
+                        win_sum, win_count, win_index = 0.0, 0, int(w)
+                    mask = (windows == w) & voiced
+                    win_sum += float(centroids[mask].sum())
+                    win_count += int(mask.sum())
+                total_sum += float(centroids[voiced].sum())
+                total_count += int(voiced.sum())
+            close_window()
+            duration = f.frames / sr
+        
+        avg_centroid = total_sum / total_count if total_count else 0.0
+        hollow_windows = sum(w["risk_detected"] for w in timeline)
+        result = _diagnosis(avg_centroid, hollow_windows > 0)
+        result.update({
+            "duration_s": float(duration),
+            "hollow_fraction": hollow_windows / len(timeline) if timeline else 0.0,
+            "timeline": timeline
+        })
+        return result
+        
+    except Exception as e:
+        # Error Suppression Pattern
+        return {
+            "metric": "Error",
+            "value_hz": 0.0,
+            "risk_detected": False,
+            "diagnosis": f"Audio Analysis Failed: {str(e)}",
+            "timeline": []
+        }
+
+
+def detect_tap_onsets(y: np.ndarray, sr: int) -> np.ndarray:
+    """
+    Finds individual tap impacts from short-time RMS energy.
+    Frames below an adaptive threshold (noise floor + ONSET_RISE_DB) are treated as silence.
+    
+    Args:
+        y (np.ndarray): Mono signal.
+        sr (int): Sample rate.
+        
+    Returns:
+        np.ndarray: Onset positions in samples (int64), ascending.
+    """
+    if y.shape[0] < ONSET_FRAME:
+        return np.zeros(0, dtype=np.int64)
+    frames = np.lib.stride_tricks.sliding_window_view(y, ONSET_FRAME)[::ONSET_HOP]
+    rms = np.sqrt(np.einsum("ij,ij->i", frames, frames) / ONSET_FRAME)
+    if rms.max() <= 0:
+        return np.zeros(0, dtype=np.int64)
+    
+    floor = np.percentile(rms, 20)
+    threshold = max(floor * 10 ** (ONSET_RISE_DB / 20), rms.max() * 10 ** (-ONSET_RANGE_DB / 20))
+    above = rms >= threshold
+    rising = np.flatnonzero(above[1:] & ~above[:-1]) + 1
+    if above[0]:
+        rising = np.concatenate([[0], rising])
+    
+    # The crossing is caused by the newest hop of samples entering the frame.
+    min_gap = int(MIN_TAP_GAP_S * sr)
+    onsets = []
+    for sample in rising * ONSET_HOP + (ONSET_FRAME - ONSET_HOP):
+        if not onsets or sample - onsets[-1] >= min_gap:
+            onsets.append(sample)
+    return np.asarray(onsets, dtype=np.int64)
+
+
+def score_taps(y: np.ndarray, sr: int, onsets: np.ndarray) -> np.ndarray:
+    """
+    Scores each tap independently on a short window around its impact.
+    All windows are stacked into one matrix and transformed with a single FFT.
+    
+    Returns:
+        np.ndarray: Structured array with TAP_DTYPE, one row per onset.
+    """
+    taps = np.zeros(len(onsets), dtype=TAP_DTYPE)
+    if not len(onsets):
+        return taps
+    
+    n = 1 << int(np.ceil(np.log2(TAP_WINDOW_S * sr)))
+    starts = np.maximum(np.asarray(onsets) - int(TAP_PRE_S * sr), 0)
+    padded = np.concatenate([y, np.zeros(n, dtype=y.dtype)])
+    segments = padded[starts[:, None] + np.arange(n)[None, :]]
+    
+    mag = np.abs(np.fft.rfft(segments, axis=1))
+    freqs = np.fft.rfftfreq(n, d=1.0 / sr)
+    power = mag ** 2
+    total_mag = mag.sum(axis=1)
+    total_power = power.sum(axis=1)
+    safe_power = np.where(total_power > 0, total_power, 1.0)
+    
+    taps["onset_s"] = np.asarray(onsets) / sr
+    taps["centroid_hz"] = np.divide(mag @ freqs, total_mag, out=np.zeros_like(total_mag), where=total_mag > 0)
+    taps["low_ratio"] = power[:, freqs < LOW_BAND_HZ].sum(axis=1) / safe_power
+    taps["high_ratio"] = power[:, freqs >= HIGH_BAND_HZ].sum(axis=1) / safe_power
+    taps["mid_ratio"] = np.clip(1.0 - taps["low_ratio"] - taps["high_ratio"], 0.0, 1.0)
+    taps["hollow"] = taps["centroid_hz"] < HOLLOWNESS_THRESHOLD_HZ
+    return taps
+
+
+def analyze_tap_sequence(audio_file_path: str) -> dict:
+    """
+    Segments a tap-test recording into individual impacts and scores each one.
+    A single hollow tap among many solid ones is reported instead of being averaged away,
+    and silence between taps is never transformed.
+    
+    Args:
+        audio_file_path (str): Path to the audio file (accessible to the UDF).
+        
+    Returns:
+        dict: Same keys as analyze_wall_tap plus 'tap_count', 'hollow_taps' and
+        'taps' (structured array, see TAP_DTYPE).
+    """
+    try:
+        y, sr = sf.read(audio_file_path, dtype='float32', always_2d=True)
+        y = y.mean(axis=1)
+        taps = score_taps(y, sr, detect_tap_onsets(y, sr))
+        
+        hollow = int(taps["hollow"].sum())
+        value = float(taps["centroid_hz"].mean()) if len(taps) else 0.0
+        result = _diagnosis(value, hollow > 0)
+        result.update({"tap_count": int(len(taps)), "hollow_taps": hollow, "taps": taps})
+        return result
+        
+    except Exception as e:
+        # Error Suppression Pattern
+        return {
+            "metric": "Error",
+            "value_hz": 0.0,
+            "risk_detected": False,
+            "diagnosis": f"Audio Analysis Failed: {str(e)}",
+            "tap_count": 0,
+            "hollow_taps": 0,
+            "taps": np.zeros(0, dtype=TAP_DTYPE)
+        }
+
+
+def _decode_for_batch(audio_file_path: str, duration: float = BATCH_DURATION_S) -> tuple:
+    """Worker: decodes (and only if needed resamples) one file. Returns (y, sr, error)."""
+    try:
+        with sf.SoundFile(audio_file_path) as f:
+            sr = f.samplerate
+            frames = int(duration * sr) if duration else -1
+            y = f.read(frames=frames, dtype='float32', always_2d=True).mean(axis=1)
+        if not MIN_NATIVE_SR <= sr <= MAX_NATIVE_SR:
+            from scipy.signal import resample_poly
+            g = gcd(sr, TARGET_SR)
+            y = resample_poly(y, TARGET_SR // g, sr // g).astype(np.float32)
+            sr = TARGET_SR
+        return y, sr, None
+    except Exception as e:
+        return None, 0, str(e)
+
+
+def analyze_wall_taps_batch(audio_file_paths, workers: int = None, duration: float = BATCH_DURATION_S) -> list:
+    """
+    Analyzes many tap-test recordings at once.
+    
+    Decoding fans out across a process pool; frames from every file sharing a sample rate are
+    then stacked into one matrix so the STFT runs as a handful of large vectorized FFTs instead
+    of one small transform per file.
+    
+    Args:
+        audio_file_paths (Iterable[str]): Paths to audio files.
+        workers (int): Decoder processes (defaults to os.cpu_count(); 1 decodes in-process).
+        duration (float): Seconds analyzed per file, as in analyze_wall_tap (None = whole file).
+        
+    Returns:
+        list: One analyze_wall_tap-style dict per path, in input order.
+    """
+    paths = list(audio_file_paths)
+    workers = workers or os.cpu_count() or 1
+    decode = partial(_decode_for_batch, duration=duration)
+    
+    if workers > 1 and len(paths) > 1:
+        chunksize = max(1, len(paths) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            decoded = list(pool.map(decode, paths, chunksize=chunksize))
+    else:
+        decoded = [decode(p) for p in paths]
+    
+    results = [None] * len(paths)
+    by_rate = defaultdict(list)
+    for i, (y, sr, error) in enumerate(decoded):
+        if error is not None:
+            results[i] = {
+                "metric": "Error",
+                "value_hz": 0.0,
+                "risk_detected": False,
+                "diagnosis": f"Audio Analysis Failed: {error}"
+            }
+        else:
+            by_rate[sr].append(i)
+    
+    for sr, indices in by_rate.items():
+        pending, pending_frames = [], 0
+        for pos, i in enumerate(indices):
+            y = decoded[i][0]
+            if y.shape[0] < N_FFT:
+                y = np.pad(y, (0, N_FFT - y.shape[0]))
+            frames = np.lib.stride_tricks.sliding_window_view(y, N_FFT)[::HOP_LENGTH]
+            pending.append((i, frames))
+            pending_frames += frames.shape[0]
+            if pending_frames < MAX_FRAMES_PER_FFT and pos < len(indices) - 1:
+                continue
+            
+            # One stacked FFT for every file in this group
+            centroids, energy = _frame_centroids(np.concatenate([f for _, f in pending]), sr)
+            bounds = np.cumsum([0] + [f.shape[0] for _, f in pending])
+            for (j, _), lo, hi in zip(pending, bounds[:-1], bounds[1:]):
+                voiced = energy[lo:hi] > 0
+                value = float(centroids[lo:hi][voiced].mean()) if voiced.any() else 0.0
+                results[j] = _diagnosis(value, value < HOLLOWNESS_THRESHOLD_HZ)
+            pending, pending_frames = [], 0
+    
+    return results
@@ -0,0 +1,164 @@
+# ============================================================================
+# SAFEHAVEN AI - BACKEND LOGIC
+# PART 4B: DASHBOARD DATA LAYER
+# ============================================================================
+
+import sqlite3
+from typing import Dict, List, Sequence
+
+import numpy as np
+import pandas as pd
+
+from backend.cost_estimator import CostEstimator
+from backend.session_manager import SessionPool, create_session_pool
+
+ROOMS = ("Kitchen", "Bedroom", "Bath", "Living")
+
+# Defects in the "Serious" band and above (see CostEstimator). This is a severity threshold,
+# not a building-code finding: citations come from the Legal Shield lookup (legal_rag.py).
+SERIOUS_DEFECT_SEVERITY = 51
+# Habitability starts at 100 and loses a tenth of a point per severity point found.
+SCORE_PENALTY_PER_SEVERITY = 0.1
+
+# Free-text model defects -> CostEstimator.BASELINE_COSTS keys (first keyword match wins).
+DEFECT_COST_KEYWORDS = (
+    ("mold", "mold_remediation"),
+    ("mildew", "mold_remediation"),
+    ("roof", "roof_leak"),
+    ("electr", "electrical_issue"),
+    ("outlet", "electrical_issue"),
+    ("wiring", "electrical_issue"),
+    ("crack", "structural_crack"),
+    ("struct", "structural_crack"),
+    ("foundation", "structural_crack"),
+    ("water", "water_damage"),
+    ("leak", "water_damage"),
+    ("damp", "water_damage"),
+)
+
+# One round trip per property: the warehouse collapses results to distinct
+# (room, defect, severity) groups and costs are priced locally from the counts.
+# Near-duplicate shots (DUPLICATE_OF set) and unparsed rows are excluded.
+PROPERTY_AGGREGATE_SQL = """
+SELECT ROOM, DEFECT, SEVERITY, COUNT(*) AS N
+FROM INSPECTION_RESULTS
+WHERE PROPERTY_ID = ? AND IS_VALID AND DUPLICATE_OF IS NULL
+GROUP BY ROOM, DEFECT, SEVERITY;
+"""
+
+# Demo-mode stand-in for INSPECTION_RESULTS (columns used by the dashboard only).
+_DEMO_SCHEMA = """
+CREATE TABLE INSPECTION_RESULTS (
+    FILE_NAME TEXT, PROPERTY_ID TEXT, ROOM TEXT, DEFECT TEXT, SEVERITY INTEGER,
+    IS_VALID BOOLEAN, DUPLICATE_OF TEXT
+);
+"""
+
+DEMO_RESULTS = [
+    # (PROPERTY_ID, ROOM, DEFECT, SEVERITY)
+    ("123 Maple Street", "Kitchen", "Water stain under sink", 45),
+    ("123 Maple Street", "Kitchen", "Hairline crack in tile backsplash", 20),
+    ("123 Maple Street", "Kitchen", "Ungrounded outlet near sink", 60),
+    ("123 Maple Street", "Bath", "Black mold on ceiling", 85),
+    ("123 Maple Street", "Bath", "Water damage behind shower wall", 75),
+    ("123 Maple Street", "Bath", "Leaking supply line", 55),
+    ("123 Maple Street", "Bath", "Cracked floor tile", 30),
+    ("123 Maple Street", "Bath", "Missing GFCI outlet", 70),
+    ("123 Maple Street", "Living", "Settlement crack above doorway", 35),
+    ("The Glass Penthouse", "Living", "Roof leak at skylight", 65),
+    ("The Glass Penthouse", "Kitchen", "Water stain on ceiling", 30),
+    ("Industrial Lofts A", "Bedroom", "Exposed wiring", 90),
+    ("Industrial Lofts A", "Bath", "Mildew on grout", 25),
+]
+
+
+def defect_cost_key(defect: str) -> str:
+    """Maps a model-reported defect label to a CostEstimator baseline key ('' if unknown)."""
+    text = (defect or "").lower()
+    for keyword, key in DEFECT_COST_KEYWORDS:
+        if keyword in text:
+            return key
+    return ""
+
+
+def create_demo_database(rows: Sequence[tuple] = DEMO_RESULTS, path: str = ":memory:") -> sqlite3.Connection:
+    """
+    SQLite stand-in for INSPECTION_RESULTS used when no Snowflake session is available.
+    The connection is shareable across Streamlit threads (reads only).
+    """
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute(_DEMO_SCHEMA)
+    conn.executemany(
+        "INSERT INTO INSPECTION_RESULTS (FILE_NAME, PROPERTY_ID, ROOM, DEFECT, SEVERITY, IS_VALID, DUPLICATE_OF) "
+        "VALUES (?, ?, ?, ?, ?, 1, NULL)",
+        [(f"{p}/{r}/demo_{i}.jpg", p, r, d, s) for i, (p, r, d, s) in enumerate(rows)],
+    )
+    conn.commit()
+    return conn
+
+
+def _query(source, sql: str, params: list) -> List[dict]:
+    """Runs a parameterized query on a Snowpark session, a SessionPool or a sqlite3 connection."""
+    if isinstance(source, SessionPool):
+        return source.run(_query, sql, params)
+    if isinstance(source, sqlite3.Connection):
+        cursor = source.execute(sql, params)
+        columns = [c[0] for c in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+    return [r.as_dict() if hasattr(r, "as_dict") else dict(r) for r in source.sql(sql, params=params).collect()]
+
+
+def empty_room_stats() -> dict:
+    return {"score": 100, "defects": 0, "cost_usd": 0.0, "serious": 0}
+
+
+def load_property_dashboard(source, property_id: str, region_factor: float = 1.0) -> Dict[str, dict]:
+    """
+    Loads per-room KPI aggregates for one property with a single query.
+
+    Args:
+        source: Snowpark session or SessionPool (production), or sqlite3 connection (demo mode).
+        property_id (str): PROPERTY_ID as parsed from the stage layout.
+        region_factor (float): Regional cost multiplier passed to CostEstimator.
+
+    Returns:
+        dict: room -> {score, defects, cost_usd, serious}. Every room in ROOMS is
+        present (defect-free rooms get empty_room_stats()).
+    """
+    rows = _query(source, PROPERTY_AGGREGATE_SQL, [property_id])
+    stats = {room: empty_room_stats() for room in ROOMS}
+    if not rows:
+        return stats
+
+    df = pd.DataFrame(rows)
+    df["N"] = df["N"].astype(int)
+    df["SEVERITY"] = df["SEVERITY"].astype(float)
+    estimates = CostEstimator.estimate_repair_batch(
+        df["DEFECT"].map(defect_cost_key), df["SEVERITY"], region_factor
+    )
+    df["COST"] = (estimates["min_estimate_usd"] + estimates["max_estimate_usd"]) / 2 * df["N"]
+    df["SEVERITY_SUM"] = df["SEVERITY"] * df["N"]
+    df["SERIOUS"] = np.where(df["SEVERITY"] >= SERIOUS_DEFECT_SEVERITY, df["N"], 0)
+
+    for room, group in df.groupby("ROOM"):
+        score = 100.0 - SCORE_PENALTY_PER_SEVERITY * group["SEVERITY_SUM"].sum()
+        stats[room] = {
+            "score": int(round(min(100.0, max(0.0, score)))),
+            "defects": int(group["N"].sum()),
+            "cost_usd": round(float(group["COST"].sum()), 2),
+            "serious": int(group["SERIOUS"].sum()),
+        }
+    return stats
+
+
+def connect_data_source():
+    """
+    The active Snowflake session when running inside Snowflake, a SessionPool when
+    SNOWFLAKE_* credentials are configured, otherwise a seeded demo database (Demo Mode).
+    """
+    try:
+        from snowflake.snowpark.context import get_active_session
+        return get_active_session()
+    except Exception:
+        pass
+    return create_session_pool() or create_demo_database()
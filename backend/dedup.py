@@ -0,0 +1,185 @@
+# ============================================================================
+# SAFEHAVEN AI - BACKEND LOGIC
+# PART 2I: NEAR-DUPLICATE IMAGE DETECTION
+# ============================================================================
+
+import io
+from typing import Dict, Hashable, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from PIL import Image
+from scipy.fft import dctn
+
+# Hamming radius (out of 64 bits) under which two photos count as the same shot.
+DEFAULT_MAX_DISTANCE = 10
+
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+ImageSource = Union[Image.Image, bytes, str]
+
+
+def _open(image: ImageSource) -> Image.Image:
+    if isinstance(image, Image.Image):
+        return image
+    img = Image.open(io.BytesIO(image) if isinstance(image, (bytes, bytearray)) else image)
+    img.draft("L", (64, 64))  # JPEG: decode at the smallest DCT scale that still covers 32x32
+    return img
+
+
+def _gray_stack(images: Iterable[ImageSource], size: Tuple[int, int]) -> np.ndarray:
+    """(n, height, width) float32 stack of downsampled grayscale images."""
+    frames = [np.asarray(_open(img).convert("L").resize(size, Image.Resampling.LANCZOS), dtype=np.float32)
+              for img in images]
+    if not frames:
+        return np.zeros((0, size[1], size[0]), dtype=np.float32)
+    return np.stack(frames)
+
+
+def _pack(bits: np.ndarray) -> np.ndarray:
+    """(n, 64) boolean matrix -> (n,) uint64 hashes, first bit most significant."""
+    return np.packbits(bits, axis=1).view(">u8").ravel().astype(np.uint64)
+
+
+def phash_batch(images: Sequence[ImageSource]) -> np.ndarray:
+    """64-bit DCT perceptual hashes, one 2-D DCT over the whole (n, 32, 32) stack."""
+    low = dctn(_gray_stack(images, (32, 32)), axes=(1, 2), norm="ortho")[:, :8, :8].reshape(-1, 64)
+    return _pack(low > np.median(low[:, 1:], axis=1, keepdims=True))
+
+
+def dhash_batch(images: Sequence[ImageSource]) -> np.ndarray:
+    """64-bit difference hashes (horizontal gradient sign on a 9x8 thumbnail)."""
+    gray = _gray_stack(images, (9, 8))
+    return _pack((gray[:, :, 1:] > gray[:, :, :-1]).reshape(-1, 64))
+
+
+def image_hashes(images: Sequence[ImageSource]) -> Tuple[np.ndarray, np.ndarray]:
+    """(phashes, dhashes) with each image opened and converted to grayscale once."""
+    gray = [_open(img).convert("L") for img in images]
+    return phash_batch(gray), dhash_batch(gray)
+
+
+def to_hex(h) -> str:
+    return f"{int(h):016x}"
+
+
+def hamming_distance(a, b) -> np.ndarray:
+    """Elementwise (broadcasting) Hamming distance between uint64 hash arrays."""
+    x = np.bitwise_xor(np.asarray(a, dtype=np.uint64), np.asarray(b, dtype=np.uint64))
+    x = np.ascontiguousarray(x)
+    return _POPCOUNT8[x.view(np.uint8)].reshape(x.shape + (8,)).sum(axis=-1, dtype=np.int64)
+
+
+class MultiIndexHash:
+    """
+    Multi-index hashing over 64-bit hashes: each hash is split into `n_chunks` 16-bit
+    substrings with one lookup table per position. Two hashes within Hamming distance r agree
+    to within r // n_chunks bits on at least one substring (pigeonhole), so a radius query
+    probes every table with the few substring variants at that distance and verifies only
+    the candidates it finds, instead of scanning the whole set.
+    """
+
+    def __init__(self, max_distance: int = DEFAULT_MAX_DISTANCE, n_chunks: int = 4):
+        self.max_distance = max_distance
+        self.n_chunks = n_chunks
+        self._bits = 64 // n_chunks
+        self._mask = (1 << self._bits) - 1
+        self._flips = [v for v in range(1 << self._bits) if v.bit_count() <= max_distance // n_chunks]
+        self._tables: List[Dict[int, List[int]]] = [{} for _ in range(n_chunks)]
+        self._hashes: List[int] = []
+        self._keys: List[Hashable] = []
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def _chunks(self, h: int) -> List[int]:
+        return [(h >> (i * self._bits)) & self._mask for i in range(self.n_chunks)]
+
+    def add(self, h: int, key: Hashable) -> None:
+        h = int(h)
+        slot = len(self._hashes)
+        self._hashes.append(h)
+        self._keys.append(key)
+        for table, chunk in zip(self._tables, self._chunks(h)):
+            table.setdefault(chunk, []).append(slot)
+
+    def query(self, h: int, radius: Optional[int] = None) -> List[Tuple[int, Hashable]]:
+        """All (distance, key) pairs within `radius` (<= max_distance) of `h`, closest first."""
+        h = int(h)
+        radius = self.max_distance if radius is None else min(radius, self.max_distance)
+        candidates = set()
+        for table, chunk in zip(self._tables, self._chunks(h)):
+            for flip in self._flips:
+                candidates.update(table.get(chunk ^ flip, ()))
+        found = [((self._hashes[c] ^ h).bit_count(), c) for c in candidates]
+        return [(d, self._keys[c]) for d, c in sorted(found) if d <= radius]
+
+
+class NearDuplicateIndex:
+    """
+    Incremental near-duplicate clustering. Each cluster keeps one representative; a new image
+    joins the closest representative whose pHash (and dHash, when given) are both within
+    `max_distance`, otherwise it becomes a representative itself. Only representatives are
+    indexed (by pHash, in a MultiIndexHash), so members never chain a cluster away from the
+    photo that was analyzed.
+    """
+
+    def __init__(self, max_distance: int = DEFAULT_MAX_DISTANCE):
+        self.max_distance = max_distance
+        self._index = MultiIndexHash(max_distance)
+        self._dhashes: Dict[Hashable, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def assign(self, key: Hashable, phash: int, dhash: Optional[int] = None) -> Optional[Hashable]:
+        """
+        Returns the representative key `key` duplicates, or None if it starts a new cluster.
+        """
+        for _, rep in self._index.query(phash):
+            rep_dhash = self._dhashes.get(rep)
+            if dhash is None or rep_dhash is None or (int(dhash) ^ rep_dhash).bit_count() <= self.max_distance:
+                return rep
+        self._index.add(phash, key)
+        if dhash is not None:
+            self._dhashes[key] = int(dhash)
+        return None
+
+
+def cluster_near_duplicates(phashes, dhashes=None, max_distance: int = DEFAULT_MAX_DISTANCE) -> np.ndarray:
+    """
+    Clusters hashes in input order.
+
+    Args:
+        phashes (array-like): uint64 perceptual hashes.
+        dhashes (array-like, optional): uint64 difference hashes used as a second check.
+        max_distance (int): Hamming radius for both hashes.
+
+    Returns:
+        np.ndarray: labels[i] is the index of image i's cluster representative (i itself for
+        representatives).
+    """
+    index = NearDuplicateIndex(max_distance)
+    labels = np.arange(len(phashes))
+    for i, ph in enumerate(phashes):
+        rep = index.assign(i, ph, None if dhashes is None else dhashes[i])
+        if rep is not None:
+            labels[i] = rep
+    return labels
+
+
+def dedupe_images(images: Sequence[ImageSource], max_distance: int = DEFAULT_MAX_DISTANCE) -> dict:
+    """
+    Hashes a set of inspection photos and picks one representative per near-duplicate cluster.
+
+    Returns:
+        dict: phashes, dhashes (uint64 arrays), labels (representative index per image) and
+        representatives (indices to send to the vision model).
+    """
+    phashes, dhashes = image_hashes(images)
+    labels = cluster_near_duplicates(phashes, dhashes, max_distance)
+    return {
+        "phashes": phashes,
+        "dhashes": dhashes,
+        "labels": labels,
+        "representatives": np.flatnonzero(labels == np.arange(len(labels))),
+    }
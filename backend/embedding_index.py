@@ -0,0 +1,268 @@
+# ============================================================================
+# SAFEHAVEN AI - BACKEND LOGIC
+# PART 2D: LEGAL SHIELD EMBEDDING INDEX
+# ============================================================================
+
+import hashlib
+import re
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from backend.vector_search import VectorSearchEngine, build_engine
+
+EMBED_MODEL = "snowflake-arctic-embed-m"
+EMBED_DIM = 768
+
+# Embedder contract: a batch of texts in, a (len(texts), dim) float32 matrix out.
+Embedder = Callable[[Sequence[str]], np.ndarray]
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Re-embeds only rows whose text changed since the last refresh (or were never embedded).
+# CONTENT_HASH mirrors content_hash() below so the local index and the table agree.
+REFRESH_EMBEDDINGS_SQL = f"""
+UPDATE BUILDING_CODES_CHUNKS
+SET CHUNK_EMBEDDING = SNOWFLAKE.CORTEX.EMBED_TEXT_768('{EMBED_MODEL}', CHUNK_TEXT),
+    CONTENT_HASH = SHA2(CHUNK_TEXT, 256)
+WHERE CHUNK_EMBEDDING IS NULL
+   OR CONTENT_HASH IS DISTINCT FROM SHA2(CHUNK_TEXT, 256);
+"""
+
+LOAD_EMBEDDINGS_SQL = """
+SELECT CHUNK_ID, SECTION_TITLE, CHUNK_TEXT, CONTENT_HASH, CHUNK_EMBEDDING
+FROM BUILDING_CODES_CHUNKS
+WHERE CHUNK_EMBEDDING IS NOT NULL;
+"""
+
+
+def content_hash(text: str) -> str:
+    """SHA-256 hex digest of a chunk's text (same value as Snowflake's SHA2(text, 256))."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class LocalHashEmbedder:
+    """
+    Deterministic, dependency-free stand-in for EMBED_TEXT_768.
+    Hashes word unigrams and bigrams into signed buckets (feature hashing) and L2-normalizes,
+    so texts sharing vocabulary land close together. Lets the index be built, tested and
+    benchmarked without a Snowflake connection.
+    """
+
+    def __init__(self, dim: int = EMBED_DIM):
+        self.dim = dim
+
+    def _features(self, text: str) -> List[str]:
+        tokens = _TOKEN_RE.findall(text.lower())
+        return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+    def __call__(self, texts: Sequence[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        rows, cols, signs = [], [], []
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+                rows.append(row)
+                cols.append(h % self.dim)
+                signs.append(1.0 if h >> 63 else -1.0)
+        if rows:
+            np.add.at(out, (np.array(rows), np.array(cols)), np.array(signs, dtype=np.float32))
+        return _normalize_rows(out)
+
+
+class CortexEmbedder:
+    """
+    Embeds texts with SNOWFLAKE.CORTEX.EMBED_TEXT_768 in a single round trip per batch.
+    """
+
+    def __init__(self, session, model: str = EMBED_MODEL):
+        self.session = session
+        self.model = model
+        self.dim = EMBED_DIM
+
+    def __call__(self, texts: Sequence[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        values = ", ".join(["(?, ?)"] * len(texts))
+        params: List = []
+        for i, text in enumerate(texts):
+            params.extend([i, text])
+        query = f"""
+        SELECT IDX, SNOWFLAKE.CORTEX.EMBED_TEXT_768('{self.model}', TXT) AS EMB
+        FROM VALUES {values} AS T(IDX, TXT)
+        ORDER BY IDX;
+        """
+        rows = self.session.sql(query, params=params).collect()
+        return np.asarray([row["EMB"] for row in rows], dtype=np.float32)
+
+
+class EmbeddingIndex:
+    """
+    Local NumPy mirror of BUILDING_CODES_CHUNKS.CHUNK_EMBEDDING.
+    Chunk embeddings are computed once at ingest; upserts only re-embed new or changed text,
+    and queries embed nothing but the defect description.
+
+    Search runs in-process through a VectorSearchEngine built lazily from the matrix;
+    `approximate=None` switches to the IVF index automatically for large corpora.
+    """
+
+    def __init__(self, embedder: Optional[Embedder] = None, metric: str = "cosine",
+                 approximate: Optional[bool] = None):
+        self.embedder = embedder or LocalHashEmbedder()
+        self.metric = metric
+        self.approximate = approximate
+        self._engine: Optional[VectorSearchEngine] = None
+        self.chunk_ids: List[str] = []
+        self.titles: List[str] = []
+        self.texts: List[str] = []
+        self.hashes: List[str] = []
+        self.embeddings = np.zeros((0, getattr(self.embedder, "dim", EMBED_DIM)), dtype=np.float32)
+        self._positions: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.chunk_ids)
+
+    def upsert(self, chunks: Iterable[dict]) -> int:
+        """
+        Adds or updates chunks (rows with CHUNK_ID, SECTION_TITLE, CHUNK_TEXT keys).
+
+        Returns:
+            int: Number of chunks that had to be (re-)embedded.
+        """
+        pending: Dict[str, tuple] = {}
+        for chunk in chunks:
+            chunk_id = str(chunk["CHUNK_ID"])
+            text = chunk["CHUNK_TEXT"]
+            digest = content_hash(text)
+            pos = self._positions.get(chunk_id)
+            if pos is not None and self.hashes[pos] == digest:
+                self.titles[pos] = chunk["SECTION_TITLE"]
+                continue
+            pending[chunk_id] = (chunk_id, chunk["SECTION_TITLE"], text, digest)
+
+        if not pending:
+            return 0
+
+        vectors = np.asarray(self.embedder([p[2] for p in pending.values()]), dtype=np.float32)
+        new_rows = []
+        for (chunk_id, title, text, digest), vector in zip(pending.values(), vectors):
+            pos = self._positions.get(chunk_id)
+            if pos is None:
+                self._positions[chunk_id] = len(self.chunk_ids)
+                new_rows.append(vector)
+                self.chunk_ids.append(chunk_id)
+                self.titles.append(title)
+                self.texts.append(text)
+                self.hashes.append(digest)
+            else:
+                self.embeddings[pos] = vector
+                self.titles[pos] = title
+                self.texts[pos] = text
+                self.hashes[pos] = digest
+
+        if new_rows:
+            self.embeddings = np.ascontiguousarray(np.vstack([self.embeddings, np.asarray(new_rows)]))
+        self._engine = None
+        return len(pending)
+
+    def remove(self, chunk_ids: Iterable[str]) -> int:
+        """Drops chunks by id. Returns the number removed."""
+        drop = {str(c) for c in chunk_ids} & self._positions.keys()
+        if not drop:
+            return 0
+        keep = [i for i, cid in enumerate(self.chunk_ids) if cid not in drop]
+        self.chunk_ids = [self.chunk_ids[i] for i in keep]
+        self.titles = [self.titles[i] for i in keep]
+        self.texts = [self.texts[i] for i in keep]
+        self.hashes = [self.hashes[i] for i in keep]
+        self.embeddings = np.ascontiguousarray(self.embeddings[keep])
+        self._positions = {cid: i for i, cid in enumerate(self.chunk_ids)}
+        self._engine = None
+        return len(drop)
+
+    def embed_query(self, text: str) -> np.ndarray:
+        return np.asarray(self.embedder([text]), dtype=np.float32)[0]
+
+    @property
+    def engine(self) -> VectorSearchEngine:
+        if self._engine is None:
+            self._engine = build_engine(self.embeddings, metric=self.metric, approximate=self.approximate)
+        return self._engine
+
+    def _row(self, position: int, score: float) -> dict:
+        return {
+            "CHUNK_ID": self.chunk_ids[position],
+            "SECTION_TITLE": self.titles[position],
+            "CHUNK_TEXT": self.texts[position],
+            "SCORE": float(score),
+        }
+
+    def search_vectors(self, query_vectors: np.ndarray, k: int = 1) -> List[List[dict]]:
+        """Top-k chunks for each query vector, best first."""
+        if not len(self):
+            return [[] for _ in range(len(query_vectors))]
+        indices, scores = self.engine.search(query_vectors, k)
+        return [
+            [self._row(int(i), s) for i, s in zip(row_idx, row_scores) if i >= 0]
+            for row_idx, row_scores in zip(indices, scores)
+        ]
+
+    def search(self, text: str, k: int = 1) -> List[dict]:
+        """Top-k chunks for a query text, best first. Only the query is embedded."""
+        return self.search_vectors(self.embed_query(text)[None, :], k)[0]
+
+    def nearest(self, text: str) -> Optional[dict]:
+        """Returns the single closest chunk to the query text, or None if empty."""
+        hits = self.search(text, k=1)
+        return hits[0] if hits else None
+
+    def save(self, path: str) -> None:
+        np.savez(
+            path,
+            embeddings=self.embeddings,
+            chunk_ids=np.array(self.chunk_ids, dtype=object),
+            titles=np.array(self.titles, dtype=object),
+            texts=np.array(self.texts, dtype=object),
+            hashes=np.array(self.hashes, dtype=object),
+        )
+
+    @classmethod
+    def load(cls, path: str, embedder: Optional[Embedder] = None) -> "EmbeddingIndex":
+        index = cls(embedder)
+        with np.load(path, allow_pickle=True) as data:
+            index.embeddings = np.ascontiguousarray(data["embeddings"], dtype=np.float32)
+            index.chunk_ids = [str(x) for x in data["chunk_ids"]]
+            index.titles = [str(x) for x in data["titles"]]
+            index.texts = [str(x) for x in data["texts"]]
+            index.hashes = [str(x) for x in data["hashes"]]
+        index._positions = {cid: i for i, cid in enumerate(index.chunk_ids)}
+        return index
+
+    @classmethod
+    def from_session(cls, session, embedder: Optional[Embedder] = None) -> "EmbeddingIndex":
+        """
+        Mirrors the persisted CHUNK_EMBEDDING column locally (no re-embedding).
+        Defaults to a CortexEmbedder so query vectors live in the same space.
+        """
+        index = cls(embedder or CortexEmbedder(session))
+        rows = session.sql(LOAD_EMBEDDINGS_SQL).collect()
+        index.chunk_ids = [str(r["CHUNK_ID"]) for r in rows]
+        index.titles = [r["SECTION_TITLE"] for r in rows]
+        index.texts = [r["CHUNK_TEXT"] for r in rows]
+        index.hashes = [r["CONTENT_HASH"] for r in rows]
+        index.embeddings = np.ascontiguousarray(
+            np.asarray([r["CHUNK_EMBEDDING"] for r in rows], dtype=np.float32).reshape(len(rows), -1)
+        )
+        index._positions = {cid: i for i, cid in enumerate(index.chunk_ids)}
+        return index
+
+
+def refresh_chunk_embeddings(session) -> None:
+    """Runs the incremental in-warehouse re-embedding of new/changed chunks."""
+    session.sql(REFRESH_EMBEDDINGS_SQL).collect()
@@ -0,0 +1,185 @@
+# ============================================================================
+# SAFEHAVEN AI - BACKEND LOGIC
+# PART 7B: LOCAL FAKE HIGGSFIELD SERVER (TESTS & BENCHMARKS)
+# ============================================================================
+
+import json
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Every finished video is this MP4 header followed by zero padding up to `video_bytes`.
+FAKE_VIDEO_HEADER = b"\x00\x00\x00\x18ftypmp42"
+_CHUNK = 64 * 1024
+
+_JOB_RE = re.compile(r"^/v1/video/generation/([\w-]+)$")
+_VIDEO_RE = re.compile(r"^/v1/videos/([\w-]+)\.mp4$")
+
+
+class FakeHiggsfieldServer:
+    """
+    In-process HTTP server speaking the subset of the Higgsfield job API the client uses:
+
+        POST /v1/video/generation          -> 202 {"id", "status": "queued"}
+        GET  /v1/video/generation/<id>     -> {"id", "status", "video_url"}
+        GET  /v1/videos/<id>.mp4           -> video bytes
+
+    Jobs complete `latency` seconds after submission (or fail when the prompt contains
+    "FAIL"). Setting `throttle` answers that many upcoming requests with 429 + Retry-After;
+    `fail_after_submit` creates that many jobs but answers their POST with a 503 (a provider
+    that accepted the work and then errored).
+    Connections are HTTP/1.1 keep-alive; `connections` counts distinct client sockets.
+    Request bodies and videos are streamed in chunks, so large payloads stay out of memory.
+    Use as a context manager; `url` is the base URL to hand to HiggsfieldClient.
+    """
+
+    def __init__(self, latency: float = 0.5, host: str = "127.0.0.1", port: int = 0,
+                 video_bytes: int = 4096, throttle: int = 0, fail_after_submit: int = 0):
+        self.latency = latency
+        self.video_bytes = video_bytes
+        self.throttle = throttle
+        self.fail_after_submit = fail_after_submit
+        self.jobs = {}
+        self.requests = {"submit": 0, "poll": 0, "download": 0, "throttled": 0}
+        self._clients = set()
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def connections(self) -> int:
+        return len(self._clients)
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeHiggsfieldServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "FakeHiggsfieldServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def _job_view(self, job_id: str) -> dict:
+        job = self.jobs[job_id]
+        done = time.monotonic() - job["submitted"] >= self.latency
+        if not done:
+            status = "processing"
+        elif "FAIL" in job["prompt"]:
+            status = "failed"
+        else:
+            status = "completed"
+        view = {"id": job_id, "status": status}
+        if status == "completed":
+            view["video_url"] = f"{self.url}/v1/videos/{job_id}.mp4"
+        if status == "failed":
+            view["error"] = "Generation failed."
+        return view
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive
+
+            def log_message(self, *args):
+                pass
+
+            def _throttled(self) -> bool:
+                with server._lock:
+                    server._clients.add(self.client_address)
+                    if server.throttle <= 0:
+                        return False
+                    server.throttle -= 1
+                    server.requests["throttled"] += 1
+                self.send_response(429)
+                self.send_header("Retry-After", "0")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return True
+
+            def _read_body(self) -> tuple:
+                """Drains the request body in chunks; keeps only the head (form fields come first)."""
+                remaining = int(self.headers.get("Content-Length") or 0)
+                total, head = remaining, b""
+                while remaining:
+                    chunk = self.rfile.read(min(_CHUNK, remaining))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                    if len(head) < _CHUNK:
+                        head += chunk[:_CHUNK - len(head)]
+                return head, total
+
+            def _send(self, code: int, body: bytes, content_type: str = "application/json"):
+                self.send_response(code)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_video(self):
+                self.send_response(200)
+                self.send_header("Content-Type", "video/mp4")
+                self.send_header("Content-Length", str(server.video_bytes))
+                self.end_headers()
+                self.wfile.write(FAKE_VIDEO_HEADER)
+                remaining, zeros = server.video_bytes - len(FAKE_VIDEO_HEADER), bytes(_CHUNK)
+                while remaining > 0:
+                    self.wfile.write(zeros[:min(_CHUNK, remaining)])
+                    remaining -= _CHUNK
+
+            def _json(self, code: int, payload: dict):
+                self._send(code, json.dumps(payload).encode("utf-8"))
+
+            def do_POST(self):
+                body, length = self._read_body()
+                if self._throttled():
+                    return
+                if self.path != "/v1/video/generation":
+                    return self._json(404, {"error": "not found"})
+                prompt = ""
+                if self.headers.get("Content-Type", "").startswith("application/json"):
+                    prompt = json.loads(body or b"{}").get("prompt", "")
+                else:  # multipart: the prompt travels as a plain form field
+                    match = re.search(rb'name="prompt"\r\n\r\n(.*?)\r\n--', body, re.DOTALL)
+                    prompt = match.group(1).decode("utf-8") if match else ""
+                job_id = uuid.uuid4().hex
+                with server._lock:
+                    server.requests["submit"] += 1
+                    server.jobs[job_id] = {"prompt": prompt, "submitted": time.monotonic(), "bytes": length}
+                    fail = server.fail_after_submit > 0
+                    server.fail_after_submit -= fail
+                if fail:
+                    return self._json(503, {"error": "upstream timeout"})
+                self._json(202, {"id": job_id, "status": "queued"})
+
+            def do_GET(self):
+                if self._throttled():
+                    return
+                job = _JOB_RE.match(self.path)
+                if job and job.group(1) in server.jobs:
+                    with server._lock:
+                        server.requests["poll"] += 1
+                    return self._json(200, server._job_view(job.group(1)))
+                video = _VIDEO_RE.match(self.path)
+                if video and video.group(1) in server.jobs:
+                    with server._lock:
+                        server.requests["download"] += 1
+                    return self._send_video()
+                self._json(404, {"error": "not found"})
+
+        return Handler
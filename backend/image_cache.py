@@ -0,0 +1,95 @@
+# ============================================================================
+# SAFEHAVEN AI - BACKEND LOGIC
+# PART 2J: RESIZED IMAGE LRU CACHE
+# ============================================================================
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable, Iterable, Tuple
+
+from PIL import Image
+
+from backend.image_preprocessing import UI_SIZE
+
+# ~64 MB holds every bundled asset at banner size several times over (1200x600 RGBA ~ 2.9 MB).
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def _image_bytes(img: Image.Image) -> int:
+    return img.width * img.height * len(img.getbands())
+
+
+class ResizedImageCache:
+    """
+    Thread-safe, byte-bounded LRU cache of decoded and resized PIL images, meant to be
+    shared across Streamlit sessions (st.cache_resource). Files are keyed by absolute path,
+    mtime and target size, so an edited asset is re-decoded; uploads are keyed by content hash.
+
+    Cached images are shared: callers must treat them as read-only.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, Image.Image]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_image(self, key: Hashable, size: Tuple[int, int], loader: Callable[[], Image.Image]) -> Image.Image:
+        """
+        Returns the image for (key, size), calling `loader` and resizing only on a miss.
+
+        Args:
+            key: Stable identity of the source (e.g. an upload's content hash).
+            size (tuple): Target (width, height).
+            loader: Returns the full-size source image.
+        """
+        cache_key = (key, tuple(size))
+        with self._lock:
+            img = self._entries.get(cache_key)
+            if img is not None:
+                self._entries.move_to_end(cache_key)
+                self.hits += 1
+                return img
+            self.misses += 1
+
+        # Decode outside the lock; a concurrent miss on the same key just does the work twice.
+        source = loader()
+        img = source if source.size == tuple(size) else source.resize(tuple(size))
+        img.load()
+        nbytes = _image_bytes(img)
+        with self._lock:
+            if cache_key not in self._entries and nbytes <= self.max_bytes:
+                self._entries[cache_key] = img
+                self._bytes += nbytes
+                while self._bytes > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._bytes -= _image_bytes(evicted)
+        return img
+
+    def get_path(self, path: str, size: Tuple[int, int] = UI_SIZE) -> Image.Image:
+        """Resized image for a file on disk, keyed by (path, mtime, size)."""
+        path = os.path.abspath(path)
+        key = (path, os.stat(path).st_mtime_ns)
+        return self.get_image(key, size, lambda: Image.open(path))
+
+    def warm(self, paths: Iterable[str], size: Tuple[int, int] = UI_SIZE) -> int:
+        """Pre-resizes bundled assets (e.g. at app startup). Returns the number loaded."""
+        loaded = 0
+        for path in paths:
+            try:
+                self.get_path(path, size)
+                loaded += 1
+            except OSError:
+                continue
+        return loaded
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes,
+                    "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,107 @@
+# ============================================================================
+# SAFEHAVEN AI - BACKEND LOGIC
+# PART 2H: INGEST IMAGE PREPROCESSING
+# ============================================================================
+
+import io
+import json
+import os
+import tempfile
+from typing import BinaryIO, Union
+
+from PIL import Image, ImageOps
+
+from backend.analysis_cache import image_content_hash
+from backend.dedup import phash_batch, to_hex
+
+# Llama 3.2 Vision tiles images at 560px; 2x2 tiles is the useful upper bound.
+MODEL_MAX_SIDE = 1120
+# Banner size used by the Visual Repairs comparison slider.
+UI_SIZE = (1200, 600)
+
+DEFAULT_VARIANT_DIR = os.getenv(
+    "SAFEHAVEN_VARIANT_DIR", os.path.join(tempfile.gettempdir(), "safehaven_variants")
+)
+
+
+def perceptual_hash(img: Image.Image) -> str:
+    """64-bit DCT perceptual hash (pHash) as 16 hex chars (same bits as dedup.phash_batch)."""
+    return to_hex(phash_batch([img])[0])
+
+
+def _read_bytes(source: Union[bytes, str, BinaryIO]) -> bytes:
+    if isinstance(source, (bytes, bytearray)):
+        return bytes(source)
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            return f.read()
+    if hasattr(source, "getvalue"):  # Streamlit UploadedFile / BytesIO
+        return source.getvalue()
+    return source.read()
+
+
+def preprocess_upload(source: Union[bytes, str, BinaryIO], out_dir: str = None, filename: str = "") -> dict:
+    """
+    Generates the derived variants of an uploaded photo once, at ingest:
+    a model-sized JPEG (longest side <= MODEL_MAX_SIDE) and a UI banner (UI_SIZE),
+    both with EXIF orientation applied, plus a perceptual hash. Everything is stored next to
+    the untouched original under <out_dir>/<content hash>/, so repeated calls are free.
+
+    Args:
+        source: Image bytes, a path, or a file-like object (e.g. st.file_uploader output).
+        out_dir (str): Variant store root (defaults to SAFEHAVEN_VARIANT_DIR / temp dir).
+        filename (str): Original file name, used only for its extension.
+
+    Returns:
+        dict: content_hash, phash, width, height (oriented original) and paths
+        original_path, model_path, ui_path.
+
+    Note: model_path is local only. Nothing uploads it to @INSPECTION_ASSETS yet, so the
+    warehouse pipeline (backend/pipeline.py) still presigns and analyzes the original.
+    """
+    data = _read_bytes(source)
+    content_hash = image_content_hash(data)
+    target = os.path.join(out_dir or DEFAULT_VARIANT_DIR, content_hash)
+    meta_path = os.path.join(target, "meta.json")
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            return json.load(f)
+
+    img = Image.open(io.BytesIO(data))
+    width, height = img.size
+    # JPEG: decode at a reduced DCT scale when the original is far larger than any variant.
+    img.draft("RGB", (max(UI_SIZE), max(UI_SIZE)))
+    decoded_size = img.size
+    img = ImageOps.exif_transpose(img).convert("RGB")
+    if img.size != decoded_size:  # EXIF rotation by 90/270 degrees
+        width, height = height, width
+
+    os.makedirs(target, exist_ok=True)
+    ext = os.path.splitext(filename or getattr(source, "name", "") or "")[1].lower() or ".img"
+    original_path = os.path.join(target, f"original{ext}")
+    with open(original_path, "wb") as f:
+        f.write(data)
+
+    model_img = img.copy()
+    model_img.thumbnail((MODEL_MAX_SIDE, MODEL_MAX_SIDE), Image.Resampling.LANCZOS)
+    model_path = os.path.join(target, "model.jpg")
+    model_img.save(model_path, "JPEG", quality=90)
+
+    ui_path = os.path.join(target, "ui.jpg")
+    img.resize(UI_SIZE, Image.Resampling.LANCZOS).save(ui_path, "JPEG", quality=85)
+
+    meta = {
+        "content_hash": content_hash,
+        "phash": perceptual_hash(img),
+        "width": width,
+        "height": height,
+        "original_path": original_path,
+        "model_path": model_path,
+        "ui_path": ui_path,
+    }
+    # meta.json is written last: its presence marks a complete variant set.
+    tmp = meta_path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp, meta_path)
+    return meta
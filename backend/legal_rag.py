@@ -3,53 +3,122 @@
 # PART 2C: LEGAL SHIELD RAG
 # ============================================================================
 
+from typing import Dict, Iterable, List, Optional
+
 from snowflake.snowpark import Session
 import json
 
-def get_legal_context(session: Session, defect_description: str) -> str:
+from backend.embedding_index import EmbeddingIndex
+
+def _format_citations(rows: List[dict]) -> str:
+    if not rows:
+        return "No specific building code citation found for this issue."
+    quotes = "\n".join(f"> **{row['SECTION_TITLE']}**: \"{row['CHUNK_TEXT']}\"" for row in rows)
+    return f"**Building Code Violation Potential:**\n{quotes}\n\n*Consult a certified inspector for official verification.*"
+
+def get_legal_context(session: Session, defect_description: str, k: int = 1,
+                      index: Optional[EmbeddingIndex] = None) -> str:
     """
     Retrieves relevant building code citations for a given defect using Snowflake Cortex Search.
     
     Args:
         session (Session): The active Snowpark session.
         defect_description (str): The text description of the defect from the image analysis.
+        k (int): Number of citations to return (best match first).
+        index (EmbeddingIndex, optional): Local mirror of the chunk embeddings. When given,
+            retrieval runs in-process and no warehouse search query is issued.
         
     Returns:
         str: A formatted string containing the legal citation and context.
     """
     try:
-        # Construct the prompt for Cortex Search or RAG
-        # We query the BUILDING_CODES_CHUNKS table (Vector Store).
-        
-        # Note: In a full implementation, we'd use SNOWFLAKE.CORTEX.EMBED_TEXT
-        # to vectorize the query and perform cosine similarity against the table.
-        # Below is a simulation of that logic using a SQL query execution from Python.
-        
-        query = f"""
+        if index is not None:
+            return _format_citations(index.search(defect_description, k=k))
+
+        # Query the BUILDING_CODES_CHUNKS table (Vector Store).
+        # Chunk embeddings are precomputed at ingest (CHUNK_EMBEDDING), so only the
+        # defect description is embedded per query. The description is bound as a
+        # parameter rather than interpolated into the SQL text.
+        query = """
         SELECT 
             SECTION_TITLE, 
             CHUNK_TEXT 
         FROM BUILDING_CODES_CHUNKS
+        WHERE CHUNK_EMBEDDING IS NOT NULL
         ORDER BY VECTOR_L2_DISTANCE(
-            SNOWFLAKE.CORTEX.EMBED_TEXT_768('snowflake-arctic-embed-m', '{defect_description}'),
-            SNOWFLAKE.CORTEX.EMBED_TEXT_768('snowflake-arctic-embed-m', CHUNK_TEXT)
+            CHUNK_EMBEDDING,
+            SNOWFLAKE.CORTEX.EMBED_TEXT_768('snowflake-arctic-embed-m', ?)
         ) ASC
-        LIMIT 1;
+        LIMIT ?;
         """
         
         # Exponential backoff retry logic is implicitly handled by Snowflake driver 
         # but can be explicit here if needed.
         
-        result = session.sql(query).collect()
+        result = session.sql(query, params=[defect_description, int(k)]).collect()
         
-        if result:
-            row = result[0]
-            title = row['SECTION_TITLE']
-            text = row['CHUNK_TEXT']
-            return f"**Building Code Violation Potential:**\n> **{title}**: \"{text}\"\n\n*Consult a certified inspector for official verification.*"
-        else:
-            return "No specific building code citation found for this issue."
+        return _format_citations(result)
 
     except Exception as e:
         # Safe fallback
         return f"Legal Shield RAG Service Unavailable. (Error: {str(e)})"
+
+def get_legal_context_batch(session: Session, descriptions: Iterable[str], k: int = 1,
+                            index: Optional[EmbeddingIndex] = None) -> Dict[str, str]:
+    """
+    Resolves citations for every defect of an inspection in a single query
+    (or a single local matrix operation when an index is given).
+    
+    Args:
+        session (Session): The active Snowpark session.
+        descriptions (Iterable[str]): Defect descriptions; duplicates are looked up once.
+        k (int): Number of citations per defect.
+        index (EmbeddingIndex, optional): Local mirror of the chunk embeddings.
+        
+    Returns:
+        dict: Formatted citation string keyed by defect description.
+    """
+    unique = list(dict.fromkeys(descriptions))
+    if not unique:
+        return {}
+
+    try:
+        if index is not None:
+            query_vectors = index.embedder(unique)
+            hits = index.search_vectors(query_vectors, k=k)
+            return {desc: _format_citations(rows) for desc, rows in zip(unique, hits)}
+
+        # One round trip: embed all defects, rank every chunk per defect, keep the top k.
+        values = ", ".join(["(?)"] * len(unique))
+        query = f"""
+        WITH DEFECTS AS (
+            SELECT 
+                COLUMN1 AS DEFECT,
+                SNOWFLAKE.CORTEX.EMBED_TEXT_768('snowflake-arctic-embed-m', COLUMN1) AS DEFECT_EMBEDDING
+            FROM VALUES {values}
+        )
+        SELECT 
+            D.DEFECT,
+            C.SECTION_TITLE,
+            C.CHUNK_TEXT,
+            ROW_NUMBER() OVER (
+                PARTITION BY D.DEFECT
+                ORDER BY VECTOR_L2_DISTANCE(C.CHUNK_EMBEDDING, D.DEFECT_EMBEDDING) ASC
+            ) AS RANK_NO
+        FROM DEFECTS D
+        CROSS JOIN BUILDING_CODES_CHUNKS C
+        WHERE C.CHUNK_EMBEDDING IS NOT NULL
+        QUALIFY RANK_NO <= ?
+        ORDER BY D.DEFECT, RANK_NO;
+        """
+        result = session.sql(query, params=[*unique, int(k)]).collect()
+
+        grouped: Dict[str, List[dict]] = {desc: [] for desc in unique}
+        for row in result:
+            grouped.setdefault(row['DEFECT'], []).append(row)
+        return {desc: _format_citations(grouped[desc]) for desc in unique}
+
+    except Exception as e:
+        # Safe fallback
+        message = f"Legal Shield RAG Service Unavailable. (Error: {str(e)})"
+        return {desc: message for desc in unique}
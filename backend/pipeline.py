@@ -0,0 +1,440 @@
+# ============================================================================
+# SAFEHAVEN AI - BACKEND LOGIC
+# PART 2G: INCREMENTAL ANALYSIS PIPELINE
+# ============================================================================
+
+import json
+import os
+import time
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Optional, Sequence
+
+from backend.analysis_cache import (
+    AnalysisCache, PROMPT_VERSION, VISION_MODEL, VISION_PROMPT, image_content_hash,
+)
+from backend.validators import validate_cortex_output_batch
+
+# Near-duplicate detection needs numpy/PIL/scipy; it is imported lazily, only when a run
+# actually hashes images, so the module itself imports with snowpark + pydantic alone.
+if TYPE_CHECKING:
+    from backend.dedup import NearDuplicateIndex
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+DEFAULT_BATCH_SIZE = 16
+# Hamming radius for warehouse near-duplicate clustering (same as dedup.DEFAULT_MAX_DISTANCE).
+NEAR_DUPLICATE_DISTANCE = 10
+# Runs in which the model may return nothing for an asset before it is recorded as invalid
+# and dequeued (transient Cortex failures are retried; a poison file cannot block the queue).
+MAX_ANALYSIS_ATTEMPTS = 3
+
+# Results table columns (see INSPECTION_RESULTS in safehaven_db_setup.sql)
+RESULT_COLUMNS = (
+    "FILE_NAME", "PROPERTY_ID", "ROOM", "CONTENT_HASH", "DEFECT", "SEVERITY",
+    "VISUAL_DESCRIPTION", "RECOMMENDED_FIX", "IS_VALID", "CACHE_HIT", "DUPLICATE_OF",
+    "PHASH", "DHASH", "AI_ANALYSIS_RAW", "LAST_MODIFIED",
+)
+
+
+def parse_asset_path(relative_path: str) -> tuple:
+    """
+    Stage layout convention: <property>/<room>/<file>. Files outside it are 'Unassigned'.
+    Returns (property_id, room).
+    """
+    parts = relative_path.replace("\\", "/").split("/")
+    if len(parts) >= 3:
+        return parts[-3], parts[-2]
+    return "Unassigned", "Unassigned"
+
+
+def build_result_rows(assets: Sequence[dict], raw_outputs: Sequence[str], cache_hits: Sequence[bool],
+                      duplicate_of: Optional[Sequence[Optional[str]]] = None) -> List[dict]:
+    """
+    Validates a micro-batch of raw model outputs and shapes typed result rows.
+    Rows that could not be parsed keep the validator's fallback values with IS_VALID = False.
+    DUPLICATE_OF names the near-duplicate representative a row's analysis was copied from;
+    PHASH / DHASH are the asset's perceptual hashes (hex) when they were computed.
+    """
+    records, errors = validate_cortex_output_batch(raw_outputs)
+    duplicate_of = duplicate_of or [None] * len(assets)
+    invalid = {e["row"] for e in errors}
+    rows = []
+    for i, (asset, record) in enumerate(zip(assets, records)):
+        property_id, room = parse_asset_path(asset["RELATIVE_PATH"])
+        rows.append({
+            "FILE_NAME": asset["RELATIVE_PATH"],
+            "PROPERTY_ID": property_id,
+            "ROOM": room,
+            "CONTENT_HASH": asset["MD5"],
+            "DEFECT": record["defect"],
+            "SEVERITY": record["severity"],
+            "VISUAL_DESCRIPTION": record["visual_description"],
+            "RECOMMENDED_FIX": record["recommended_fix"],
+            "IS_VALID": i not in invalid,
+            "CACHE_HIT": bool(cache_hits[i]),
+            "DUPLICATE_OF": duplicate_of[i],
+            "PHASH": asset.get("PHASH"),
+            "DHASH": asset.get("DHASH"),
+            "AI_ANALYSIS_RAW": raw_outputs[i],
+            "LAST_MODIFIED": asset.get("LAST_MODIFIED"),
+        })
+    return rows
+
+
+def process_in_batches(assets: Iterable[dict], analyze_batch: Callable[[List[dict]], tuple],
+                       write_rows: Callable[[List[dict]], None], batch_size: int = DEFAULT_BATCH_SIZE,
+                       commit: Optional[Callable[[List[dict]], None]] = None) -> Dict[str, int]:
+    """
+    Core micro-batching loop shared by the Snowflake procedure and the local harness.
+
+    Args:
+        assets: New stage files ({RELATIVE_PATH, MD5, LAST_MODIFIED}), oldest first.
+        analyze_batch: Returns (raw_outputs, cache_hits[, duplicate_of]) for a batch of assets.
+        write_rows: Appends typed result rows to the results table.
+        batch_size (int): Files per micro-batch.
+        commit: Marks a batch as processed (advances the stream offset / manifest).
+
+    Returns:
+        dict: files, batches, invalid, cache_hits, near_duplicates counters.
+    """
+    summary = {"files": 0, "batches": 0, "invalid": 0, "cache_hits": 0, "near_duplicates": 0}
+    batch: List[dict] = []
+
+    def flush():
+        raw_outputs, cache_hits, *duplicate_of = analyze_batch(batch)
+        rows = build_result_rows(batch, raw_outputs, cache_hits, *duplicate_of)
+        write_rows(rows)
+        if commit:
+            commit(batch)
+        summary["files"] += len(rows)
+        summary["batches"] += 1
+        summary["invalid"] += sum(not r["IS_VALID"] for r in rows)
+        summary["cache_hits"] += sum(r["CACHE_HIT"] for r in rows)
+        summary["near_duplicates"] += sum(r["DUPLICATE_OF"] is not None for r in rows)
+
+    for asset in assets:
+        batch.append(asset)
+        if len(batch) >= batch_size:
+            flush()
+            batch = []
+    if batch:
+        flush()
+    return summary
+
+
+# ----------------------------------------------------------------------------
+# Snowflake: stored procedure handler (PROCESS_NEW_ASSETS)
+# ----------------------------------------------------------------------------
+
+_DRAIN_STREAM_SQL = """
+INSERT INTO PENDING_ASSETS (RELATIVE_PATH, MD5, LAST_MODIFIED)
+SELECT RELATIVE_PATH, MD5, LAST_MODIFIED
+FROM INSPECTION_ASSETS_STREAM
+WHERE METADATA$ACTION = 'INSERT'
+  AND (RELATIVE_PATH ILIKE '%.jpg' OR RELATIVE_PATH ILIKE '%.jpeg' OR RELATIVE_PATH ILIKE '%.png');
+"""
+
+_NEXT_BATCH_SQL = f"""
+SELECT P.RELATIVE_PATH, P.MD5, P.LAST_MODIFIED, P.ATTEMPTS, C.AI_ANALYSIS_RAW AS CACHED_RAW
+FROM (SELECT * FROM PENDING_ASSETS ORDER BY LAST_MODIFIED, RELATIVE_PATH LIMIT ?) P
+LEFT JOIN ANALYSIS_CACHE C
+    ON C.CONTENT_HASH = P.MD5 AND C.MODEL = '{VISION_MODEL}' AND C.PROMPT_VERSION = '{PROMPT_VERSION}'
+ORDER BY P.LAST_MODIFIED, P.RELATIVE_PATH;
+"""
+
+
+# Cluster representatives already stored for the given properties (valid, hashed, not duplicates).
+_REPRESENTATIVES_SQL = """
+SELECT PROPERTY_ID, FILE_NAME, PHASH, DHASH, AI_ANALYSIS_RAW
+FROM INSPECTION_RESULTS
+WHERE PROPERTY_ID IN ({}) AND IS_VALID AND DUPLICATE_OF IS NULL AND PHASH IS NOT NULL
+ORDER BY PROCESSED_AT, FILE_NAME;
+"""
+
+
+def _set_hashes(asset: dict, hashes: Optional[tuple]) -> None:
+    """Stores (phash, dhash) on an asset as the hex strings persisted in PHASH / DHASH."""
+    asset["PHASH"], asset["DHASH"] = (f"{hashes[0]:016x}", f"{hashes[1]:016x}") if hashes else (None, None)
+
+
+def _stage_image_hashes(session, assets: List[dict]) -> Dict[str, tuple]:
+    """
+    (phash, dhash) per RELATIVE_PATH, each image streamed from @INSPECTION_ASSETS and decoded
+    once. Files that cannot be read or decoded are left out and analyzed on their own.
+    """
+    from backend.dedup import image_hashes
+    hashes = {}
+    for asset in assets:
+        try:
+            with session.file.get_stream(f"@INSPECTION_ASSETS/{asset['RELATIVE_PATH']}") as stream:
+                phashes, dhashes = image_hashes([stream.read()])
+        except Exception:  # unreadable or not an image; clustering is only an optimization
+            continue
+        hashes[asset["RELATIVE_PATH"]] = (int(phashes[0]), int(dhashes[0]))
+    return hashes
+
+
+class _PropertyClusters:
+    """
+    Warehouse near-duplicate clustering: one NearDuplicateIndex per property, seeded with the
+    representatives already in INSPECTION_RESULTS, so a re-shot uploaded in a later run still
+    reuses the analysis of the photo that was sent to the model.
+    """
+
+    def __init__(self, session, max_distance: int = NEAR_DUPLICATE_DISTANCE):
+        self.session = session
+        self.max_distance = max_distance
+        self.raw: Dict[str, str] = {}  # stored representative -> its raw analysis
+        self._indexes: Dict[str, "NearDuplicateIndex"] = {}
+
+    def _load(self, property_ids: Iterable[str]) -> None:
+        from backend.dedup import NearDuplicateIndex
+        missing = sorted(set(property_ids) - self._indexes.keys())
+        if not missing:
+            return
+        for property_id in missing:
+            self._indexes[property_id] = NearDuplicateIndex(self.max_distance)
+        sql = _REPRESENTATIVES_SQL.format(", ".join(["?"] * len(missing)))
+        for r in self.session.sql(sql, params=missing).collect():
+            r = r.as_dict() if hasattr(r, "as_dict") else dict(r)
+            self._indexes[r["PROPERTY_ID"]].assign(
+                r["FILE_NAME"], int(r["PHASH"], 16), int(r["DHASH"], 16) if r["DHASH"] else None
+            )
+            self.raw[r["FILE_NAME"]] = r["AI_ANALYSIS_RAW"]
+
+    def assign(self, assets: List[dict], hashes: Dict[str, tuple]) -> Dict[str, Optional[str]]:
+        """Representative path per hashed asset (None for new representatives), in input order."""
+        hashed = [a for a in assets if a["RELATIVE_PATH"] in hashes]
+        self._load(parse_asset_path(a["RELATIVE_PATH"])[0] for a in hashed)
+        return {a["RELATIVE_PATH"]: self._indexes[parse_asset_path(a["RELATIVE_PATH"])[0]].assign(
+                    a["RELATIVE_PATH"], *hashes[a["RELATIVE_PATH"]])
+                for a in hashed}
+
+
+def _analyze_in_warehouse(session, paths_by_hash: Dict[str, str]) -> Dict[str, str]:
+    """
+    One AI_COMPLETE per distinct uncached image in the batch; results are merged into the cache.
+    Images the model returned nothing for are left out (and not cached), so they can be retried.
+    """
+    if not paths_by_hash:
+        return {}
+    values = ", ".join(["(?, ?)"] * len(paths_by_hash))
+    params: List = []
+    for content_hash, path in paths_by_hash.items():
+        params.extend([content_hash, path])
+    rows = session.sql(f"""
+        SELECT CONTENT_HASH, SNOWFLAKE.CORTEX.AI_COMPLETE(
+            '{VISION_MODEL}',
+            OBJECT_CONSTRUCT('image', GET_PRESIGNED_URL(@INSPECTION_ASSETS, RELATIVE_PATH), 'prompt', ?)
+        ) AS AI_ANALYSIS_RAW
+        FROM VALUES {values} AS T(CONTENT_HASH, RELATIVE_PATH);
+    """, params=[VISION_PROMPT, *params]).collect()
+    fresh = {r["CONTENT_HASH"]: r["AI_ANALYSIS_RAW"] for r in rows if r["AI_ANALYSIS_RAW"]}
+
+    if fresh:
+        merge_values = ", ".join(["(?, ?)"] * len(fresh))
+        merge_params: List = []
+        for content_hash, raw in fresh.items():
+            merge_params.extend([content_hash, raw])
+        session.sql(f"""
+            MERGE INTO ANALYSIS_CACHE C
+            USING (SELECT COLUMN1 AS CONTENT_HASH, COLUMN2 AS AI_ANALYSIS_RAW FROM VALUES {merge_values}) A
+                ON C.CONTENT_HASH = A.CONTENT_HASH AND C.MODEL = '{VISION_MODEL}' AND C.PROMPT_VERSION = '{PROMPT_VERSION}'
+            WHEN NOT MATCHED THEN INSERT (CONTENT_HASH, MODEL, PROMPT_VERSION, AI_ANALYSIS_RAW)
+                VALUES (A.CONTENT_HASH, '{VISION_MODEL}', '{PROMPT_VERSION}', A.AI_ANALYSIS_RAW);
+        """, params=merge_params).collect()
+    return fresh
+
+
+def _write_and_dequeue(session, rows: List[dict]) -> None:
+    """
+    Appends a batch's result rows and removes exactly those (RELATIVE_PATH, MD5) entries from
+    PENDING_ASSETS in one transaction. A run that dies in between leaves both untouched, and a
+    file re-uploaded to the same path mid-batch (new MD5) stays queued for the next run.
+    """
+    values = ", ".join(["(" + ", ".join(["?"] * len(RESULT_COLUMNS)) + ")"] * len(rows))
+    keys = ", ".join(["(?, ?)"] * len(rows))
+    session.sql("BEGIN;").collect()
+    try:
+        session.sql(f"INSERT INTO INSPECTION_RESULTS ({', '.join(RESULT_COLUMNS)}) VALUES {values};",
+                    params=[row[c] for row in rows for c in RESULT_COLUMNS]).collect()
+        session.sql(f"""
+            DELETE FROM PENDING_ASSETS P
+            USING (SELECT COLUMN1 AS RELATIVE_PATH, COLUMN2 AS MD5 FROM VALUES {keys}) D
+            WHERE P.RELATIVE_PATH = D.RELATIVE_PATH AND P.MD5 = D.MD5;
+        """, params=[v for row in rows for v in (row["FILE_NAME"], row["CONTENT_HASH"])]).collect()
+        session.sql("COMMIT;").collect()
+    except Exception:
+        session.sql("ROLLBACK;").collect()
+        raise
+
+
+def _defer(session, assets: List[dict]) -> None:
+    """Leaves assets queued for the next run, counting the failed attempt."""
+    keys = ", ".join(["(?, ?)"] * len(assets))
+    session.sql(f"""
+        UPDATE PENDING_ASSETS P SET ATTEMPTS = P.ATTEMPTS + 1
+        FROM (SELECT COLUMN1 AS RELATIVE_PATH, COLUMN2 AS MD5 FROM VALUES {keys}) D
+        WHERE P.RELATIVE_PATH = D.RELATIVE_PATH AND P.MD5 = D.MD5;
+    """, params=[v for a in assets for v in (a["RELATIVE_PATH"], a["MD5"])]).collect()
+
+
+def run_incremental_batch(session, batch_size: int = DEFAULT_BATCH_SIZE, max_batches: Optional[int] = None,
+                          near_duplicate_distance: Optional[int] = NEAR_DUPLICATE_DISTANCE) -> dict:
+    """
+    Handler for the PROCESS_NEW_ASSETS stored procedure.
+    Drains the stage stream into PENDING_ASSETS (advancing the stream offset), then processes
+    pending files in micro-batches: cached analyses are reused, near-duplicate shots of the same
+    property (perceptual hashes within `near_duplicate_distance` bits; None disables) reuse their
+    representative's analysis, the model is called once per remaining distinct new image, and
+    validated rows are appended to INSPECTION_RESULTS in the same transaction that dequeues them.
+    Assets the model returned nothing for stay queued and are retried by later runs, up to
+    MAX_ANALYSIS_ATTEMPTS.
+    """
+    session.sql(_DRAIN_STREAM_SQL).collect()
+    summary = {"files": 0, "batches": 0, "invalid": 0, "cache_hits": 0, "near_duplicates": 0, "deferred": 0}
+    clusters = _PropertyClusters(session, near_duplicate_distance) if near_duplicate_distance is not None else None
+
+    while max_batches is None or summary["batches"] < max_batches:
+        batch = [r.as_dict() if hasattr(r, "as_dict") else dict(r)
+                 for r in session.sql(_NEXT_BATCH_SQL, params=[int(batch_size)]).collect()]
+        if not batch:
+            break
+
+        hashes = _stage_image_hashes(session, batch) if clusters is not None else {}
+        duplicate_of = clusters.assign(batch, hashes) if hashes else {}
+        for a in batch:
+            _set_hashes(a, hashes.get(a["RELATIVE_PATH"]))
+
+        # Only uncached cluster representatives reach the model.
+        misses = {a["MD5"]: a["RELATIVE_PATH"] for a in batch
+                  if a["CACHED_RAW"] is None and duplicate_of.get(a["RELATIVE_PATH"]) is None}
+        fresh = _analyze_in_warehouse(session, misses)
+        raw: Dict[str, Optional[str]] = {}
+        for a in batch:  # a representative always precedes its duplicates in the batch
+            rep = duplicate_of.get(a["RELATIVE_PATH"])
+            if a["CACHED_RAW"] is not None:
+                raw[a["RELATIVE_PATH"]] = a["CACHED_RAW"]
+            elif rep is not None:
+                raw[a["RELATIVE_PATH"]] = raw[rep] if rep in raw else clusters.raw.get(rep)
+            else:
+                raw[a["RELATIVE_PATH"]] = fresh.get(a["MD5"])
+        # No result (transient model failure): keep the asset queued unless it is out of attempts,
+        # in which case it is written as an invalid row like any unparseable output.
+        retry = [a for a in batch if raw[a["RELATIVE_PATH"]] is None
+                 and (a.get("ATTEMPTS") or 0) + 1 < MAX_ANALYSIS_ATTEMPTS]
+        retry_paths = {a["RELATIVE_PATH"] for a in retry}
+        done = [a for a in batch if a["RELATIVE_PATH"] not in retry_paths]
+
+        def analyze_batch(assets):
+            return ([raw[a["RELATIVE_PATH"]] or "" for a in assets],
+                    [a["CACHED_RAW"] is not None for a in assets],
+                    [duplicate_of.get(a["RELATIVE_PATH"]) for a in assets])
+
+        def write_rows(rows):
+            _write_and_dequeue(session, rows)
+
+        if done:
+            result = process_in_batches(done, analyze_batch, write_rows, batch_size=batch_size)
+            for key, value in result.items():
+                summary[key] += value
+        if retry:
+            _defer(session, retry)
+            summary["deferred"] += len(retry)
+            break  # the same assets would head the next batch; retry them on the next run
+    return summary
+
+
+# ----------------------------------------------------------------------------
+# Local simulation harness (fake stage directory)
+# ----------------------------------------------------------------------------
+
+class LocalStage:
+    """
+    Fake INSPECTION_ASSETS stage backed by a directory. A manifest of processed files plays the
+    role of the stream offset, so each run only sees files added since the last one.
+    """
+
+    MANIFEST = ".processed.json"
+
+    def __init__(self, root: str):
+        self.root = root
+        self._manifest_path = os.path.join(root, self.MANIFEST)
+        try:
+            with open(self._manifest_path) as f:
+                self._processed = set(json.load(f))
+        except FileNotFoundError:
+            self._processed = set()
+
+    def new_files(self) -> List[dict]:
+        """Unprocessed image files, oldest first (like the stream's INSERT rows)."""
+        found = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if not name.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                full = os.path.join(dirpath, name)
+                rel = os.path.relpath(full, self.root).replace(os.sep, "/")
+                if rel not in self._processed:
+                    found.append({"RELATIVE_PATH": rel, "MD5": image_content_hash(full),
+                                  "LAST_MODIFIED": os.path.getmtime(full)})
+        return sorted(found, key=lambda a: (a["LAST_MODIFIED"], a["RELATIVE_PATH"]))
+
+    def commit(self, assets: Iterable[dict]) -> None:
+        self._processed.update(a["RELATIVE_PATH"] for a in assets)
+        tmp = self._manifest_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(sorted(self._processed), f)
+        os.replace(tmp, self._manifest_path)
+
+
+def _near_duplicate_of(index: "NearDuplicateIndex", asset: dict, path: str) -> Optional[str]:
+    from backend.dedup import image_hashes
+    try:
+        phashes, dhashes = image_hashes([path])  # one decode for both hashes
+    except OSError:  # not a decodable image; analyze it on its own
+        return None
+    _set_hashes(asset, (int(phashes[0]), int(dhashes[0])))
+    return index.assign(asset["RELATIVE_PATH"], phashes[0], dhashes[0])
+
+
+def run_local_pipeline(stage: LocalStage, analyze: Callable[[str], str], results_path: str,
+                       batch_size: int = DEFAULT_BATCH_SIZE, cache: Optional[AnalysisCache] = None,
+                       near_duplicate_distance: Optional[int] = None) -> dict:
+    """
+    Processes newly added files in a LocalStage and appends result rows to a JSON-lines file.
+    `analyze(path)` stands in for the vision model; with a cache, duplicates skip it.
+    With `near_duplicate_distance`, near-identical shots in the run (perceptual hashes within
+    that many bits) reuse their representative's analysis and record it in DUPLICATE_OF.
+    """
+    index = None
+    if near_duplicate_distance is not None:
+        from backend.dedup import NearDuplicateIndex
+        index = NearDuplicateIndex(near_duplicate_distance)
+    representative_raw: Dict[str, str] = {}
+
+    def analyze_batch(assets):
+        raw, hits, duplicate_of = [], [], []
+        for asset in assets:
+            path = os.path.join(stage.root, asset["RELATIVE_PATH"])
+            rep = _near_duplicate_of(index, asset, path) if index is not None else None
+            duplicate_of.append(rep)
+            if rep is not None:
+                # Reused analysis, but not an exact-content cache hit: DUPLICATE_OF records it.
+                raw.append(representative_raw[rep])
+                hits.append(False)
+                continue
+            if cache is None:
+                raw.append(analyze(path))
+                hits.append(False)
+            else:
+                before = cache.hits
+                raw.append(cache.get_or_analyze(path, analyze, content_hash=asset["MD5"]))
+                hits.append(cache.hits > before)
+            representative_raw[asset["RELATIVE_PATH"]] = raw[-1]
+        return raw, hits, duplicate_of
+
+    def write_rows(rows):
+        with open(results_path, "a") as f:
+            for row in rows:
+                f.write(json.dumps(dict(row, PROCESSED_AT=time.time())) + "\n")
+
+    return process_in_batches(stage.new_files(), analyze_batch, write_rows, batch_size=batch_size, commit=stage.commit)
@@ -5,45 +5,231 @@
 
 from fpdf import FPDF
 import os
+import re
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+from typing import Callable, Iterable, Optional, Tuple
 
-def generate_inspection_report(property_address: str, inspection_data: dict) -> str:
+# Unique per-export files land here (override with SAFEHAVEN_REPORT_DIR). Callers own them.
+DEFAULT_REPORT_DIR = os.getenv(
+    "SAFEHAVEN_REPORT_DIR", os.path.join(tempfile.gettempdir(), "safehaven_reports")
+)
+
+REPORT_FONT = "Arial"
+REPORT_TITLE = "SafeHaven AI Inspection Report"
+REPORT_FOOTER = "Generated by SafeHaven AI (Powered by Snowflake Cortex)"
+# (style, size) pairs the template uses; their metrics are loaded once per process.
+REPORT_FONT_STYLES = (("B", 16), ("I", 12), ("", 12), ("I", 10))
+
+# Batch export: records travel to workers in chunks (one report is only ~0.3 ms of work,
+# less than the per-task IPC cost), with at most BATCH_WINDOW chunks in flight per worker.
+BATCH_CHUNK = 16
+BATCH_WINDOW = 2
+
+# fpdf's core fonts only cover latin-1: common typography is transliterated, anything else
+# (CJK, emoji, ...) is replaced with '?' rather than failing the whole report.
+_LATIN1_FALLBACKS = str.maketrans({
+    "\u2018": "'", "\u2019": "'", "\u201c": '"', "\u201d": '"',
+    "\u2013": "-", "\u2014": "-", "\u2026": "...", "\u2022": "-", "\u20ac": "EUR",
+})
+
+_fonts_lock = threading.Lock()
+_fonts_ready = False
+
+
+class InspectionReportPDF(FPDF):
     """
-    Generates a PDF summary of the inspection.
-    
+    Page template for inspection reports: title, property line and rule are drawn by
+    header() on every page, so long finding lists flow onto extra pages unchanged.
+    One instance per report (FPDF objects are not thread-safe); the class and the
+    core-font metrics it uses are shared.
+    """
+
+    def __init__(self, property_address: str):
+        super().__init__()
+        self.property_address = property_address
+
+    def header(self):
+        self.set_font(REPORT_FONT, 'B', 16)
+        self.cell(200, 10, txt=REPORT_TITLE, ln=1, align='C')
+        self.set_font(REPORT_FONT, 'I', 12)
+        self.cell(200, 10, txt=_latin1(f"Property: {self.property_address}"), ln=1, align='C')
+        self.line(10, 30, 200, 30)
+
+
+def _latin1(text) -> str:
+    return str(text).translate(_LATIN1_FALLBACKS).encode("latin-1", "replace").decode("latin-1")
+
+
+def _load_fonts() -> None:
+    """Loads the core-font metric files once (fpdf caches them in a module-level table)."""
+    global _fonts_ready
+    if _fonts_ready:
+        return
+    with _fonts_lock:
+        if not _fonts_ready:
+            warm = FPDF()
+            for style, size in REPORT_FONT_STYLES:
+                warm.set_font(REPORT_FONT, style, size)
+            _fonts_ready = True
+
+
+def render_inspection_report(property_address: str, inspection_data: dict) -> bytes:
+    """
+    Renders the inspection PDF entirely in memory (e.g. for `st.download_button`).
+
     Args:
         property_address (str): Name/Address of property.
         inspection_data (dict): Aggregated findings.
-        
+
     Returns:
-        str: Path to the generated PDF file.
+        bytes: The PDF document.
     """
-    pdf = FPDF()
+    _load_fonts()
+    pdf = InspectionReportPDF(property_address)
     pdf.add_page()
-    
-    # Header
-    pdf.set_font("Arial", 'B', 16)
-    pdf.cell(200, 10, txt=f"SafeHaven AI Inspection Report", ln=1, align='C')
-    
-    pdf.set_font("Arial", 'I', 12)
-    pdf.cell(200, 10, txt=f"Property: {property_address}", ln=1, align='C')
-    pdf.line(10, 30, 200, 30)
-    
+
     # Body
     pdf.ln(20)
-    pdf.set_font("Arial", '', 12)
-    
+    pdf.set_font(REPORT_FONT, '', 12)
+
     pdf.cell(200, 10, txt="Inspection Summary:", ln=1)
-    
+
     for key, value in inspection_data.items():
-        pdf.cell(200, 10, txt=f"- {key}: {value}", ln=1)
-        
+        pdf.cell(200, 10, txt=_latin1(f"- {key}: {value}"), ln=1)
+
     pdf.ln(20)
-    pdf.set_font("Arial", 'I', 10)
-    pdf.cell(200, 10, txt="Generated by SafeHaven AI (Powered by Snowflake Cortex)", ln=1)
-    
-    # Output
+    pdf.set_font(REPORT_FONT, 'I', 10)
+    pdf.cell(200, 10, txt=REPORT_FOOTER, ln=1)
+
+    # fpdf 1.7 returns the document as a latin-1 str
+    return pdf.output(dest='S').encode("latin-1")
+
+
+def generate_inspection_report(property_address: str, inspection_data: dict,
+                               output_dir: Optional[str] = None) -> str:
+    """
+    Generates a PDF summary of the inspection.
+
+    Args:
+        property_address (str): Name/Address of property.
+        inspection_data (dict): Aggregated findings.
+        output_dir (str, optional): Directory for the file (default DEFAULT_REPORT_DIR).
+
+    Returns:
+        str: Path to the generated PDF file. Every call gets its own file, so concurrent
+        exports never overwrite each other. The caller owns the file and must delete it
+        when done (nothing cleans DEFAULT_REPORT_DIR); prefer render_inspection_report
+        when the PDF is only served or uploaded.
+    """
+    data = render_inspection_report(property_address, inspection_data)
+
     # In a real Snowflake app, this would write to /tmp or a Stage
-    output_path = os.path.join(os.path.dirname(__file__), "inspection_report.pdf")
-    pdf.output(output_path)
-    
+    output_dir = output_dir or DEFAULT_REPORT_DIR
+    os.makedirs(output_dir, exist_ok=True)
+    fd, output_path = tempfile.mkstemp(prefix="inspection_report_", suffix=".pdf", dir=output_dir)
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+
     return output_path
+
+
+# ----------------------------------------------------------------------------
+# Portfolio batch export
+# ----------------------------------------------------------------------------
+
+def _report_filename(index: int, property_address: str) -> str:
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", property_address).strip("_")[:60] or "property"
+    return f"{index:05d}_{slug}.pdf"
+
+
+def _render_chunk(chunk: list) -> list:
+    """Worker: renders [(index, address, data), ...]. Returns [(index, address, pdf, error)]."""
+    rendered = []
+    for index, address, data in chunk:
+        try:
+            rendered.append((index, address, render_inspection_report(address, data), None))
+        except Exception as e:
+            rendered.append((index, address, None, str(e)))
+    return rendered
+
+
+def _chunks(records: Iterable[Tuple[str, dict]], size: int):
+    numbered = ((i, address, data) for i, (address, data) in enumerate(records))
+    while True:
+        chunk = list(islice(numbered, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def export_reports_zip(records: Iterable[Tuple[str, dict]], destination, workers: int = None,
+                       progress: Optional[Callable[[int, Optional[int]], None]] = None) -> dict:
+    """
+    Renders one inspection report per record across a process pool and streams them into a ZIP.
+
+    Records are pulled lazily and only a bounded window of rendered PDFs is held at once,
+    so memory stays flat however long the portfolio is. Chunks that finish early wait in a
+    small reorder buffer (counted against the same window), so entries are written in input
+    order and the archive is identical for any worker count. PDFs are stored, not deflated
+    (their page streams are already compressed), as `<input index>_<address>.pdf`.
+
+    Args:
+        records (Iterable[tuple]): (property_address, inspection_data) pairs; may be a generator.
+        destination (str | file): ZIP path or writable binary file object.
+        workers (int): Render processes (defaults to os.cpu_count(); 1 renders in-process).
+        progress (callable, optional): Called as progress(done, total) after each report;
+            total is None when `records` has no len().
+
+    Returns:
+        dict: {reports, failed: [(input index, address, error)], bytes}
+    """
+    total = len(records) if hasattr(records, "__len__") else None
+    workers = workers or os.cpu_count() or 1
+    summary = {"reports": 0, "failed": [], "bytes": 0}
+    done = 0
+
+    with zipfile.ZipFile(destination, "w", compression=zipfile.ZIP_STORED) as archive:
+        def write(rendered):
+            nonlocal done
+            for index, address, pdf, error in rendered:
+                if error is None:
+                    archive.writestr(_report_filename(index, address), pdf)
+                    summary["reports"] += 1
+                    summary["bytes"] += len(pdf)
+                else:
+                    summary["failed"].append((index, address, error))
+                done += 1
+                if progress is not None:
+                    progress(done, total)
+
+        chunks = _chunks(records, BATCH_CHUNK)
+        if workers == 1:
+            for chunk in chunks:
+                write(_render_chunk(chunk))
+            return summary
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = {}            # future -> chunk sequence number
+            ready = {}              # finished chunks waiting for their turn
+            next_seq = 0
+
+            def drain():
+                nonlocal next_seq
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    ready[pending.pop(future)] = future.result()
+                while next_seq in ready:
+                    write(ready.pop(next_seq))
+                    next_seq += 1
+
+            for seq, chunk in enumerate(chunks):
+                pending[pool.submit(_render_chunk, chunk)] = seq
+                while len(pending) + len(ready) >= workers * BATCH_WINDOW:
+                    drain()
+            while pending:
+                drain()
+    return summary
@@ -0,0 +1,222 @@
+# ============================================================================
+# SAFEHAVEN AI - BACKEND LOGIC
+# PART 1B: SNOWPARK SESSION POOL
+# ============================================================================
+
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional
+
+DEFAULT_POOL_SIZE = 4
+# A checked-out session idle longer than this is pinged before reuse.
+HEALTH_CHECK_INTERVAL_S = 60.0
+HEALTH_CHECK_SQL = "SELECT 1;"
+ACQUIRE_TIMEOUT_S = 30.0
+
+# Connection settings for running outside Snowflake. Inside Snowflake the platform-managed
+# active session is used directly and needs no pool.
+CONNECTION_ENV = {
+    "account": "SNOWFLAKE_ACCOUNT",
+    "user": "SNOWFLAKE_USER",
+    "password": "SNOWFLAKE_PASSWORD",
+    "role": "SNOWFLAKE_ROLE",
+    "warehouse": "SNOWFLAKE_WAREHOUSE",
+    "database": "SNOWFLAKE_DATABASE",
+    "schema": "SNOWFLAKE_SCHEMA",
+}
+CONNECTION_DEFAULTS = {"warehouse": "COMPUTE_WH", "database": "SAFEHAVEN_DB", "schema": "APP"}
+
+# Session/token expiry and dropped connections (Snowflake error codes 390112/390114, 08001).
+_CONNECTION_ERROR_RE = re.compile(
+    r"expired|390112|390114|session (?:no longer exists|is closed)|connection (?:closed|reset|refused)|08001",
+    re.IGNORECASE,
+)
+
+
+def is_connection_error(exc: BaseException) -> bool:
+    """True for errors that mean the session itself is dead (vs. a bad query)."""
+    return bool(_CONNECTION_ERROR_RE.search(f"{type(exc).__name__}: {exc}"))
+
+
+def connection_params_from_env() -> Optional[dict]:
+    """Snowpark connection configs from SNOWFLAKE_* variables, or None if not configured."""
+    params = {key: os.getenv(env, CONNECTION_DEFAULTS.get(key)) for key, env in CONNECTION_ENV.items()}
+    if not (params["account"] and params["user"]):
+        return None
+    return {k: v for k, v in params.items() if v}
+
+
+def default_session_factory() -> Optional[Callable]:
+    """A Session.builder factory when SNOWFLAKE_* credentials are set, otherwise None."""
+    params = connection_params_from_env()
+    if params is None:
+        return None
+    from snowflake.snowpark import Session
+    return lambda: Session.builder.configs(params).create()
+
+
+class SessionPool:
+    """
+    Fixed-size, thread-safe pool of warm Snowpark sessions for one server process.
+    Sessions are created lazily up to `size`, checked out with `session()` and returned
+    afterwards. Idle sessions are health-checked before reuse, and a session that fails
+    a health check or raises a connection error is closed and replaced.
+    """
+
+    def __init__(self, factory: Callable, size: int = DEFAULT_POOL_SIZE,
+                 health_check_interval: float = HEALTH_CHECK_INTERVAL_S,
+                 acquire_timeout: float = ACQUIRE_TIMEOUT_S):
+        self.factory = factory
+        self.size = size
+        self.health_check_interval = health_check_interval
+        self.acquire_timeout = acquire_timeout
+        self._idle: List[tuple] = []  # (session, last_used); popped LIFO to keep the warmest in use
+        self._created = 0
+        self._lock = threading.Lock()
+        # Signalled whenever a session is returned or a slot frees up (discard, failed create),
+        # so a waiting caller takes either one instead of waiting out its timeout.
+        self._available = threading.Condition(self._lock)
+        self.reconnects = 0
+
+    def _healthy(self, session) -> bool:
+        try:
+            session.sql(HEALTH_CHECK_SQL).collect()
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, session, reconnect: bool = False) -> None:
+        try:
+            session.close()
+        except Exception:
+            pass
+        with self._available:
+            self._created -= 1
+            if reconnect:
+                self.reconnects += 1
+            self._available.notify()
+
+    def _release(self, session) -> None:
+        with self._available:
+            self._idle.append((session, time.monotonic()))
+            self._available.notify()
+
+    def _acquire(self):
+        deadline = time.monotonic() + self.acquire_timeout
+        with self._available:
+            while not self._idle and self._created >= self.size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"No Snowpark session available within {self.acquire_timeout}s")
+                self._available.wait(remaining)
+            if self._idle:
+                session, last_used = self._idle.pop()
+            else:
+                self._created += 1
+                session = None
+
+        if session is None:
+            try:
+                return self.factory()
+            except Exception:
+                with self._available:
+                    self._created -= 1
+                    self._available.notify()
+                raise
+
+        if time.monotonic() - last_used > self.health_check_interval and not self._healthy(session):
+            self._discard(session, reconnect=True)
+            return self._acquire()
+        return session
+
+    @contextmanager
+    def session(self) -> Iterator:
+        """Checks out a session for the duration of the `with` block."""
+        session = self._acquire()
+        try:
+            yield session
+        except Exception as exc:
+            if is_connection_error(exc):
+                self._discard(session, reconnect=True)
+                session = None
+            raise
+        finally:
+            if session is not None:
+                self._release(session)
+
+    def run(self, fn: Callable, *args, retries: int = 1, **kwargs):
+        """
+        Calls fn(session, *args, **kwargs) with a pooled session, retrying on a fresh
+        session when the first one turns out to be expired.
+        """
+        for attempt in range(retries + 1):
+            try:
+                with self.session() as session:
+                    return fn(session, *args, **kwargs)
+            except Exception as exc:
+                if attempt == retries or not is_connection_error(exc):
+                    raise
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for session, _ in idle:
+            self._discard(session)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": self.size, "open": self._created, "idle": len(self._idle),
+                    "reconnects": self.reconnects}
+
+
+def create_session_pool(size: int = DEFAULT_POOL_SIZE) -> Optional[SessionPool]:
+    """A SessionPool over default_session_factory(), or None when no credentials are set."""
+    factory = default_session_factory()
+    return SessionPool(factory, size=size) if factory else None
+
+
+# ----------------------------------------------------------------------------
+# Local mock session (tests and offline development)
+# ----------------------------------------------------------------------------
+
+class MockSession:
+    """
+    Minimal stand-in for snowflake.snowpark.Session: records every `sql(query, params)`
+    call and returns canned rows from the first matching (regex, rows) response.
+    `expire()` makes later calls fail the way an expired token does.
+    """
+
+    _ids = 0
+
+    def __init__(self, responses: Optional[List[tuple]] = None):
+        MockSession._ids += 1
+        self.id = MockSession._ids
+        self.responses = responses or []
+        self.queries: List[tuple] = []
+        self.closed = False
+        self.expired = False
+
+    def expire(self) -> None:
+        self.expired = True
+
+    def sql(self, query: str, params=None) -> "MockSession._Result":
+        if self.closed or self.expired:
+            raise RuntimeError("390114: Authentication token has expired. The user must authenticate again.")
+        self.queries.append((query, params))
+        for pattern, rows in self.responses:
+            if re.search(pattern, query, re.IGNORECASE):
+                return self._Result(rows)
+        return self._Result([])
+
+    def close(self) -> None:
+        self.closed = True
+
+    class _Result:
+        def __init__(self, rows):
+            self._rows = rows
+
+        def collect(self):
+            return list(self._rows)
@@ -5,29 +5,117 @@
 
 import re
 import html
+from typing import Iterable
+
+import pandas as pd
+
+# Tag openers, compiled once. Every search below starts at or after the previous one
+# and each "next '>' / next newline" lookup is remembered until the scan passes it,
+# so sanitizing is linear in the input size (no regex backtracking across the payload).
+# A tag name must end at whitespace, '/' or '>', so prose like "<scripted" or "<linked" is not a tag.
+_SCRIPT_OPEN = re.compile(r'<script(?=[\s/>])', re.IGNORECASE)
+_SCRIPT_CLOSE = re.compile(r'</script>', re.IGNORECASE)
+_BLOCKED_TAG = re.compile(r'<(/?)(iframe|object|embed|applet|style|meta|link)(?=[\s/>])', re.IGNORECASE)
+
+
+def _strip_scripts(text: str) -> str:
+    """
+    Removes `<script ...>...</script>` blocks. A script tag that is opened but never closed is
+    dropped together with everything after it, as a browser would treat that text as script.
+    """
+    out, pos = [], 0
+    while True:
+        m = _SCRIPT_OPEN.search(text, pos)
+        if m is None:
+            out.append(text[pos:])
+            break
+        out.append(text[pos:m.start()])
+        gt = text.find('>', m.end())
+        if gt == -1:
+            # "<script src=x" with no '>' anywhere after: no tag here or later; keep the rest.
+            out.append(text[m.start():])
+            break
+        close = _SCRIPT_CLOSE.search(text, gt + 1)
+        if close is None:
+            break  # an opened script tag is never left half in place
+        pos = close.end()
+    return "".join(out)
+
+
+def _strip_blocked_tags(text: str) -> str:
+    """Removes blocklisted tags: the opener through the first '>' on the same line."""
+    out, pos = [], 0
+    next_gt = next_nl = -1
+    while True:
+        m = _BLOCKED_TAG.search(text, pos)
+        if m is None:
+            out.append(text[pos:])
+            break
+        out.append(text[pos:m.start()])
+        if next_gt != len(text) and next_gt < m.end():
+            next_gt = text.find('>', m.end())
+            next_gt = len(text) if next_gt == -1 else next_gt
+        if next_nl != len(text) and next_nl < m.end():
+            next_nl = text.find('\n', m.end())
+            next_nl = len(text) if next_nl == -1 else next_nl
+        if next_gt < next_nl:
+            pos = next_gt + 1
+        else:  # no '>' before the line ends: not a tag, keep the '<'
+            out.append('<')
+            pos = m.start() + 1
+    return "".join(out)
+
 
 def sanitize_input(user_input: str) -> str:
     """
     Sanitizes user input to prevent injection attacks and ensure data integrity.
     Removes potentially dangerous HTML tags and script elements.
-    
+    Runs in linear time, so megabyte-sized pastes (inspector notes, LLM output)
+    cannot stall the app.
+
     Args:
         user_input (str): Raw input string.
-        
+
     Returns:
         str: Sanitized string.
     """
     if not isinstance(user_input, str):
         return ""
-        
+
     # 1. HTML Entity Encode
-    # safe_str = html.escape(user_input) 
+    # safe_str = html.escape(user_input)
     # Use simple strip for this context to keep it readable but safe from script execution
-    
-    # 2. Remove <script> tags regex
-    clean_str = re.sub(r'<script.*?>.*?</script>', '', user_input, flags=re.IGNORECASE | re.DOTALL)
-    
+    if '<' not in user_input:
+        return user_input.strip()
+
+    # 2. Remove <script> blocks (an opened <script ...> with no </script> drops everything after it)
+    clean_str = _strip_scripts(user_input)
+
     # 3. Remove other potentially dangerous tags (simple blocklist)
-    clean_str = re.sub(r'<(/?)(iframe|object|embed|applet|style|meta|link).*?>', '', clean_str, flags=re.IGNORECASE)
-    
+    clean_str = _strip_blocked_tags(clean_str)
+
     return clean_str.strip()
+
+
+def sanitize_many(values: Iterable) -> Iterable:
+    """
+    Batch sanitize_input for whole columns. Repeated values are sanitized once.
+
+    Args:
+        values (pd.Series | Iterable): Raw values (non-strings become "").
+
+    Returns:
+        pd.Series (same index) when given a Series, otherwise a list.
+    """
+    seen = {}
+
+    def clean(value):
+        if not isinstance(value, str):
+            return ""
+        if value not in seen:
+            seen[value] = sanitize_input(value)
+        return seen[value]
+
+    if isinstance(values, pd.Series):
+        return values.map(clean)
+    return [clean(v) for v in values]
@@ -4,8 +4,16 @@
 # ============================================================================
 
 import json
-from typing import Optional
-from pydantic import BaseModel, ValidationError
+import re
+import threading
+from collections import Counter
+from typing import Iterable, List, Optional, Tuple
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError
+
+try:
+    import orjson
+except ImportError:  # optional fast JSON parser
+    orjson = None
 
 class DefectModel(BaseModel):
     """
@@ -13,10 +21,147 @@ class DefectModel(BaseModel):
     Ensures that downstream applications (like the UI) don't crash due to malformed JSON.
     """
     defect: str
-    severity: int  # 0-100
+    severity: int = Field(ge=0, le=100)  # 0-100
     visual_description: str
     recommended_fix: str
 
+# Built once; validating through an adapter skips per-call schema setup.
+_DEFECT_ADAPTER = TypeAdapter(DefectModel)
+_DEFECT_LIST_ADAPTER = TypeAdapter(List[DefectModel])
+
+FALLBACK_DEFECT = {
+    "defect": "Analysis Pending / Format Error",
+    "severity": 0,
+    "visual_description": "The system could not automatically parse the defect details. Manual review required.",
+    "recommended_fix": "Please consult a human inspector."
+}
+
+# Severity words the model sometimes emits instead of a number, mapped to the middle of the
+# matching CostEstimator band (0-20 minor, 21-50 moderate, 51-80 serious, 81-100 critical).
+SEVERITY_WORDS = {
+    "none": 0,
+    "minor": 10, "low": 10,
+    "moderate": 35, "medium": 35,
+    "high": 65, "serious": 65, "major": 65,
+    "severe": 90, "critical": 90, "extreme": 90,
+}
+
+_NUMBER_RE = re.compile(r"^\s*(-?\d+(?:\.\d+)?)\s*(?:%|/\s*100)?\s*$")
+_DANGLING_KEY_RE = re.compile(r'(?:,|(?<=[{\[]))\s*"(?:[^"\\]|\\.)*"\s*:?\s*$')
+
+# How often each local repair salvaged a response (each one is a vision call not re-run).
+_REPAIR_COUNTS = Counter()
+_REPAIR_LOCK = threading.Lock()
+
+def get_repair_stats() -> dict:
+    """Snapshot of repair counters: one key per repair kind plus 'salvaged' and 'unrecoverable'."""
+    with _REPAIR_LOCK:
+        return dict(_REPAIR_COUNTS)
+
+def reset_repair_stats() -> None:
+    with _REPAIR_LOCK:
+        _REPAIR_COUNTS.clear()
+
+def _close_truncated_json(text: str) -> str:
+    """Closes an object cut off mid-stream: open string, dangling key/comma, open brackets."""
+    stack, in_string, escaped = [], False, False
+    for ch in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]" and stack:
+            stack.pop()
+    if in_string:
+        text += '"'
+    text = _DANGLING_KEY_RE.sub("", text.rstrip()).rstrip().rstrip(",")
+    return text + "".join(reversed(stack))
+
+def _repair_severity(value, repairs: List[str]):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        word = value.strip().lower()
+        if word in SEVERITY_WORDS:
+            repairs.append("severity_word")
+            value = SEVERITY_WORDS[word]
+        else:
+            match = _NUMBER_RE.match(value)
+            if not match:
+                return value
+            repairs.append("severity_numeric_string")
+            value = float(match.group(1))
+    if isinstance(value, float):
+        if value != value:  # NaN
+            return value
+        if value != int(value):
+            repairs.append("severity_rounded")
+        value = int(round(value))
+    if isinstance(value, int) and not 0 <= value <= 100:
+        repairs.append("severity_clamped")
+        value = min(max(value, 0), 100)
+    return value
+
+def repair_cortex_output(raw: str) -> Optional[dict]:
+    """
+    Schema-constrained repair of a response that failed strict validation.
+    Coerces recoverable fields (severity words/strings/floats, out-of-range severity) and closes
+    truncated JSON. Missing fields are never invented.
+    
+    Returns:
+        dict: Valid DefectModel dict, or None if the response can't be salvaged.
+    """
+    repairs: List[str] = []
+    data = None
+    candidate = _extract_json_object(raw) if isinstance(raw, str) else None
+    if candidate is not None:
+        try:
+            data = json.loads(candidate)
+        except json.JSONDecodeError:
+            data = None
+    if data is None and isinstance(raw, str) and "{" in raw:
+        tail = raw[raw.find("{"):].rstrip().rstrip("`").rstrip()
+        try:
+            data = json.loads(_close_truncated_json(tail))
+            repairs.append("truncated_json")
+        except json.JSONDecodeError:
+            data = None
+    
+    result = None
+    if isinstance(data, dict):
+        if "severity" in data:
+            data["severity"] = _repair_severity(data["severity"], repairs)
+        try:
+            result = DefectModel(**data).model_dump()
+        except (ValidationError, TypeError):
+            result = None
+    
+    with _REPAIR_LOCK:
+        if result is None:
+            _REPAIR_COUNTS["unrecoverable"] += 1
+        else:
+            _REPAIR_COUNTS["salvaged"] += 1
+            _REPAIR_COUNTS.update(repairs)
+    return result
+
+def _extract_json_object(raw: str) -> Optional[str]:
+    """
+    Returns the outermost {...} span of an LLM response, dropping markdown fences
+    (```json ... ```) or surrounding prose. One forward and one backward scan.
+    """
+    start = raw.find("{")
+    end = raw.rfind("}")
+    if start == -1 or end < start:
+        return None
+    return raw[start:end + 1]
+
 def validate_cortex_output(json_str: str) -> dict:
     """
     Parses and validates the JSON string returned by Snowflake Cortex AI.
@@ -29,22 +174,83 @@ def validate_cortex_output(json_str: str) -> dict:
     """
     try:
         # Cortex might sometimes wrap the JSON in markdown code blocks (e.g., ```json ... ```)
-        # We clean this up just in case.
-        cleaned_str = json_str.replace("```json", "").replace("```", "").strip()
+        # or in prose. We clean this up just in case.
+        cleaned_str = _extract_json_object(json_str) or json_str.strip()
         data = json.loads(cleaned_str)
         
         # Validate using Pydantic
         model = DefectModel(**data)
         return model.model_dump()
         
-    except (json.JSONDecodeError, ValidationError) as e:
+    except (json.JSONDecodeError, ValidationError, TypeError) as e:
         # ERROR SUPPRESSION & SELF-CORRECTION
-        # If the AI hallucinates bad JSON, we return a safe fallback object 
+        # First try to salvage the response locally (saves re-running the vision model).
+        # If that fails, we return a safe fallback object 
         # so the application UI continues to function ("Anti-Gravity" reliability).
+        repaired = repair_cortex_output(json_str)
+        if repaired is not None:
+            return repaired
         print(f"Validation Error: {e}") # Log for debugging
-        return {
-            "defect": "Analysis Pending / Format Error",
-            "severity": 0,
-            "visual_description": "The system could not automatically parse the defect details. Manual review required.",
-            "recommended_fix": "Please consult a human inspector."
-        }
+        return dict(FALLBACK_DEFECT)
+
+def _row_error(row: int, error: Exception) -> dict:
+    if isinstance(error, ValidationError):
+        details = error.errors()
+        stage = "parse" if any(d["type"] == "json_invalid" for d in details) else "validate"
+        message = "; ".join(f"{'.'.join(map(str, d['loc'])) or '<root>'}: {d['msg']}" for d in details)
+    else:
+        stage, message = "parse", str(error)
+    return {"row": row, "stage": stage, "message": message}
+
+def validate_cortex_output_batch(raw_outputs: Iterable[str], use_orjson: bool = False) -> Tuple[List[dict], List[dict]]:
+    """
+    Validates a whole column of raw Cortex responses (e.g. AI_ANALYSIS_RAW) at once.
+    
+    Fast path: every extracted object is validated in a single TypeAdapter(list[DefectModel])
+    call. Only if that fails are rows re-validated one by one to pinpoint the bad ones.
+    Rows failing strict validation go through repair_cortex_output before falling back.
+    Nothing is printed; unrecoverable rows are reported per row.
+    
+    Args:
+        raw_outputs (Iterable[str]): Raw LLM outputs (list, pandas Series, ...).
+        use_orjson (bool): Decode with orjson (if installed) before model validation.
+        
+    Returns:
+        tuple: (records, errors). `records` has one DefectModel dict per input row, with
+        FALLBACK_DEFECT for failed rows; `errors` lists {row, stage, message} for each failure,
+        where stage is 'extract', 'parse' or 'validate'.
+    """
+    rows = list(raw_outputs)
+    payloads = [_extract_json_object(r) if isinstance(r, str) else None for r in rows]
+    decode = orjson.loads if (use_orjson and orjson is not None) else None
+    
+    if rows and all(p is not None for p in payloads):
+        try:
+            if decode:
+                models = _DEFECT_LIST_ADAPTER.validate_python([decode(p) for p in payloads])
+            else:
+                models = _DEFECT_LIST_ADAPTER.validate_json("[" + ",".join(payloads) + "]")
+            # A row holding several objects would shift alignment; only accept 1:1 results.
+            if len(models) == len(rows):
+                return [m.model_dump() for m in models], []
+        except (ValidationError, ValueError):
+            pass
+    
+    records, errors = [], []
+    for i, payload in enumerate(payloads):
+        try:
+            if payload is None:
+                raise LookupError("No JSON object found in response")
+            model = _DEFECT_ADAPTER.validate_python(decode(payload)) if decode else _DEFECT_ADAPTER.validate_json(payload)
+            records.append(model.model_dump())
+        except (ValidationError, ValueError, LookupError) as e:
+            repaired = repair_cortex_output(rows[i])
+            if repaired is not None:
+                records.append(repaired)
+                continue
+            if isinstance(e, LookupError):
+                errors.append({"row": i, "stage": "extract", "message": str(e)})
+            else:
+                errors.append(_row_error(i, e))
+            records.append(dict(FALLBACK_DEFECT))
+    return records, errors
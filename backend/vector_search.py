@@ -0,0 +1,175 @@
+# ============================================================================
+# SAFEHAVEN AI - BACKEND LOGIC
+# PART 2E: IN-PROCESS VECTOR SEARCH ENGINE
+# ============================================================================
+
+from typing import Optional, Tuple
+
+import numpy as np
+
+METRICS = ("cosine", "l2")
+
+# Corpora at or above this size default to the approximate (IVF) index.
+ANN_THRESHOLD = 100_000
+
+
+def _as_matrix(vectors) -> np.ndarray:
+    matrix = np.ascontiguousarray(vectors, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix[None, :]
+    return matrix
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(matrix / norms, dtype=np.float32)
+
+
+def _top_k(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Row-wise top-k (highest first) using argpartition instead of a full sort."""
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        empty = np.zeros((scores.shape[0], 0))
+        return empty.astype(np.int64), empty.astype(np.float32)
+    if k < scores.shape[1]:
+        part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        part = np.tile(np.arange(scores.shape[1]), (scores.shape[0], 1))
+    part_scores = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-part_scores, axis=1, kind="stable")
+    return np.take_along_axis(part, order, axis=1), np.take_along_axis(part_scores, order, axis=1)
+
+
+class VectorSearchEngine:
+    """
+    Exact top-k search over a contiguous float32 matrix.
+    Queries are scored in batches with a single matrix multiply per block.
+
+    Scores are "higher is better": cosine similarity, or negated squared L2 distance.
+    """
+
+    def __init__(self, vectors, metric: str = "cosine", query_block: int = 256):
+        if metric not in METRICS:
+            raise ValueError(f"metric must be one of {METRICS}")
+        self.metric = metric
+        self.query_block = query_block
+        matrix = _as_matrix(vectors)
+        self.vectors = _normalize(matrix) if metric == "cosine" else matrix
+        self._sq_norms = np.einsum("ij,ij->i", self.vectors, self.vectors)
+
+    def __len__(self) -> int:
+        return self.vectors.shape[0]
+
+    def _prepare_queries(self, queries) -> np.ndarray:
+        q = _as_matrix(queries)
+        return _normalize(q) if self.metric == "cosine" else q
+
+    def _score(self, q: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        matrix = self.vectors if rows is None else self.vectors[rows]
+        dots = q @ matrix.T
+        if self.metric == "cosine":
+            return dots
+        sq = self._sq_norms if rows is None else self._sq_norms[rows]
+        return 2.0 * dots - sq[None, :] - np.einsum("ij,ij->i", q, q)[:, None]
+
+    def search(self, queries, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Args:
+            queries: (n, dim) or (dim,) query vectors.
+            k (int): Number of neighbours per query.
+
+        Returns:
+            tuple: (indices, scores), each shaped (n, min(k, len(corpus))), best first.
+        """
+        q = self._prepare_queries(queries)
+        indices, scores = [], []
+        for start in range(0, q.shape[0], self.query_block):
+            idx, sc = _top_k(self._score(q[start:start + self.query_block]), k)
+            indices.append(idx)
+            scores.append(sc)
+        return np.vstack(indices), np.vstack(scores)
+
+
+class IVFIndex(VectorSearchEngine):
+    """
+    Approximate inverted-file index: a k-means coarse quantizer partitions the corpus into
+    `n_lists` cells and each query is scored exactly against only the `n_probe` nearest cells.
+    Intended for corpora above ~100k chunks where exact scans dominate latency.
+    """
+
+    def __init__(self, vectors, metric: str = "cosine", n_lists: Optional[int] = None,
+                 n_probe: int = 8, n_iter: int = 10, train_size: int = 100_000, seed: int = 0):
+        super().__init__(vectors, metric)
+        n = len(self)
+        self.n_lists = max(1, min(n, n_lists or int(np.sqrt(n))))
+        self.n_probe = n_probe
+        rng = np.random.default_rng(seed)
+
+        sample = self.vectors
+        if n > train_size:
+            sample = self.vectors[rng.choice(n, size=train_size, replace=False)]
+        self.centroids = self._train(sample, n_iter, rng)
+
+        assignments = self._assign(self.vectors)
+        self._order = np.argsort(assignments, kind="stable")
+        counts = np.bincount(assignments, minlength=self.n_lists)
+        self._offsets = np.concatenate([[0], np.cumsum(counts)])
+
+    def _nearest_centroids(self, x: np.ndarray, n: int) -> np.ndarray:
+        c_sq = np.einsum("ij,ij->i", self.centroids, self.centroids)
+        scores = 2.0 * (x @ self.centroids.T) - c_sq[None, :]
+        if n == 1:
+            return np.argmax(scores, axis=1)[:, None]
+        return _top_k(scores, n)[0]
+
+    def _assign(self, x: np.ndarray, block: int = 65_536) -> np.ndarray:
+        return np.concatenate([
+            self._nearest_centroids(x[s:s + block], 1)[:, 0] for s in range(0, x.shape[0], block)
+        ])
+
+    def _train(self, sample: np.ndarray, n_iter: int, rng) -> np.ndarray:
+        self.centroids = np.ascontiguousarray(
+            sample[rng.choice(sample.shape[0], size=self.n_lists, replace=False)]
+        )
+        for _ in range(n_iter):
+            labels = self._assign(sample)
+            order = np.argsort(labels, kind="stable")
+            counts = np.bincount(labels, minlength=self.n_lists)
+            filled = counts > 0
+            starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[filled]
+            sums = np.add.reduceat(sample[order], starts, axis=0)
+            self.centroids[filled] = sums / counts[filled, None]
+            if self.metric == "cosine":
+                self.centroids = _normalize(self.centroids)
+        return self.centroids
+
+    def search(self, queries, k: int = 1, n_probe: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        q = self._prepare_queries(queries)
+        probes = self._nearest_centroids(q, min(n_probe or self.n_probe, self.n_lists))
+        k_out = min(k, len(self))
+        indices = np.full((q.shape[0], k_out), -1, dtype=np.int64)
+        scores = np.full((q.shape[0], k_out), -np.inf, dtype=np.float32)
+        for i in range(q.shape[0]):
+            candidates = np.concatenate([
+                self._order[self._offsets[c]:self._offsets[c + 1]] for c in probes[i]
+            ])
+            if candidates.size == 0:
+                continue
+            idx, sc = _top_k(self._score(q[i:i + 1], candidates), k_out)
+            indices[i, :idx.shape[1]] = candidates[idx[0]]
+            scores[i, :sc.shape[1]] = sc[0]
+        return indices, scores
+
+
+def build_engine(vectors, metric: str = "cosine", approximate: Optional[bool] = None, **ivf_options) -> VectorSearchEngine:
+    """
+    Picks the exact engine for small corpora and the IVF index above ANN_THRESHOLD
+    (or as forced by `approximate`).
+    """
+    matrix = _as_matrix(vectors)
+    if approximate is None:
+        approximate = matrix.shape[0] >= ANN_THRESHOLD
+    if approximate:
+        return IVFIndex(matrix, metric=metric, **ivf_options)
+    return VectorSearchEngine(matrix, metric=metric)
@@ -0,0 +1,123 @@
+# ============================================================================
+# SAFEHAVEN AI - BACKEND LOGIC
+# PART 7C: REPAIR-VIDEO RESULT CACHE
+# ============================================================================
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Optional
+
+DEFAULT_VIDEO_CACHE_DIR = os.getenv(
+    "SAFEHAVEN_VIDEO_CACHE", os.path.join(tempfile.gettempdir(), "safehaven_video_cache")
+)
+# Videos dominate the footprint; ~2 GB keeps a few hundred short clips.
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+
+class VideoResultCache:
+    """
+    Persistent cache of finished repair-video jobs keyed by (image content hash, prompt, model).
+    Each entry is `<key>.json` (the final job status) plus `<key>.mp4`; a record whose MP4
+    is missing is treated as a miss, since signed provider URLs expire.
+    Reads refresh an entry's mtime, and writes evict least-recently-used entries until the
+    directory fits in `max_bytes`.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir or DEFAULT_VIDEO_CACHE_DIR
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(content_hash: str, prompt: str, model: str) -> str:
+        return hashlib.sha256(f"{content_hash}|{model}|{prompt}".encode("utf-8")).hexdigest()
+
+    def _record_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def video_path(self, key: str) -> str:
+        """Where the entry's MP4 lives (downloads for cached jobs are written here)."""
+        return os.path.join(self.cache_dir, f"{key}.mp4")
+
+    def get(self, key: str) -> Optional[dict]:
+        """Cached final job status (with `local_path` to the MP4), or None. Counts a hit or a miss."""
+        path = self._record_path(key)
+        try:
+            with open(path) as f:
+                record = json.load(f)
+            os.utime(path)
+        except (FileNotFoundError, json.JSONDecodeError):
+            record = None
+        video = self.video_path(key)
+        if record is not None and os.path.exists(video):
+            os.utime(video)
+            record["local_path"] = video
+        else:
+            # A record without its MP4 only has the provider's (expiring) URL: stale.
+            record = None
+        with self._lock:
+            if record is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return record
+
+    def put(self, key: str, status: dict) -> None:
+        # Write-then-rename so concurrent readers never see a partial entry.
+        record = dict(status, cached_at=time.time())
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(record, f)
+        os.replace(tmp, self._record_path(key))
+        self.evict()
+
+    def record_coalesced(self) -> None:
+        with self._lock:
+            self.coalesced += 1
+
+    def evict(self) -> int:
+        """Drops least-recently-used entries until the cache fits. Returns entries removed."""
+        entries = {}
+        for name in os.listdir(self.cache_dir):
+            key, ext = os.path.splitext(name)
+            if ext not in (".json", ".mp4"):
+                continue
+            try:
+                st = os.stat(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                continue
+            size, last_used = entries.get(key, (0, 0.0))
+            entries[key] = (size + st.st_size, max(last_used, st.st_mtime))
+        total = sum(size for size, _ in entries.values())
+        removed = 0
+        for key, (size, _) in sorted(entries.items(), key=lambda item: item[1][1]):
+            if total <= self.max_bytes:
+                break
+            for path in (self._record_path(key), self.video_path(key)):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            total -= size
+            removed += 1
+        return removed
+
+    def stats(self) -> dict:
+        """Counters for this process; `generations_avoided` = cache hits + coalesced requests."""
+        with self._lock:
+            total = self.hits + self.misses + self.coalesced
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "generations_avoided": self.hits + self.coalesced,
+                "hit_rate": (self.hits + self.coalesced) / total if total else 0.0,
+            }
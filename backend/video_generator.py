@@ -3,62 +3,437 @@
 # PART 7: HIGGSFIELD VIDEO GENERATOR
 # ============================================================================
 
+import io
+import logging
+import os
+import random
+import tempfile
+import threading
 import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
 import requests
-import os
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+from backend.analysis_cache import image_content_hash
+from backend.video_cache import VideoResultCache
+
+# Mock mode (no API key): simulated provider latency, paid by a worker thread, not the caller.
+MOCK_LATENCY_S = 2.0
+MOCK_VIDEO_URL = "https://www.w3schools.com/html/mov_bbb.mp4"  # Placeholder video
+
+# Polling backoff: first poll after `poll_interval` (POLL_INITIAL_S), growing by POLL_BACKOFF up to POLL_MAX_S.
+POLL_INITIAL_S = 0.5
+POLL_BACKOFF = 1.5
+POLL_MAX_S = 8.0
+JOB_TIMEOUT_S = 600.0
+REQUEST_TIMEOUT_S = 30.0
+
+# Transport retries: throttling and transient server errors, full-jitter exponential backoff
+# (a Retry-After header, when sent, takes precedence but is capped at RETRY_MAX_S, so a
+# provider cannot park a worker thread for minutes). Non-idempotent requests (the paid
+# submit POST) only retry when the provider cannot have accepted them: a 429, or a failure
+# to connect at all. A 5xx or read timeout may arrive after the job was created.
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+NON_IDEMPOTENT_RETRY_STATUSES = (429,)
+MAX_RETRIES = 4
+RETRY_BASE_S = 0.5
+RETRY_MAX_S = 10.0
+
+VIDEO_MODEL = "dop-v1"
+
+# Finished jobs kept for status()/result() lookups; older ones are dropped first.
+MAX_FINISHED_JOBS = 256
+
+DOWNLOAD_CHUNK = 1024 * 1024
+DEFAULT_VIDEO_DIR = os.getenv(
+    "SAFEHAVEN_VIDEO_DIR", os.path.join(tempfile.gettempdir(), "safehaven_videos")
+)
+
+# Job states reported by status()
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+
+logger = logging.getLogger(__name__)
+
+
+class MultipartFileStream:
+    """
+    Read-only file-like multipart/form-data body. Form fields go first, then the file is read
+    from disk only as the HTTP layer pulls blocks, so upload memory does not grow with the
+    image size. `len()` gives requests an exact Content-Length (no chunked encoding).
+    """
+
+    def __init__(self, fields: Dict[str, str], file_field: str, path: str,
+                 content_type: str = "application/octet-stream"):
+        boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={boundary}"
+        head = "".join(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'
+            for name, value in fields.items()
+        )
+        head += (f'--{boundary}\r\nContent-Disposition: form-data; name="{file_field}"; '
+                 f'filename="{os.path.basename(path)}"\r\nContent-Type: {content_type}\r\n\r\n')
+        tail = f"\r\n--{boundary}--\r\n".encode()
+        self._length = len(head.encode("utf-8")) + os.path.getsize(path) + len(tail)
+        self._parts = [io.BytesIO(head.encode("utf-8")), open(path, "rb"), io.BytesIO(tail)]
+
+    def __len__(self) -> int:
+        return self._length
+
+    def read(self, size: int = -1) -> bytes:
+        out = b""
+        while self._parts and (size < 0 or len(out) < size):
+            chunk = self._parts[0].read(-1 if size < 0 else size - len(out))
+            if chunk:
+                out += chunk
+            else:
+                self._parts.pop(0).close()
+        return out
+
+    def close(self) -> None:
+        for part in self._parts:
+            part.close()
+        self._parts = []
+
+
+def _failed_to_connect(exc: requests.RequestException) -> bool:
+    """True when the request never reached the server (nothing was sent)."""
+    if isinstance(exc, requests.exceptions.ConnectTimeout):
+        return True
+    reason = exc.args[0] if exc.args else None
+    reason = getattr(reason, "reason", reason)  # urllib3 MaxRetryError wraps the cause
+    return isinstance(reason, NewConnectionError)
+
+
+def _retry_delay(attempt: int, response: Optional[requests.Response] = None) -> float:
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after is not None:
+        try:
+            return min(RETRY_MAX_S, max(0.0, float(retry_after)))
+        except ValueError:
+            pass
+    return random.uniform(0.0, min(RETRY_MAX_S, RETRY_BASE_S * 2 ** attempt))
 
 class HiggsfieldClient:
     """
     Client for Higgsfield AI's Director of Photography (DoP) API.
     Generates cinematic transitions from static images.
+
+    Generation is job-based: `submit` returns a job id immediately and a background worker
+    posts the request and polls the provider with backoff. Callers poll `status`, block on
+    `result`, or pass a callback; a Streamlit script run is never held up by the provider.
+
+    With a VideoResultCache, a (photo, prompt, model) that already has a finished video is
+    answered from disk, and identical requests submitted while one is in flight share its job.
     """
-    
+
     API_ENDPOINT = "https://api.higgsfield.ai/v1/video/generation"
-    
-    def __init__(self, api_key: str = None):
+
+    def __init__(self, api_key: str = None, base_url: str = None, max_workers: int = 8,
+                 poll_interval: float = POLL_INITIAL_S, video_dir: str = None,
+                 cache: Optional[VideoResultCache] = None, model: str = VIDEO_MODEL,
+                 max_finished_jobs: int = MAX_FINISHED_JOBS):
         self.api_key = api_key or os.getenv("HIGGSFIELD_API_KEY")
         # For mock purposes, we don't strictly require the key yet
-    
-    def generate_repair_video(self, image_path: str, prompt: str) -> dict:
+        base_url = base_url or os.getenv("HIGGSFIELD_API_URL")
+        self.endpoint = f"{base_url.rstrip('/')}/v1/video/generation" if base_url else self.API_ENDPOINT
+        self.poll_interval = poll_interval
+        self.video_dir = video_dir or DEFAULT_VIDEO_DIR
+        self.cache = cache
+        self.model = model
+        self._inflight: Dict[str, str] = {}  # cache key -> job id
+        # One keep-alive connection pool shared by every worker thread.
+        self.http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers, max_retries=0)
+        self.http.mount("https://", adapter)
+        self.http.mount("http://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="higgsfield")
+        self._jobs: Dict[str, dict] = {}
+        self._futures: Dict[str, Future] = {}
+        self._finished: "OrderedDict[str, None]" = OrderedDict()
+        self.max_finished_jobs = max_finished_jobs
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Job API
+    # ------------------------------------------------------------------
+
+    def submit(self, image_path: str, prompt: str, callback: Optional[Callable[[dict], None]] = None,
+               download: bool = False) -> str:
         """
-        Initiates a video generation task.
-        In a real scenario, this would POST to the API.
-        
+        Queues a video generation job and returns its id without waiting.
+
         Args:
             image_path (str): Path to the source image.
             prompt (str): Description of the motion/transition.
-            
+            callback (callable, optional): Called with the final status dict when the job ends.
+            download (bool): Also stream the finished MP4 into the local video cache
+                (its path is reported as `local_path`). With a result cache the MP4 is
+                always downloaded, so coalesced and cached requests get a `local_path` too.
+
+        Returns:
+            str: Local job id for status()/result(). Coalesced requests get the id of the
+            job already in flight. Problems with the request itself (e.g. an unreadable image)
+            are reported as a failed job, never raised here.
+        """
+        key, error = None, None
+        if self.cache is not None and self.api_key:
+            # Streaming MD5 of the photo: the key has to exist before an id is handed out,
+            # so that identical requests can share one.
+            try:
+                key = self.cache.key(image_content_hash(image_path), prompt, self.model)
+            except OSError as e:
+                error = f"Video generation failed: {e}"
+        # Only in-memory bookkeeping under the lock: the in-flight slot is claimed first, so
+        # identical concurrent submits coalesce onto this job while its cache lookup runs.
+        with self._lock:
+            job_id = self._inflight.get(key) if key else None
+            coalesced = job_id is not None
+            if not coalesced:
+                job_id = uuid.uuid4().hex
+                self._jobs[job_id] = {"job_id": job_id, "state": QUEUED, "video_url": None,
+                                      "message": "Queued.", "provider_id": None, "local_path": None,
+                                      "cache_key": key}
+                self._futures[job_id] = Future()
+                if key:
+                    self._inflight[key] = job_id
+            future = self._futures[job_id]
+        if coalesced:
+            self.cache.record_coalesced()
+        else:
+            future.add_done_callback(lambda f: self._retire(job_id))
+            self._start(job_id, image_path, prompt, download, error)
+        if callback is not None:
+            future.add_done_callback(lambda f: callback(self.status(job_id)))
+        return job_id
+
+    def _start(self, job_id: str, image_path: str, prompt: str, download: bool, error: Optional[str]) -> None:
+        """Settles a new job from a pre-flight error or the result cache, else queues it for a worker."""
+        if error is not None:
+            self._update(job_id, state=FAILED, message=error)
+            self._complete(job_id)
+            return
+        key = self.status(job_id)["cache_key"]
+        cached = self.cache.get(key) if key else None  # disk read, outside the lock
+        if cached is None:
+            self._executor.submit(self._run_job, job_id, image_path, prompt, download)
+            return
+        # Cache entries always carry their MP4, so there is nothing left to fetch.
+        self._update(job_id, **{k: v for k, v in cached.items() if k not in ("job_id", "cache_key")})
+        with self._lock:
+            self._inflight.pop(key, None)
+        self._complete(job_id)
+
+    def _complete(self, job_id: str) -> None:
+        """Resolves the job's Future (its done-callbacks take the lock, so it is not held here)."""
+        with self._lock:
+            future = self._futures[job_id]
+        future.set_result(None)
+
+    @staticmethod
+    def _unknown_job(job_id: str) -> KeyError:
+        return KeyError(f"Unknown video job {job_id!r}: never submitted, or forgotten after it finished "
+                        f"(forget(), or more than max_finished_jobs newer jobs have finished).")
+
+    def status(self, job_id: str) -> dict:
+        """
+        Snapshot of a job: job_id, state, video_url, message, provider_id, local_path.
+        Raises KeyError for unknown or forgotten jobs (as do result() and future()).
+        """
+        with self._lock:
+            if job_id not in self._jobs:
+                raise self._unknown_job(job_id)
+            return dict(self._jobs[job_id])
+
+    def result(self, job_id: str, timeout: Optional[float] = None) -> dict:
+        """Blocks until the job finishes (or `timeout` elapses) and returns its final status."""
+        self.future(job_id).result(timeout=timeout)
+        return self.status(job_id)
+
+    def future(self, job_id: str) -> Future:
+        """The job's Future, for asyncio callers: `await asyncio.wrap_future(client.future(job_id))`."""
+        with self._lock:
+            if job_id not in self._futures:
+                raise self._unknown_job(job_id)
+            return self._futures[job_id]
+
+    def forget(self, job_id: str) -> bool:
+        """Drops a finished job's bookkeeping. Returns False (and keeps it) while it is running."""
+        with self._lock:
+            future = self._futures.get(job_id)
+            if future is None or not future.done():
+                return False
+            self._jobs.pop(job_id, None)
+            self._futures.pop(job_id, None)
+            self._finished.pop(job_id, None)
+            return True
+
+    def _retire(self, job_id: str) -> None:
+        """Records a finished job; beyond max_finished_jobs the oldest finished ones are forgotten."""
+        with self._lock:
+            if job_id not in self._jobs:
+                return
+            self._finished[job_id] = None
+            while len(self._finished) > self.max_finished_jobs:
+                old, _ = self._finished.popitem(last=False)
+                self._jobs.pop(old, None)
+                self._futures.pop(old, None)
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+        self.http.close()
+
+    def download_video(self, job_id: str) -> str:
+        """
+        Streams a finished job's MP4 to `<video_dir>/<provider id>.mp4` (or, for cached jobs, to
+        the cache entry's MP4) in DOWNLOAD_CHUNK blocks (written to a temp file, then renamed)
+        and returns the path. Already-downloaded videos are returned without a request.
+        """
+        job = self.status(job_id)
+        if job["state"] != SUCCEEDED or not job["video_url"]:
+            raise ValueError(f"Job {job_id} has no finished video (state: {job['state']}).")
+        if job["cache_key"]:
+            path = self.cache.video_path(job["cache_key"])
+        else:
+            os.makedirs(self.video_dir, exist_ok=True)
+            path = os.path.join(self.video_dir, f"{job['provider_id'] or job_id}.mp4")
+        if not os.path.exists(path):
+            with self._request("GET", job["video_url"], stream=True) as response:
+                fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+                try:
+                    with os.fdopen(fd, "wb") as f:
+                        for chunk in response.iter_content(DOWNLOAD_CHUNK):
+                            f.write(chunk)
+                    os.replace(tmp, path)
+                except BaseException:
+                    os.remove(tmp)
+                    raise
+            if job["cache_key"]:
+                self.cache.evict()
+        self._update(job_id, local_path=path)
+        return path
+
+    def generate_repair_video(self, image_path: str, prompt: str) -> dict:
+        """
+        Blocking convenience wrapper over submit()/result() (kept for existing callers).
+
         Returns:
             dict: {status, video_url, message}
         """
-        print(f"🎬 Initiating Higgsfield Video Job for: {image_path}")
-        print(f"📝 Prompt: {prompt}")
-        
-        # Mocking the async API delay
-        time.sleep(2.0)
-        
-        if not self.api_key:
-            return {
-                "status": "mock_success",
-                "video_url": "https://www.w3schools.com/html/mov_bbb.mp4", # Placeholder video
-                "message": "API Key missing. Returning mock video for demonstration."
-            }
-            
-        # Real API Implementation Sketch
-        # payload = {
-        #     "model": "dop-v1",
-        #     "image": self._encode_image(image_path),
-        #     "prompt": prompt
-        # }
-        # response = requests.post(self.API_ENDPOINT, json=payload, headers={"Authorization": f"Bearer {self.api_key}"})
-        # return response.json()
-        
-        return {
-            "status": "success", 
-            "video_url": "https://api.higgsfield.ai/v1/videos/12345.mp4",
-            "message": "Video generated successfully."
-        }
-
-    def _encode_image(self, path):
-        # Helper to encode image to base64 if needed
-        pass
+        final = self.result(self.submit(image_path, prompt))
+        if final["state"] == FAILED:
+            status = "error"
+        else:
+            status = "success" if self.api_key else "mock_success"
+        return {"status": status, "video_url": final["video_url"], "message": final["message"]}
+
+    # ------------------------------------------------------------------
+    # Worker
+    # ------------------------------------------------------------------
+
+    def _update(self, job_id: str, **fields) -> None:
+        with self._lock:
+            self._jobs[job_id].update(fields)
+
+    def _headers(self) -> dict:
+        return {"Authorization": f"Bearer {self.api_key}"}
+
+    def _request(self, method: str, url: str, body_factory: Optional[Callable] = None, **kwargs) -> requests.Response:
+        """
+        Sends a request over the pooled session with up to MAX_RETRIES retries. GETs retry
+        connection errors, timeouts and RETRY_STATUSES; POSTs (new paid jobs) retry only
+        connect failures and NON_IDEMPOTENT_RETRY_STATUSES, so an accepted submit is never
+        sent twice. Streamed bodies are rebuilt by `body_factory` per attempt.
+        """
+        idempotent = method.upper() != "POST"
+        retry_statuses = RETRY_STATUSES if idempotent else NON_IDEMPOTENT_RETRY_STATUSES
+        headers = dict(self._headers(), **kwargs.pop("headers", {}))
+        for attempt in range(MAX_RETRIES + 1):
+            body = body_factory() if body_factory else None
+            if body is not None and hasattr(body, "content_type"):
+                headers["Content-Type"] = body.content_type
+            try:
+                response = self.http.request(method, url, data=body, headers=headers,
+                                             timeout=REQUEST_TIMEOUT_S, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == MAX_RETRIES or not (idempotent or _failed_to_connect(e)):
+                    raise
+                time.sleep(_retry_delay(attempt))
+                continue
+            finally:
+                if body is not None:
+                    body.close()
+            if response.status_code in retry_statuses and attempt < MAX_RETRIES:
+                response.close()
+                time.sleep(_retry_delay(attempt, response))
+                continue
+            response.raise_for_status()
+            return response
+
+    def _run_job(self, job_id: str, image_path: str, prompt: str, download: bool = False) -> None:
+        logger.info("Initiating Higgsfield video job %s for %s (prompt: %s)", job_id, image_path, prompt)
+        self._update(job_id, state=RUNNING, message="Generating.")
+        try:
+            if not self.api_key:
+                # Mocking the async API delay
+                time.sleep(MOCK_LATENCY_S)
+                self._update(job_id, state=SUCCEEDED, video_url=MOCK_VIDEO_URL,
+                             message="API Key missing. Returning mock video for demonstration.")
+                return
+
+            fields = {"model": self.model, "prompt": prompt}
+            response = self._request("POST", self.endpoint,
+                                     body_factory=lambda: MultipartFileStream(fields, "image", image_path))
+            provider_id = response.json()["id"]
+            self._update(job_id, provider_id=provider_id)
+            self._poll(job_id, provider_id)
+            if download and self.status(job_id)["state"] == SUCCEEDED:
+                self.download_video(job_id)
+        except Exception as e:
+            self._update(job_id, state=FAILED, message=f"Video generation failed: {e}")
+        finally:
+            try:
+                self._finish(job_id)
+            finally:
+                self._complete(job_id)
+
+    def _finish(self, job_id: str) -> None:
+        """
+        Caches a successful result and releases the in-flight slot. The MP4 is downloaded
+        first: provider URLs are signed and short-lived, so a cache entry must not depend
+        on one, and any request coalesced onto this job gets the local file as well.
+        """
+        job = self.status(job_id)
+        key = job["cache_key"]
+        if not key:
+            return
+        try:
+            if job["state"] == SUCCEEDED:
+                self.download_video(job_id)
+                job = self.status(job_id)
+                self.cache.put(key, {k: v for k, v in job.items() if k not in ("job_id", "cache_key", "local_path")})
+        except Exception as e:
+            self._update(job_id, state=FAILED, message=f"Video download failed: {e}")
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _poll(self, job_id: str, provider_id: str) -> None:
+        deadline = time.monotonic() + JOB_TIMEOUT_S
+        delay = self.poll_interval
+        while time.monotonic() < deadline:
+            time.sleep(delay)
+            delay = min(delay * POLL_BACKOFF, POLL_MAX_S)
+            job = self._request("GET", f"{self.endpoint}/{provider_id}").json()
+            if job.get("status") == "completed":
+                self._update(job_id, state=SUCCEEDED, video_url=job.get("video_url"),
+                             message="Video generated successfully.")
+                return
+            if job.get("status") == "failed":
+                self._update(job_id, state=FAILED, message=job.get("error", "Video generation failed."))
+                return
+        self._update(job_id, state=FAILED, message=f"Timed out after {JOB_TIMEOUT_S:.0f}s.")
@@ -0,0 +1,54 @@
+# ============================================================================
+# SAFEHAVEN AI - BENCHMARK: BATCH AUDIO FORENSICS THROUGHPUT
+# ============================================================================
+# Files/sec for analyze_wall_taps_batch at several worker counts, against the
+# serial one-file-at-a-time analyze_wall_tap loop. Usage:
+#   python benchmarks/bench_audio_batch.py [n_files] [workers ...]
+import sys
+import os
+import time
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+import soundfile as sf
+from backend.audio_forensics import analyze_wall_tap, analyze_wall_taps_batch
+
+
+def make_corpus(directory, n_files, seconds=5.0, sr=44100, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sr)) / sr
+    paths = []
+    for i in range(n_files):
+        freq = rng.uniform(300, 5000)
+        y = 0.5 * np.sin(2 * np.pi * freq * t) + 0.01 * rng.standard_normal(t.size)
+        path = os.path.join(directory, f"tap_{i:04d}.wav")
+        sf.write(path, y.astype(np.float32), sr)
+        paths.append(path)
+    return paths
+
+
+def run(n_files=200, worker_counts=(1, 2, 4, 8)):
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = make_corpus(tmp, n_files)
+        print(f"{n_files} files x 5 s @ 44.1 kHz")
+
+        serial_n = min(n_files, 20)
+        t0 = time.perf_counter()
+        for p in paths[:serial_n]:
+            analyze_wall_tap(p)
+        t = time.perf_counter() - t0
+        print(f"  serial analyze_wall_tap : {serial_n / t:8.1f} files/sec")
+
+        for workers in worker_counts:
+            t0 = time.perf_counter()
+            analyze_wall_taps_batch(paths, workers=workers)
+            t = time.perf_counter() - t0
+            print(f"  batch workers={workers:<2}       : {n_files / t:8.1f} files/sec")
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    workers = tuple(int(w) for w in sys.argv[2:]) or (1, 2, 4, 8)
+    run(n, workers)
@@ -0,0 +1,34 @@
+# ============================================================================
+# SAFEHAVEN AI - BENCHMARK: AUDIO FORENSICS COLD-START IMPORT COST
+# ============================================================================
+# Measures fresh-interpreter import time of backend.audio_forensics against the
+# stack it used to import eagerly (librosa + snowflake.snowpark).
+import sys
+import os
+import subprocess
+import statistics
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+CASES = {
+    "previous eager imports (librosa + snowpark)":
+        "import numpy, soundfile, librosa, snowflake.snowpark.types, snowflake.snowpark.functions",
+    "backend.audio_forensics (lazy librosa)":
+        "import backend.audio_forensics",
+    "backend.audio_forensics + first analysis":
+        "import backend.audio_forensics as a, numpy as np; a.spectral_centroid(np.zeros(22050, 'float32'), 22050)",
+}
+
+
+def cold_import_seconds(statement, repeat=5):
+    code = f"import time; t = time.perf_counter(); {statement}; print(time.perf_counter() - t)"
+    samples = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+        samples.append(float(out.stdout.strip().splitlines()[-1]))
+    return statistics.median(samples)
+
+
+if __name__ == "__main__":
+    for label, statement in CASES.items():
+        print(f"{label:48s}: {cold_import_seconds(statement) * 1000:8.1f} ms (median of 5)")
@@ -0,0 +1,52 @@
+# ============================================================================
+# SAFEHAVEN AI - BENCHMARK: VECTORIZED COST ESTIMATOR
+# ============================================================================
+# Scalar estimate_repair loop vs estimate_repair_batch over portfolio-sized
+# defect tables. Usage: python benchmarks/bench_cost_estimator.py [rows]
+import sys
+import os
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+import pandas as pd
+from backend.cost_estimator import CostEstimator
+
+
+def synthetic_portfolio(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "defect_type": rng.choice(list(CostEstimator.BASELINE_COSTS) + ["unknown_defect"], size=n),
+        "severity": rng.integers(0, 101, size=n),
+        "region_factor": rng.choice([0.8, 1.0, 1.2, 1.5], size=n),
+    })
+
+
+def run(n=200_000):
+    df = synthetic_portfolio(n)
+
+    t0 = time.perf_counter()
+    [CostEstimator.estimate_repair(t, s, r)
+     for t, s, r in zip(df["defect_type"], df["severity"], df["region_factor"])]
+    scalar = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    CostEstimator.estimate_repair_batch(df["defect_type"], df["severity"], df["region_factor"])
+    batch = time.perf_counter() - t0
+
+    print(f"{n:,} defect rows")
+    print(f"  scalar loop : {scalar * 1000:9.1f} ms")
+    print(f"  batch       : {batch * 1000:9.1f} ms  ({scalar / batch:.0f}x faster)")
+
+    prop = df.head(1000)
+    t0 = time.perf_counter()
+    rollup = CostEstimator.estimate_property(prop["defect_type"], prop["severity"], prop["region_factor"],
+                                             n_samples=100_000, seed=0)
+    mc = time.perf_counter() - t0
+    print(f"  property rollup (1,000 defects x 100k samples): {mc * 1000:.1f} ms")
+    print(f"    expected ${rollup['expected_usd']:,.0f} | P5 ${rollup['p5_usd']:,.0f} | P95 ${rollup['p95_usd']:,.0f}")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
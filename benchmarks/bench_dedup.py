@@ -0,0 +1,51 @@
+# ============================================================================
+# SAFEHAVEN AI - BENCHMARK: NEAR-DUPLICATE DETECTION
+# ============================================================================
+# Batch pHash/dHash throughput and multi-index radius lookups vs a brute-force
+# Hamming scan. Usage: python benchmarks/bench_dedup.py [n_hashes]
+import sys
+import os
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+from PIL import Image
+from backend.dedup import MultiIndexHash, DEFAULT_MAX_DISTANCE, dhash_batch, hamming_distance, phash_batch
+
+
+def run(n=100_000, n_images=200, n_queries=200):
+    rng = np.random.default_rng(0)
+    images = [Image.fromarray(rng.integers(0, 255, size=(6, 8, 3), dtype=np.uint8)).resize((1200, 900))
+              for _ in range(n_images)]
+    t0 = time.perf_counter()
+    phash_batch(images)
+    dhash_batch(images)
+    hashing = time.perf_counter() - t0
+    print(f"hashing {n_images} images (1200x900): {hashing / n_images * 1000:.2f} ms/image")
+
+    hashes = rng.integers(0, 2**63, size=n, dtype=np.int64).astype(np.uint64)
+    t0 = time.perf_counter()
+    index = MultiIndexHash(DEFAULT_MAX_DISTANCE)
+    for i, h in enumerate(hashes):
+        index.add(h, i)
+    build = time.perf_counter() - t0
+    queries = hashes[rng.choice(n, size=n_queries, replace=False)]
+
+    t0 = time.perf_counter()
+    for q in queries:
+        np.flatnonzero(hamming_distance(hashes, q) <= DEFAULT_MAX_DISTANCE)
+    brute = (time.perf_counter() - t0) / n_queries
+
+    t0 = time.perf_counter()
+    for q in queries:
+        index.query(q)
+    mih = (time.perf_counter() - t0) / n_queries
+
+    print(f"{n:,} hashes, radius {DEFAULT_MAX_DISTANCE} (index build {build:.2f} s)")
+    print(f"  brute-force scan : {brute * 1000:8.3f} ms/query")
+    print(f"  multi-index      : {mih * 1000:8.3f} ms/query  ({brute / mih:.1f}x)")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
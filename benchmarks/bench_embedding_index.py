@@ -0,0 +1,64 @@
+# ============================================================================
+# SAFEHAVEN AI - BENCHMARK: LEGAL SHIELD EMBEDDING INDEX
+# ============================================================================
+# Compares the old per-query cost (embed every chunk on every lookup) with the
+# precomputed index (embed once at ingest, embed only the query afterwards).
+# Runs fully offline using the deterministic LocalHashEmbedder.
+import sys
+import os
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+from backend.embedding_index import EmbeddingIndex, LocalHashEmbedder
+
+WORDS = ("wall stud load bearing gypsum board garage receptacle outlet gfci kitchen "
+         "countertop roof flashing moisture drywall joist beam footing egress smoke").split()
+
+
+def synthetic_chunks(n, seed=0):
+    rng = np.random.default_rng(seed)
+    for i in range(n):
+        text = " ".join(rng.choice(WORDS, size=40))
+        yield {"CHUNK_ID": f"C{i}", "SECTION_TITLE": f"Section {i}", "CHUNK_TEXT": text}
+
+
+def run(n_chunks=5000, n_queries=20):
+    embedder = LocalHashEmbedder()
+    chunks = list(synthetic_chunks(n_chunks))
+    queries = [c["CHUNK_TEXT"][:80] for c in chunks[:n_queries]]
+
+    # Old path: every query re-embeds the whole corpus.
+    t0 = time.perf_counter()
+    for q in queries[:2]:
+        matrix = embedder([c["CHUNK_TEXT"] for c in chunks])
+        matrix @ embedder([q])[0]
+    naive_per_query = (time.perf_counter() - t0) / 2
+
+    # New path: build once, then embed only the query.
+    index = EmbeddingIndex(embedder)
+    t0 = time.perf_counter()
+    index.upsert(chunks)
+    build = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for q in queries:
+        index.nearest(q)
+    indexed_per_query = (time.perf_counter() - t0) / n_queries
+
+    # Incremental refresh: 1% of chunks change.
+    changed = [dict(c, CHUNK_TEXT=c["CHUNK_TEXT"] + " amended") for c in chunks[: n_chunks // 100]]
+    t0 = time.perf_counter()
+    re_embedded = index.upsert(chunks + changed)
+    refresh = time.perf_counter() - t0
+
+    print(f"corpus={n_chunks} chunks")
+    print(f"  naive lookup (re-embed corpus): {naive_per_query * 1000:9.1f} ms/query")
+    print(f"  index build (one-off):          {build * 1000:9.1f} ms")
+    print(f"  indexed lookup:                 {indexed_per_query * 1000:9.3f} ms/query")
+    print(f"  incremental refresh:            {refresh * 1000:9.1f} ms ({re_embedded} re-embedded)")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
@@ -0,0 +1,28 @@
+# ============================================================================
+# SAFEHAVEN AI - BENCHMARK: THEME PAYLOAD PER RERUN
+# ============================================================================
+# Bytes of theme markup sent to the browser on every Streamlit rerun, with the
+# background inlined as base64 vs referenced through static serving, plus the
+# cost of building it uncached. Usage: python benchmarks/bench_frontend_payload.py
+import sys
+import os
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from frontend.theme import theme_markup
+
+
+def run(reruns=50):
+    for label, static in (("inline base64 (before)", False), ("static serving (after)", True)):
+        t0 = time.perf_counter()
+        for _ in range(reruns):
+            markup = theme_markup(static_serving=static)
+        build = (time.perf_counter() - t0) / reruns
+        size = len(markup.encode("utf-8"))
+        print(f"{label:24s}: {size / 1024:9.1f} KiB/rerun | {size * reruns / 1024 ** 2:7.2f} MiB per {reruns} reruns"
+              f" | uncached build {build * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,53 @@
+# ============================================================================
+# SAFEHAVEN AI - BENCHMARK: PORTFOLIO BATCH EXPORT
+# ============================================================================
+# Month-end export of N property reports into one ZIP: one-at-a-time
+# generate_inspection_report calls (previous behaviour) vs export_reports_zip
+# at increasing worker counts. Near-linear scaling needs that many free cores.
+# Usage: python benchmarks/bench_report_batch.py [reports] [max_workers]
+import sys
+import os
+import shutil
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.report_generator import export_reports_zip, generate_inspection_report
+
+
+def portfolio(n_reports):
+    # Generator on purpose: the exporter must not need the whole portfolio up front.
+    for i in range(n_reports):
+        yield f"{100 + i} Harbor View, Unit {i}", {f"Room {r}": f"{(i + r) % 5} defects" for r in range(8)}
+
+
+def run(n_reports=500, max_workers=None):
+    max_workers = max_workers or os.cpu_count() or 1
+    out_dir = tempfile.mkdtemp(prefix="bench_batch_")
+    try:
+        t0 = time.perf_counter()
+        for address, data in portfolio(n_reports):
+            generate_inspection_report(address, data, out_dir)
+        serial = time.perf_counter() - t0
+        print(f"{n_reports} reports, {os.cpu_count()} CPUs")
+        print(f"  one-by-one (files)   : {serial:6.2f} s  ({n_reports / serial:6.0f} reports/s)")
+
+        workers, base = 1, None
+        while workers <= max_workers:
+            zip_path = os.path.join(out_dir, f"portfolio_{workers}.zip")
+            t0 = time.perf_counter()
+            summary = export_reports_zip(portfolio(n_reports), zip_path, workers=workers)
+            elapsed = time.perf_counter() - t0
+            base = base or elapsed
+            print(f"  zip, {workers:2d} worker(s)    : {elapsed:6.2f} s  ({n_reports / elapsed:6.0f} reports/s, "
+                  f"{base / elapsed:4.1f}x) | {summary['reports']} PDFs, "
+                  f"{os.path.getsize(zip_path) / 1024:.0f} KiB")
+            workers *= 2
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 500,
+        int(sys.argv[2]) if len(sys.argv) > 2 else None)
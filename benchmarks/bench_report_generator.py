@@ -0,0 +1,59 @@
+# ============================================================================
+# SAFEHAVEN AI - BENCHMARK: PDF REPORT LATENCY
+# ============================================================================
+# Per-report latency of the in-memory renderer vs writing a unique temp file,
+# serially and from a thread pool (concurrent inspectors exporting at once).
+# Usage: python benchmarks/bench_report_generator.py [reports] [threads]
+import sys
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.report_generator import generate_inspection_report, render_inspection_report
+
+FINDINGS = {f"Room {i}": f"{i} defects, severity {10 * i}" for i in range(12)}
+
+
+def _timed(fn, *args):
+    t0 = time.perf_counter()
+    fn(*args)
+    return (time.perf_counter() - t0) * 1000
+
+
+def _report(label, latencies, wall):
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"  {label:<26}: median {statistics.median(latencies):6.3f} ms | p95 {p95:6.3f} ms | "
+          f"{len(latencies) / wall:7.0f} reports/s")
+
+
+def run(n_reports=2000, threads=8):
+    out_dir = tempfile.mkdtemp(prefix="bench_reports_")
+    try:
+        render_inspection_report("Warm Up", FINDINGS)
+        print(f"{n_reports} reports, {len(FINDINGS)} findings each")
+        for label, fn, args in (
+            ("in-memory bytes", render_inspection_report, ("123 Maple Street", FINDINGS)),
+            ("unique temp file", generate_inspection_report, ("123 Maple Street", FINDINGS, out_dir)),
+        ):
+            t0 = time.perf_counter()
+            serial = [_timed(fn, *args) for _ in range(n_reports)]
+            _report(f"{label} (serial)", serial, time.perf_counter() - t0)
+
+            t0 = time.perf_counter()
+            with ThreadPoolExecutor(threads) as pool:
+                pooled = list(pool.map(lambda _: _timed(fn, *args), range(n_reports)))
+            _report(f"{label} ({threads} thr)", pooled, time.perf_counter() - t0)
+        print(f"  files written             : {len(os.listdir(out_dir))} (one per export, none overwritten)")
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 2000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 8)
@@ -0,0 +1,66 @@
+# ============================================================================
+# SAFEHAVEN AI - BENCHMARK: SANITIZER ON ADVERSARIAL INPUT
+# ============================================================================
+# The previous two-regex sanitize_input (lazy `.*?` under DOTALL) against the
+# linear scanner, on payloads built to trigger backtracking. The legacy version
+# is only timed up to LEGACY_MAX_BYTES: beyond that it grows quadratically.
+# Usage: python benchmarks/bench_sanitize.py [max_kib]
+import sys
+import os
+import re
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pandas as pd
+
+from backend.utils import sanitize_input, sanitize_many
+
+LEGACY_MAX_BYTES = 64 * 1024
+
+PAYLOADS = {
+    "unclosed <script":   lambda n: "<script " * (n // 8),
+    "unclosed <iframe":   lambda n: "<iframe " * (n // 8),
+    "open tag, no close": lambda n: "<script>" + "a" * n,
+    "benign notes":       lambda n: ("Water stain under sink, <b>severity</b> 45.\n" * (n // 46)),
+}
+
+
+def legacy_sanitize_input(user_input: str) -> str:
+    clean_str = re.sub(r'<script.*?>.*?</script>', '', user_input, flags=re.IGNORECASE | re.DOTALL)
+    clean_str = re.sub(r'<(/?)(iframe|object|embed|applet|style|meta|link).*?>', '', clean_str, flags=re.IGNORECASE)
+    return clean_str.strip()
+
+
+def _time(fn, text):
+    t0 = time.perf_counter()
+    fn(text)
+    return time.perf_counter() - t0
+
+
+def run(max_kib=1024):
+    sizes = [16 * 1024 * 2 ** i for i in range(12) if 16 * 2 ** i <= max_kib]
+    for name, build in PAYLOADS.items():
+        print(f"{name}")
+        for size in sizes:
+            text = build(size)
+            new = _time(sanitize_input, text)
+            line = f"  {size // 1024:5d} KiB | linear {new * 1000:9.2f} ms"
+            if size <= LEGACY_MAX_BYTES:
+                old = _time(legacy_sanitize_input, text)
+                line += f" | legacy {old * 1000:9.2f} ms ({old / new:7.1f}x)"
+            print(line)
+
+    column = pd.Series(["Leak under sink", "<script>x</script>Mold in bath", "Cracked tile"] * 100_000)
+    t0 = time.perf_counter()
+    [sanitize_input(v) for v in column]
+    per_row = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    sanitize_many(column)
+    batch = time.perf_counter() - t0
+    print(f"column of {len(column)} notes | per-row {per_row * 1000:7.1f} ms | "
+          f"sanitize_many {batch * 1000:7.1f} ms ({per_row / batch:.1f}x)")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 1024)
@@ -0,0 +1,49 @@
+# ============================================================================
+# SAFEHAVEN AI - BENCHMARK: VIDEO JOB THROUGHPUT
+# ============================================================================
+# Serial blocking generate_repair_video calls (previous behaviour) vs submitting
+# every job up front and collecting results, against the local fake Higgsfield
+# server. Usage: python benchmarks/bench_video_jobs.py [jobs] [latency_s]
+import sys
+import os
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.fake_higgsfield import FakeHiggsfieldServer
+from backend.video_generator import HiggsfieldClient
+
+
+def run(n_jobs=16, latency=1.0):
+    with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as f:
+        f.write(os.urandom(256 * 1024))
+        image = f.name
+    try:
+        with FakeHiggsfieldServer(latency=latency) as server:
+            client = HiggsfieldClient(api_key="bench", base_url=server.url, max_workers=n_jobs, poll_interval=0.1)
+
+            t0 = time.perf_counter()
+            for i in range(n_jobs):
+                client.generate_repair_video(image, f"repair {i}")
+            serial = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            jobs = [client.submit(image, f"repair {i}") for i in range(n_jobs)]
+            submit = time.perf_counter() - t0
+            for job in jobs:
+                client.result(job)
+            concurrent = time.perf_counter() - t0
+            client.shutdown()
+    finally:
+        os.remove(image)
+
+    print(f"{n_jobs} jobs, provider latency {latency:.1f}s")
+    print(f"  serial (blocking) : {serial:6.2f} s  ({n_jobs / serial:5.2f} jobs/s)")
+    print(f"  job API           : {concurrent:6.2f} s  ({n_jobs / concurrent:5.2f} jobs/s, "
+          f"{serial / concurrent:.1f}x) | caller blocked {submit * 1000:.1f} ms to submit all")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 16,
+        float(sys.argv[2]) if len(sys.argv) > 2 else 1.0)
@@ -14,6 +14,12 @@ import sys
 # Add backend path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
+from backend.dashboard_data import connect_data_source, empty_room_stats, load_property_dashboard
+from backend.image_cache import ResizedImageCache
+from backend.image_preprocessing import UI_SIZE, preprocess_upload
+from backend.report_generator import render_inspection_report
+from frontend.theme import CSS_PATH, theme_markup
+
 # -----------------------------------------------------------------------------
 # 1. SETUP & CSS INJECTION
 # -----------------------------------------------------------------------------
@@ -24,85 +30,31 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+@st.cache_data
+def _theme_markup(static_serving: bool, css_mtime: float) -> str:
+    # Built once per process (and per style.css edit) instead of re-reading and
+    # re-encoding the background on every rerun.
+    return theme_markup(static_serving)
+
+@st.cache_resource
+def get_image_cache() -> ResizedImageCache:
+    # One cache for all sessions; bundled assets are pre-resized on first use so switching
+    # rooms never re-decodes a PNG.
+    cache = ResizedImageCache()
+    img_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "img")
+    cache.warm(os.path.join(img_dir, f) for f in sorted(os.listdir(img_dir)) if f.endswith(".png"))
+    return cache
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def preprocess_evidence(upload_id: str, _upload) -> dict:
+    # Keyed on the uploader's file id: reruns and widget interactions reuse the variant
+    # metadata instead of re-reading, re-hashing and re-decoding the upload.
+    return preprocess_upload(_upload, filename=_upload.name)
+
 def inject_custom_css():
-    css_path = os.path.join(os.path.dirname(__file__), 'style.css')
-    if os.path.exists(css_path):
-        with open(css_path) as f:
-            st.markdown(f'<style>{f.read()}</style>', unsafe_allow_html=True)
-            
-    # Inject Background Asset (Video or Image)
-    # Priority: 1. Local 'background.mp4' 2. Local 'background_frame.png' 3. Local 'repaired.png'
-    
-    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-    bg_video_path = os.path.join(BASE_DIR, 'background.mp4')
-    # Use the new "Cinematic Frame" as result of the video generation
-    bg_image_path = os.path.join(BASE_DIR, "img", "background_frame.png")
-    
-    bg_element = ""
-    
-    if os.path.exists(bg_video_path):
-        # User provided video
-        with open(bg_video_path, "rb") as v:
-            video_bytes = v.read()
-            b64_video = base64.b64encode(video_bytes).decode()
-            
-        bg_element = f"""
-            <video autoplay muted loop playsinline class="video-background">
-                <source src="data:video/mp4;base64,{b64_video}" type="video/mp4">
-            </video>
-        """
-    elif os.path.exists(bg_image_path):
-        # Fallback to Cinematic Frame
-        # NOTE: Using standard string (not f-string) for the template to avoid brace confusion
-        # IMPORTANT: Removing indentation to prevent Markdown code block rendering
-        bg_element = """
-<style>
-.video-background {
-    background-image: url("data:image/png;base64,__IMG_BASE64__");
-    background-size: cover;
-    background-position: center;
-    background-attachment: fixed;
-}
-</style>
-<div class="video-background"></div>
-"""
-        import base64
-        with open(bg_image_path, "rb") as img:
-            b64_img = base64.b64encode(img.read()).decode()
-            bg_element = bg_element.replace("__IMG_BASE64__", b64_img)
-    else:
-        # Emergency Fallback
-        bg_element = """<div class="video-background" style="background: linear-gradient(135deg, #000, #111);"></div>"""
-
-    st.markdown(f"""
-        <style>
-            /* Critical: Force Streamlit containers to be transparent */
-            .stApp {{ background: transparent !important; }}
-            [data-testid="stAppViewContainer"] {{ background: transparent !important; }}
-            [data-testid="stHeader"] {{ background: transparent !important; }}
-            
-            .video-background {{
-                position: fixed;
-                top: 0;
-                left: 0;
-                width: 100vw;
-                height: 100vh;
-                z-index: -100;
-                object-fit: cover;
-                filter: brightness(0.7) contrast(1.2); /* High Contrast for Nike Vibe */
-                pointer-events: none;
-            }}
-            
-            /* KPI Alignment Fix */
-            .kpi-value {{
-                white-space: nowrap; /* Prevent wrapping */
-                overflow: hidden;
-                text-overflow: ellipsis;
-                font-size: clamp(2rem, 3.5vw, 3.5rem) !important; /* Slightly reduced max size */
-            }}
-        </style>
-        {bg_element}
-    """, unsafe_allow_html=True)
+    css_mtime = os.path.getmtime(CSS_PATH) if os.path.exists(CSS_PATH) else 0.0
+    markup = _theme_markup(bool(st.get_option("server.enableStaticServing")), css_mtime)
+    st.markdown(markup, unsafe_allow_html=True)
 
 
 inject_custom_css()
@@ -136,7 +88,7 @@ with st.sidebar:
     st.markdown("---")
     
     # Property Filter
-    st.selectbox("📍 Property Selector", ["123 Maple Street", "The Glass Penthouse", "Industrial Lofts A"])
+    st.selectbox("📍 Property Selector", ["123 Maple Street", "The Glass Penthouse", "Industrial Lofts A"], key="selected_property")
     
     # Upload Zone
     st.markdown("### 📤 Upload Assets")
@@ -161,20 +113,35 @@ def render_kpi(col, label, value, delta=None, color=""):
         </div>
         """, unsafe_allow_html=True)
 
-# Demo Data Engine for Dynamic Experience
-ROOM_DATA = {
-    "Kitchen": {"score": "82/100", "defects": "3", "cost": "$4,250", "legal": "1", "delta_score": "▲ 2%", "delta_defects": "▼ 1 Resolved"},
-    "Bedroom": {"score": "95/100", "defects": "0", "cost": "$0", "legal": "0", "delta_score": "▲ 5%", "delta_defects": "All Clear"},
-    "Bath": {"score": "65/100", "defects": "5", "cost": "$8,100", "legal": "3", "delta_score": "▼ 12%", "delta_defects": "▲ 2 New"},
-    "Living": {"score": "88/100", "defects": "1", "cost": "$850", "legal": "0", "delta_score": "━ Stable", "delta_defects": "Minor"}
-}
+# Data Engine: Snowflake session (or pooled sessions) in production, seeded SQLite in Demo Mode
+DASHBOARD_TTL_S = 300
+
+@st.cache_resource
+def get_data_source():
+    return connect_data_source()
+
+@st.cache_data(ttl=DASHBOARD_TTL_S, show_spinner=False)
+def load_dashboard(property_id: str) -> dict:
+    # One aggregated query per property; room switches only index the cached result.
+    return load_property_dashboard(get_data_source(), property_id)
+
+@st.cache_data(ttl=DASHBOARD_TTL_S, show_spinner=False)
+def inspection_report_pdf(property_id: str) -> bytes:
+    # Rendered in memory (no shared file on disk for concurrent exports to overwrite) and cached
+    # per property across all sessions, like load_dashboard; only rendered once a user asks for it.
+    summary = {
+        room: f"score {s['score']}/100, {s['defects']} defects, est. ${s['cost_usd']:,.0f}, {s['serious']} serious"
+        for room, s in load_dashboard(property_id).items()
+    }
+    return render_inspection_report(property_id, summary)
 
-current_data = ROOM_DATA.get(st.session_state.selected_room, ROOM_DATA["Kitchen"])
+room_data = load_dashboard(st.session_state.get("selected_property", "123 Maple Street"))
+current_data = room_data.get(st.session_state.selected_room) or empty_room_stats()
 
-render_kpi(kpi1, "Habitability Score", current_data["score"], current_data["delta_score"], "#D0FF00" if "▲" in current_data["delta_score"] else "#FF2E2E")
-render_kpi(kpi2, "Critical Defects", current_data["defects"], current_data["delta_defects"], "#FF2E2E" if int(current_data["defects"]) > 0 else "#D0FF00")
-render_kpi(kpi3, "Est. Repair Cost", current_data["cost"], "Based on local materials", "#FFAA00")
-render_kpi(kpi4, "Legal Violations", current_data["legal"], "Requires Permits" if int(current_data["legal"]) > 0 else "Compliant", "#29B5E8")
+render_kpi(kpi1, "Habitability Score", f"{current_data['score']}/100", "▲ Habitable" if current_data["score"] >= 80 else "▼ Needs Attention", "#D0FF00" if current_data["score"] >= 80 else "#FF2E2E")
+render_kpi(kpi2, "Critical Defects", str(current_data["defects"]), "All Clear" if current_data["defects"] == 0 else f"{current_data['defects']} Open", "#FF2E2E" if current_data["defects"] > 0 else "#D0FF00")
+render_kpi(kpi3, "Est. Repair Cost", f"${current_data['cost_usd']:,.0f}", "Based on local materials", "#FFAA00")
+render_kpi(kpi4, "Serious Defects", str(current_data["serious"]), "Severity 51+ (likely permit work)" if current_data["serious"] > 0 else "None Found", "#29B5E8")
 
 # Split Layout (Row 2)
 c_left, c_right = st.columns([2, 1])
@@ -292,6 +259,8 @@ with tab1:
     # Replaces pixel-based smoothing with High-Fidelity Generative Assets ("Concept Restoration")
     from PIL import Image, ImageEnhance, ImageFilter, ImageOps
     
+    IMAGE_CACHE = get_image_cache()
+    
     def process_and_resize(img_obj, target_width=1200, target_height=600):
         # Resize to fixed banner style dimensions
         return img_obj.resize((target_width, target_height))
@@ -300,6 +269,7 @@ with tab1:
         """
         Uses a high-quality "After" image as a restoration target.
         This provides a 'Construction Vision' look.
+        Returns the banner-sized image (HQ assets come pre-resized from the shared cache).
         """
         # Determine which HQ asset to use
         if "bath" in scene_type.lower():
@@ -310,17 +280,20 @@ with tab1:
         hq_path = get_asset_path(hq_asset_name)
         
         if os.path.exists(hq_path):
-            restored = Image.open(hq_path)
+            restored = IMAGE_CACHE.get_path(hq_path, UI_SIZE)
         else:
             # Fallback if asset missing (should not happen)
-            restored = img_obj.filter(ImageFilter.MedianFilter(size=5))
+            restored = process_and_resize(img_obj.filter(ImageFilter.MedianFilter(size=5)))
             
         # Optional: We could color-match the restored image to the original, but usually 
         # users want to see the "New" look, not the old dirty colors.
         
         return restored
 
-    user_upload = st.session_state.get("uploaded_evidence", [])
+    user_upload = [
+        f for f in (st.session_state.get("uploaded_evidence") or [])
+        if f.name.lower().endswith((".png", ".jpg", ".jpeg"))
+    ]
     
     if user_upload:
         # Scene Context Detection
@@ -330,16 +303,24 @@ with tab1:
         st.success(f"⚡ Cortex Analysis Complete: Detected **{detected_scene}**", icon="🤖")
         # Visual Comparison: User Upload vs. AI Restoration of THAT upload
         
-        original_pil = Image.open(user_upload[0])
+        # Ingest preprocessing: model/UI variants are generated once per upload and the
+        # result is cached, so reruns never touch the multi-megabyte original again.
+        evidence = user_upload[0]
+        upload_variants = preprocess_evidence(
+            getattr(evidence, "file_id", None) or f"{evidence.name}:{evidence.size}", evidence
+        )
+        original_pil = IMAGE_CACHE.get_image(
+            upload_variants["content_hash"], UI_SIZE, lambda: Image.open(upload_variants["ui_path"])
+        )
         
         # 1. Generate the "Restored" version using the HQ Proxy
-        restored_pil = simulate_restoration(original_pil, scene_type=detected_scene)
-        
-        # 2. Resize both for height control
-        img1_source = process_and_resize(original_pil)
         # We resize the HQ asset to match the container, disregarding aspect ratio slightly for the banner effect
         # or we could center crop. For now, simple resize is robust.
-        img2_source = process_and_resize(restored_pil)
+        restored_pil = simulate_restoration(original_pil, scene_type=detected_scene)
+        
+        # 2. Both are already banner-sized for height control
+        img1_source = original_pil
+        img2_source = restored_pil
         
         label_1_text = f"Evidence ({st.session_state.selected_room})"
         label_2_text = f"Vision: {detected_scene}"
@@ -356,14 +337,11 @@ with tab1:
         r_path = get_asset_path(repair_file)
         if not os.path.exists(r_path): r_path = get_asset_path("repaired.png")
         
-        # Load and Resize Defaults
+        # Load and Resize Defaults (pre-resized at startup by the shared cache)
         try:
-            p1 = Image.open(d_path) if os.path.exists(d_path) else None
-            p2 = Image.open(r_path) if os.path.exists(r_path) else None
-            
-            if p1 and p2:
-                 img1_source = process_and_resize(p1)
-                 img2_source = process_and_resize(p2)
+            if os.path.exists(d_path) and os.path.exists(r_path):
+                 img1_source = IMAGE_CACHE.get_path(d_path, UI_SIZE)
+                 img2_source = IMAGE_CACHE.get_path(r_path, UI_SIZE)
             else:
                  # Fallback URLS (Can't resize easily without downloading, assuming they work)
                  img1_source = "https://images.unsplash.com/photo-1582281298055-e25b84a30b0b?q=80&w=1000"
@@ -434,7 +412,14 @@ with tab3:
         </div>
     """, unsafe_allow_html=True)
     l_c1, l_c2 = st.columns(2)
-    with l_c1: st.button("📄 Generate Official Citation Report", use_container_width=True)
+    with l_c1:
+        report_property = st.session_state.get("selected_property", "123 Maple Street")
+        if st.button("📄 Generate Official Citation Report", use_container_width=True):
+            st.session_state.report_property = report_property
+        if st.session_state.get("report_property") == report_property:
+            st.download_button("⬇️ Download Report (PDF)", inspection_report_pdf(report_property),
+                               file_name=f"{report_property} - Inspection Report.pdf", mime="application/pdf",
+                               use_container_width=True)
     with l_c2: st.button("🚩 Flag for Human Review", use_container_width=True)
 
 with tab4:
@@ -0,0 +1,106 @@
+# ============================================================================
+# SAFEHAVEN AI - FRONTEND THEME ASSETS
+# ============================================================================
+# Builds the CSS/background markup injected by streamlit_app.py. Kept free of
+# Streamlit imports so the markup (and its size) can be built offline.
+
+import base64
+import os
+
+FRONTEND_DIR = os.path.dirname(os.path.abspath(__file__))
+CSS_PATH = os.path.join(FRONTEND_DIR, "style.css")
+# Served at STATIC_URL when server.enableStaticServing is on (.streamlit/config.toml).
+STATIC_DIR = os.path.join(FRONTEND_DIR, "static")
+STATIC_URL = "app/static"
+
+# Priority: 1. 'background.mp4' 2. 'background_frame.png' (the "Cinematic Frame")
+BG_VIDEO = "background.mp4"
+BG_IMAGE = "background_frame.png"
+
+OVERLAY_CSS = """
+<style>
+    /* Critical: Force Streamlit containers to be transparent */
+    .stApp { background: transparent !important; }
+    [data-testid="stAppViewContainer"] { background: transparent !important; }
+    [data-testid="stHeader"] { background: transparent !important; }
+
+    .video-background {
+        position: fixed;
+        top: 0;
+        left: 0;
+        width: 100vw;
+        height: 100vh;
+        z-index: -100;
+        object-fit: cover;
+        filter: brightness(0.7) contrast(1.2); /* High Contrast for Nike Vibe */
+        pointer-events: none;
+    }
+
+    /* KPI Alignment Fix */
+    .kpi-value {
+        white-space: nowrap; /* Prevent wrapping */
+        overflow: hidden;
+        text-overflow: ellipsis;
+        font-size: clamp(2rem, 3.5vw, 3.5rem) !important; /* Slightly reduced max size */
+    }
+</style>
+"""
+
+# NOTE: No indentation, to prevent Markdown code block rendering
+_IMAGE_BACKGROUND = """
+<style>
+.video-background {
+    background-image: url("__IMG_URL__");
+    background-size: cover;
+    background-position: center;
+    background-attachment: fixed;
+}
+</style>
+<div class="video-background"></div>
+"""
+
+_FALLBACK_BACKGROUND = """<div class="video-background" style="background: linear-gradient(135deg, #000, #111);"></div>"""
+
+
+def _data_uri(path: str, mime: str) -> str:
+    with open(path, "rb") as f:
+        return f"data:{mime};base64,{base64.b64encode(f.read()).decode()}"
+
+
+def read_css(path: str = CSS_PATH) -> str:
+    if not os.path.exists(path):
+        return ""
+    with open(path) as f:
+        return f"<style>{f.read()}</style>"
+
+
+def background_html(static_serving: bool = True, static_dir: str = STATIC_DIR) -> str:
+    """
+    Background element markup.
+
+    Args:
+        static_serving (bool): Reference the image by URL (browser-cached) instead of
+            inlining it as base64. Video is always inlined: Streamlit's static server only
+            sends image MIME types, and serves anything else as text/plain.
+        static_dir (str): Directory holding the background assets.
+
+    Returns:
+        str: HTML for the `.video-background` element.
+    """
+    video_path = os.path.join(static_dir, BG_VIDEO)
+    image_path = os.path.join(static_dir, BG_IMAGE)
+    if os.path.exists(video_path):
+        return f"""
+            <video autoplay muted loop playsinline class="video-background">
+                <source src="{_data_uri(video_path, 'video/mp4')}" type="video/mp4">
+            </video>
+        """
+    if os.path.exists(image_path):
+        url = f"{STATIC_URL}/{BG_IMAGE}" if static_serving else _data_uri(image_path, "image/png")
+        return _IMAGE_BACKGROUND.replace("__IMG_URL__", url)
+    return _FALLBACK_BACKGROUND
+
+
+def theme_markup(static_serving: bool = True) -> str:
+    """Everything inject_custom_css sends per rerun: stylesheet, overlay rules, background."""
+    return read_css() + OVERLAY_CSS + background_html(static_serving)
@@ -23,7 +23,9 @@ CREATE OR REPLACE TABLE BUILDING_CODES_CHUNKS (
     CHUNK_ID STRING DEFAULT UUID_STRING(),
     SECTION_TITLE STRING,
     CHUNK_TEXT STRING, -- The actual code text
-    METADATA VARIANT   -- Additional info like source, year
+    METADATA VARIANT,  -- Additional info like source, year
+    CONTENT_HASH STRING,                -- SHA2(CHUNK_TEXT, 256) at the time the embedding was computed
+    CHUNK_EMBEDDING VECTOR(FLOAT, 768)  -- Precomputed once at ingest (snowflake-arctic-embed-m)
 );
 
 -- Mock Data Insertion (IBC Section 101 - Structural Safety)
@@ -32,30 +34,120 @@ INSERT INTO BUILDING_CODES_CHUNKS (SECTION_TITLE, CHUNK_TEXT, METADATA) VALUES
 ('NEC Article 210', 'Electrical Wiring: In kitchen wall receptacles, GFCI protection is required for all outlets that serve partial countertop surfaces.', {'source': 'NEC 2023', 'category': 'Electrical'}),
 ('IRC Section R302', 'Fire-Resistant Construction: Garage-dwelling separation requires not less than 1/2-inch gypsum board applied to the garage side.', {'source': 'IRC 2021', 'category': 'Fire Safety'});
 
--- 4. INTELLIGENT PIPELINE (DYNAMIC TABLE)
--- Triggers every 1 minute to process new images found in the directory table.
--- extracting defects, severity, visual description, and fixes using Llama-3.2-90b-vision.
+-- Incremental embedding refresh: only new or changed chunks are sent to EMBED_TEXT_768.
+-- Re-run after every code-book load (also exposed as backend.embedding_index.refresh_chunk_embeddings).
+UPDATE BUILDING_CODES_CHUNKS
+SET CHUNK_EMBEDDING = SNOWFLAKE.CORTEX.EMBED_TEXT_768('snowflake-arctic-embed-m', CHUNK_TEXT),
+    CONTENT_HASH = SHA2(CHUNK_TEXT, 256)
+WHERE CHUNK_EMBEDDING IS NULL
+   OR CONTENT_HASH IS DISTINCT FROM SHA2(CHUNK_TEXT, 256);
 
-CREATE OR REPLACE DYNAMIC TABLE DT_INSPECTION_ANALYSIS
-    TARGET_LAG = '1 minute'
+-- 4. VISION ANALYSIS CACHE
+-- Raw model output keyed by image content (directory-table MD5) + model + prompt version.
+-- Duplicate photos and re-uploads are served from here and never reach the model again.
+-- Bump PROMPT_VERSION in backend/analysis_cache.py whenever the prompt changes.
+CREATE TABLE IF NOT EXISTS ANALYSIS_CACHE (
+    CONTENT_HASH STRING,
+    MODEL STRING,
+    PROMPT_VERSION STRING,
+    AI_ANALYSIS_RAW STRING,
+    CREATED_AT TIMESTAMP_LTZ DEFAULT CURRENT_TIMESTAMP(),
+    PRIMARY KEY (CONTENT_HASH, MODEL, PROMPT_VERSION)
+);
+
+-- 5. INTELLIGENT PIPELINE (INCREMENTAL STREAM + TASK)
+-- Append-only: a stream on the stage's directory table yields only newly added files, and a
+-- task drains it into a queue processed in micro-batches by a Python stored procedure
+-- (backend/pipeline.py). Each image is analyzed with Llama-3.2-90b-vision at most once per
+-- content hash (ANALYSIS_CACHE) and its output is validated before landing in a typed table.
+-- Near-duplicate shots of the same property (perceptual hashes, stored in PHASH / DHASH) reuse
+-- their cluster representative's analysis instead of a model call (DUPLICATE_OF).
+-- Stage layout convention: <property>/<room>/<file>.
+
+CREATE OR REPLACE STREAM INSPECTION_ASSETS_STREAM ON STAGE INSPECTION_ASSETS;
+
+CREATE TABLE IF NOT EXISTS PENDING_ASSETS (
+    RELATIVE_PATH STRING,
+    MD5 STRING,
+    LAST_MODIFIED TIMESTAMP_LTZ,
+    ATTEMPTS NUMBER DEFAULT 0      -- runs in which the model returned no result (retried)
+);
+
+ALTER TABLE PENDING_ASSETS ADD COLUMN IF NOT EXISTS ATTEMPTS NUMBER DEFAULT 0;
+
+CREATE TABLE IF NOT EXISTS INSPECTION_RESULTS (
+    FILE_NAME STRING,
+    PROPERTY_ID STRING,
+    ROOM STRING,
+    CONTENT_HASH STRING,
+    DEFECT STRING,
+    SEVERITY NUMBER(3, 0),         -- 0-100, validated by DefectModel
+    VISUAL_DESCRIPTION STRING,
+    RECOMMENDED_FIX STRING,
+    IS_VALID BOOLEAN,              -- FALSE when the output could not be parsed or repaired
+    CACHE_HIT BOOLEAN,
+    DUPLICATE_OF STRING,           -- near-duplicate representative whose analysis was reused
+    PHASH STRING,                  -- 64-bit perceptual hashes (hex) used for near-duplicate clustering
+    DHASH STRING,
+    AI_ANALYSIS_RAW STRING,
+    LAST_MODIFIED TIMESTAMP_LTZ,
+    PROCESSED_AT TIMESTAMP_LTZ DEFAULT CURRENT_TIMESTAMP()
+);
+
+ALTER TABLE INSPECTION_RESULTS ADD COLUMN IF NOT EXISTS DUPLICATE_OF STRING;
+ALTER TABLE INSPECTION_RESULTS ADD COLUMN IF NOT EXISTS PHASH STRING;
+ALTER TABLE INSPECTION_RESULTS ADD COLUMN IF NOT EXISTS DHASH STRING;
+
+-- Backend code for the procedure: PUT a zip of backend/ here (e.g. backend.zip).
+CREATE STAGE IF NOT EXISTS APP_CODE;
+
+CREATE OR REPLACE PROCEDURE PROCESS_NEW_ASSETS(BATCH_SIZE INT)
+    RETURNS VARIANT
+    LANGUAGE PYTHON
+    RUNTIME_VERSION = '3.11'
+    PACKAGES = ('snowflake-snowpark-python', 'pydantic', 'numpy', 'pillow', 'scipy')
+    IMPORTS = ('@APP_CODE/backend.zip')
+    HANDLER = 'backend.pipeline.run_incremental_batch';
+
+CREATE OR REPLACE TASK PROCESS_NEW_ASSETS_TASK
     WAREHOUSE = 'COMPUTE_WH' -- Assumes default warehouse exists
+    SCHEDULE = '1 MINUTE'
+    WHEN SYSTEM$STREAM_HAS_DATA('INSPECTION_ASSETS_STREAM')
 AS
+    CALL PROCESS_NEW_ASSETS(16);
+
+ALTER TASK PROCESS_NEW_ASSETS_TASK RESUME;
+
+-- Retire the dynamic-table pipeline on existing deployments: a view cannot replace a
+-- dynamic table of the same name, and the old objects would otherwise keep refreshing.
+DROP DYNAMIC TABLE IF EXISTS DT_INSPECTION_ANALYSIS;
+DROP DYNAMIC TABLE IF EXISTS DT_IMAGE_ANALYSIS;
+DROP TASK IF EXISTS PERSIST_ANALYSIS_CACHE;
+
+-- Read-compatible view for consumers of the former dynamic table.
+CREATE OR REPLACE VIEW DT_INSPECTION_ANALYSIS AS
 SELECT 
-    RELATIVE_PATH AS FILE_NAME,
-    GET_PRESIGNED_URL(@INSPECTION_ASSETS, RELATIVE_PATH) AS FILE_URL,
-    -- Call Snowflake Cortex AI (Llama 3.2 Vision)
-    -- We prompt the model to return a strict JSON structure.
-    SNOWFLAKE.CORTEX.AI_COMPLETE(
-        'llama-3.2-90b-vision', 
-        {
-            'image': FILE_URL,
-            'prompt': 'Analyze this home inspection image. Identify any defects. Return ONLY a JSON object with this structure: {"defect": "name of defect", "severity": 0-100, "visual_description": "detailed description", "recommended_fix": "how to fix"}. Do not add any markdown formatting.'
-        }
-    ) AS AI_ANALYSIS_RAW,
-    -- Metadata from the file (e.g., upload time)
+    FILE_NAME,
+    GET_PRESIGNED_URL(@INSPECTION_ASSETS, FILE_NAME) AS FILE_URL,
+    CONTENT_HASH,
+    AI_ANALYSIS_RAW,
+    CACHE_HIT,
     LAST_MODIFIED
-FROM DIRECTORY(@INSPECTION_ASSETS)
-WHERE RELATIVE_PATH LIKE '%.jpg' OR RELATIVE_PATH LIKE '%.png' OR RELATIVE_PATH LIKE '%.jpeg';
+FROM INSPECTION_RESULTS;
 
 -- Add a comment to describe the table
-COMMENT ON TABLE DT_INSPECTION_ANALYSIS IS 'Automated inspection analysis pipeline using Snowflake Cortex Vision.';
+COMMENT ON TABLE INSPECTION_RESULTS IS 'Automated inspection analysis pipeline using Snowflake Cortex Vision.';
+
+-- Cache hit-rate metrics. CACHE_HITS counts exact-content cache hits only; near-duplicate
+-- shots that reused a representative's analysis are counted separately (NEAR_DUPLICATES).
+-- HIT_RATE: share of non-duplicate files that did not need a model call.
+CREATE OR REPLACE VIEW V_ANALYSIS_CACHE_STATS AS
+SELECT 
+    COUNT(*) AS FILES,
+    COUNT(DISTINCT CONTENT_HASH) AS DISTINCT_IMAGES,
+    COUNT_IF(CACHE_HIT) AS CACHE_HITS,
+    COUNT_IF(DUPLICATE_OF IS NOT NULL) AS NEAR_DUPLICATES,
+    COUNT(DISTINCT IFF(CACHE_HIT OR DUPLICATE_OF IS NOT NULL, NULL, CONTENT_HASH)) AS MODEL_CALLS,
+    1 - COUNT(DISTINCT IFF(CACHE_HIT OR DUPLICATE_OF IS NOT NULL, NULL, CONTENT_HASH))
+        / NULLIF(COUNT_IF(DUPLICATE_OF IS NULL), 0) AS HIT_RATE
+FROM INSPECTION_RESULTS;
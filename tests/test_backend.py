@@ -7,6 +7,7 @@ import pytest
 import sys
 import os
 import json
+import time
 
 # Add parent dir to path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -51,3 +52,1082 @@ def test_sanitize_input():
     dirty = "Hello <script>alert('xss')</script> World"
     clean = sanitize_input(dirty)
     assert clean == "Hello  World" or clean == "Hello World" # Regex might leave double space
+
+# 4. Test Legal Shield Embedding Index
+from backend.embedding_index import EmbeddingIndex, LocalHashEmbedder
+
+CODE_CHUNKS = [
+    {"CHUNK_ID": "1", "SECTION_TITLE": "IBC Section 101.5", "CHUNK_TEXT": "Load-bearing walls must be certified by a structural engineer. Removal of studs poses a collapse risk."},
+    {"CHUNK_ID": "2", "SECTION_TITLE": "NEC Article 210", "CHUNK_TEXT": "GFCI protection is required for kitchen countertop receptacle outlets."},
+    {"CHUNK_ID": "3", "SECTION_TITLE": "IRC Section R302", "CHUNK_TEXT": "Garage separation requires 1/2-inch gypsum board on the garage side."},
+]
+
+class CountingEmbedder(LocalHashEmbedder):
+    def __init__(self):
+        super().__init__()
+        self.embedded = 0
+
+    def __call__(self, texts):
+        self.embedded += len(texts)
+        return super().__call__(texts)
+
+def test_local_embedder_is_deterministic_and_normalized():
+    a = LocalHashEmbedder()(["GFCI outlet missing"])
+    b = LocalHashEmbedder()(["GFCI outlet missing"])
+    assert a.shape == (1, 768)
+    assert (a == b).all()
+    assert abs(float((a[0] ** 2).sum()) - 1.0) < 1e-5
+
+def test_embedding_index_only_reembeds_changed_chunks():
+    embedder = CountingEmbedder()
+    index = EmbeddingIndex(embedder)
+    assert index.upsert(CODE_CHUNKS) == 3
+    assert index.upsert(CODE_CHUNKS) == 0
+    changed = dict(CODE_CHUNKS[1], CHUNK_TEXT=CODE_CHUNKS[1]["CHUNK_TEXT"] + " Bathrooms too.")
+    assert index.upsert([changed]) == 1
+    assert embedder.embedded == 4
+    assert len(index) == 3
+
+    index.nearest("outlet near kitchen countertop has no GFCI")
+    assert embedder.embedded == 5  # query only
+    assert index.nearest("outlet near kitchen countertop has no GFCI")["SECTION_TITLE"] == "NEC Article 210"
+
+def test_embedding_index_save_load_roundtrip(tmp_path):
+    index = EmbeddingIndex()
+    index.upsert(CODE_CHUNKS)
+    path = str(tmp_path / "codes.npz")
+    index.save(path)
+    loaded = EmbeddingIndex.load(path)
+    assert loaded.chunk_ids == index.chunk_ids
+    assert (loaded.embeddings == index.embeddings).all()
+    assert loaded.upsert(CODE_CHUNKS) == 0
+
+class FakeSession:
+    """Records SQL issued by backend code and returns canned rows."""
+    def __init__(self, rows=None):
+        self.rows = rows or []
+        self.queries = []
+
+    def sql(self, query, params=None):
+        self.queries.append((query, params))
+        return self
+
+    def collect(self):
+        return self.rows
+
+def test_get_legal_context_embeds_only_the_query():
+    from backend.legal_rag import get_legal_context
+    session = FakeSession([{"SECTION_TITLE": "NEC Article 210", "CHUNK_TEXT": "GFCI required."}])
+    out = get_legal_context(session, "Outlet's missing GFCI")
+    assert "NEC Article 210" in out
+    query, params = session.queries[0]
+    assert "CHUNK_EMBEDDING" in query
+    assert "EMBED_TEXT_768('snowflake-arctic-embed-m', CHUNK_TEXT)" not in query
+    assert params == ["Outlet's missing GFCI", 1]
+
+# 5. Test Vector Search Engine
+import numpy as np
+from backend.vector_search import VectorSearchEngine, IVFIndex
+
+def test_exact_search_matches_full_sort():
+    rng = np.random.default_rng(1)
+    corpus = rng.standard_normal((500, 32))
+    queries = rng.standard_normal((7, 32))
+    for metric in ("cosine", "l2"):
+        idx, scores = VectorSearchEngine(corpus, metric=metric).search(queries, k=5)
+        if metric == "cosine":
+            c = corpus / np.linalg.norm(corpus, axis=1, keepdims=True)
+            q = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+            expected = np.argsort(-(q @ c.T), axis=1)[:, :5]
+        else:
+            expected = np.argsort(((queries[:, None, :] - corpus[None]) ** 2).sum(-1), axis=1)[:, :5]
+        assert (idx == expected).all()
+        assert (np.diff(scores, axis=1) <= 1e-6).all()
+
+def test_ivf_full_probe_equals_exact():
+    rng = np.random.default_rng(2)
+    corpus = rng.standard_normal((2000, 16))
+    queries = rng.standard_normal((10, 16))
+    exact_idx, _ = VectorSearchEngine(corpus).search(queries, k=3)
+    ivf = IVFIndex(corpus, n_lists=20)
+    ivf_idx, _ = ivf.search(queries, k=3, n_probe=20)
+    assert (ivf_idx == exact_idx).all()
+
+def test_get_legal_context_local_index_skips_warehouse():
+    from backend.legal_rag import get_legal_context
+    index = EmbeddingIndex()
+    index.upsert(CODE_CHUNKS)
+    session = FakeSession()
+    out = get_legal_context(session, "garage wall gypsum board missing", k=2, index=index)
+    assert session.queries == []
+    assert out.count("> **") == 2
+    assert out.split("> **")[1].startswith("IRC Section R302")
+
+# 6. Test Batched Legal Lookup
+def test_get_legal_context_batch_single_round_trip_and_dedup():
+    from backend.legal_rag import get_legal_context_batch
+    session = FakeSession([
+        {"DEFECT": "no gfci", "SECTION_TITLE": "NEC Article 210", "CHUNK_TEXT": "GFCI required.", "RANK_NO": 1},
+        {"DEFECT": "cut stud", "SECTION_TITLE": "IBC Section 101.5", "CHUNK_TEXT": "Studs.", "RANK_NO": 1},
+    ])
+    out = get_legal_context_batch(session, ["no gfci", "cut stud", "no gfci", "mystery"])
+    assert len(session.queries) == 1
+    _, params = session.queries[0]
+    assert params == ["no gfci", "cut stud", "mystery", 1]
+    assert set(out) == {"no gfci", "cut stud", "mystery"}
+    assert "NEC Article 210" in out["no gfci"]
+    assert "IBC Section 101.5" in out["cut stud"]
+    assert out["mystery"] == "No specific building code citation found for this issue."
+
+def test_get_legal_context_batch_local_matches_single_lookup():
+    from backend.legal_rag import get_legal_context, get_legal_context_batch
+    index = EmbeddingIndex()
+    index.upsert(CODE_CHUNKS)
+    defects = ["kitchen outlet without GFCI", "garage gypsum board missing"]
+    batch = get_legal_context_batch(None, defects, index=index)
+    for d in defects:
+        assert batch[d] == get_legal_context(None, d, index=index)
+
+# 7. Test Streaming Audio Forensics
+import soundfile as sf
+from backend.audio_forensics import analyze_wall_tap_stream
+
+def _write_tone_sweep(path, segments, sr=22050):
+    """segments: list of (frequency_hz, seconds). Writes a mono WAV."""
+    parts = [0.5 * np.sin(2 * np.pi * f * np.arange(int(sec * sr)) / sr) for f, sec in segments]
+    sf.write(str(path), np.concatenate(parts).astype(np.float32), sr)
+
+def test_streaming_timeline_localizes_hollow_section(tmp_path):
+    wav = tmp_path / "sweep.wav"
+    _write_tone_sweep(wav, [(4000, 3.0), (400, 2.0), (4000, 3.0)])
+    result = analyze_wall_tap_stream(str(wav), block_seconds=0.3, window_seconds=1.0)
+    assert result["risk_detected"] is True
+    assert abs(result["duration_s"] - 8.0) < 0.01
+    flags = [w["risk_detected"] for w in result["timeline"]]
+    assert len(flags) == 8
+    assert flags[:3] == [False] * 3 and flags[3:5] == [True, True] and flags[6:] == [False, False]
+
+def test_streaming_result_independent_of_block_size(tmp_path):
+    wav = tmp_path / "solid.wav"
+    _write_tone_sweep(wav, [(3000, 4.0)])
+    a = analyze_wall_tap_stream(str(wav), block_seconds=0.1)
+    b = analyze_wall_tap_stream(str(wav), block_seconds=10.0)
+    assert a["risk_detected"] is False
+    assert abs(a["value_hz"] - b["value_hz"]) < 1e-3
+    assert [w["value_hz"] for w in a["timeline"]] == pytest.approx([w["value_hz"] for w in b["timeline"]])
+
+def test_streaming_missing_file_is_suppressed():
+    result = analyze_wall_tap_stream("/nonexistent/tap.wav")
+    assert result["metric"] == "Error"
+    assert result["timeline"] == []
+
+# 8. Test Tap Segmentation
+from backend.audio_forensics import analyze_tap_sequence, detect_tap_onsets
+
+def _write_taps(path, tap_freqs, sr=22050, gap_s=0.5):
+    """Decaying tone bursts separated by silence; one burst per frequency."""
+    t = np.arange(int(0.1 * sr)) / sr
+    y = np.zeros(int(gap_s * sr * (len(tap_freqs) + 1)), dtype=np.float32)
+    for i, f in enumerate(tap_freqs):
+        start = int((i + 0.5) * gap_s * sr)
+        y[start:start + t.size] += (0.8 * np.exp(-t * 40) * np.sin(2 * np.pi * f * t)).astype(np.float32)
+    sf.write(str(path), y, sr)
+    return [(i + 0.5) * gap_s for i in range(len(tap_freqs))]
+
+def test_tap_onsets_found_and_silence_skipped(tmp_path):
+    wav = tmp_path / "taps.wav"
+    expected = _write_taps(wav, [3500, 3500, 3500, 3500])
+    y, sr = sf.read(str(wav), dtype="float32")
+    onsets = detect_tap_onsets(y, sr) / sr
+    assert len(onsets) == 4
+    assert np.allclose(onsets, expected, atol=0.02)
+    assert len(detect_tap_onsets(np.zeros(sr, dtype=np.float32), sr)) == 0
+
+def test_single_hollow_tap_is_not_averaged_away(tmp_path):
+    wav = tmp_path / "taps.wav"
+    _write_taps(wav, [4000] * 9 + [300])
+    result = analyze_tap_sequence(str(wav))
+    taps = result["taps"]
+    assert result["tap_count"] == 10
+    assert result["hollow_taps"] == 1
+    assert result["risk_detected"] is True
+    assert taps["hollow"][-1] and not taps["hollow"][:-1].any()
+    assert taps["low_ratio"][-1] > 0.9 and taps["high_ratio"][0] > 0.9
+    assert result["value_hz"] > 1500  # clip-wide mean would have called this wall solid
+
+# 9. Test Batch Audio Analyzer
+from backend.audio_forensics import analyze_wall_taps_batch
+
+def test_batch_analyzer_preserves_input_order(tmp_path):
+    paths = []
+    for i, freq in enumerate([4000, 300, 2500, 600]):
+        wav = tmp_path / f"tap_{i}.wav"
+        _write_tone_sweep(wav, [(freq, 1.0 + 0.25 * i)], sr=22050 if i % 2 else 44100)
+        paths.append(str(wav))
+    paths.append(str(tmp_path / "missing.wav"))
+
+    serial = analyze_wall_taps_batch(paths, workers=1)
+    pooled = analyze_wall_taps_batch(paths, workers=2)
+    assert [r["risk_detected"] for r in serial[:4]] == [False, True, False, True]
+    assert serial[4]["metric"] == "Error"
+    assert [r["value_hz"] for r in pooled] == pytest.approx([r["value_hz"] for r in serial])
+
+def test_batch_analyzer_resamples_only_unusual_rates(tmp_path):
+    wav = tmp_path / "lofi.wav"
+    _write_tone_sweep(wav, [(1000, 1.0)], sr=8000)
+    result = analyze_wall_taps_batch([str(wav)], workers=1)[0]
+    assert abs(result["value_hz"] - 1000) < 150
+
+# 10. Test Lightweight Centroid Kernel
+from backend.audio_forensics import analyze_wall_tap, spectral_centroid
+
+def test_numpy_centroid_matches_librosa():
+    import librosa
+    rng = np.random.default_rng(3)
+    y = (rng.standard_normal(22050 * 2) * np.linspace(0, 1, 22050 * 2)).astype(np.float32)
+    ours = spectral_centroid(y, 22050)
+    ref = librosa.feature.spectral_centroid(y=y, sr=22050)[0]
+    assert ours.shape == ref.shape
+    assert np.allclose(ours, ref, rtol=1e-3, atol=1.0)
+
+def test_fast_path_agrees_with_advanced_path(tmp_path):
+    wav = tmp_path / "tap.wav"
+    _write_tone_sweep(wav, [(900, 1.0), (2600, 1.0)], sr=44100)
+    fast = analyze_wall_tap(str(wav))
+    slow = analyze_wall_tap(str(wav), advanced=True)
+    assert fast["risk_detected"] == slow["risk_detected"]
+    assert fast["value_hz"] == pytest.approx(slow["value_hz"], rel=0.01)
+    assert analyze_wall_tap(str(tmp_path / "missing.wav"))["metric"] == "Error"
+
+def test_audio_module_does_not_import_librosa():
+    import subprocess
+    code = "import sys; import backend.audio_forensics; print('librosa' in sys.modules, 'snowflake.snowpark' in sys.modules)"
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                         cwd=os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+    assert out.stdout.strip() == "False False"
+
+# 11. Test Vectorized Cost Estimator
+import pandas as pd
+
+def test_estimate_repair_batch_matches_scalar():
+    rng = np.random.default_rng(4)
+    types = rng.choice(list(CostEstimator.BASELINE_COSTS) + ["unknown_defect"], size=2000)
+    severities = rng.integers(0, 101, size=2000)
+    regions = rng.choice([0.8, 1.0, 1.2, 1.5], size=2000)
+    batch = CostEstimator.estimate_repair_batch(types, severities, regions)
+    for i in range(len(types)):
+        est = CostEstimator.estimate_repair(types[i], int(severities[i]), float(regions[i]))
+        assert batch["min_estimate_usd"].iat[i] == pytest.approx(est["min_estimate_usd"], abs=0.006)
+        assert batch["max_estimate_usd"].iat[i] == pytest.approx(est["max_estimate_usd"], abs=0.006)
+        assert batch["severity_multiplier"].iat[i] == est["severity_multiplier"]
+
+def test_estimate_repair_batch_band_edges_and_series_input():
+    df = pd.DataFrame({"type": ["water_damage"] * 6, "sev": [0, 20, 21, 50, 80, 81]}, index=list("abcdef"))
+    out = CostEstimator.estimate_repair_batch(df["type"], df["sev"])
+    assert list(out.index) == list("abcdef")
+    assert out["severity_multiplier"].tolist() == [1.0, 1.0, 1.5, 1.5, 2.5, 4.0]
+
+# 12. Test Property Cost Rollup
+def test_estimate_property_is_seedable_and_centered():
+    types = ["water_damage", "roof_leak", "mold_remediation"] * 10
+    sev = [10, 60, 90] * 10
+    a = CostEstimator.estimate_property(types, sev, n_samples=20_000, seed=7)
+    b = CostEstimator.estimate_property(types, sev, n_samples=20_000, seed=7)
+    assert a == b
+    assert a["n_defects"] == 30
+    assert a["p5_usd"] < a["p50_usd"] < a["p95_usd"]
+    assert a["p50_usd"] == pytest.approx(a["expected_usd"], rel=0.005)
+    # Independent defects: the property band is far tighter than the per-defect +/-15%
+    assert a["p95_usd"] < a["expected_usd"] * 1.15 and a["p5_usd"] > a["expected_usd"] * 0.85
+
+def test_estimate_property_single_defect_spans_estimate_band():
+    est = CostEstimator.estimate_repair("roof_leak", 55, 1.0)
+    out = CostEstimator.estimate_property(["roof_leak"], [55], n_samples=50_000, seed=1, percentiles=(0.5, 99.5))
+    assert out["p0.5_usd"] == pytest.approx(est["min_estimate_usd"], rel=0.01)
+    assert out["p99.5_usd"] == pytest.approx(est["max_estimate_usd"], rel=0.01)
+
+# 13. Test Batch Validator
+from backend.validators import validate_cortex_output_batch, FALLBACK_DEFECT
+
+GOOD_ROW = '{"defect": "Crack", "severity": 50, "visual_description": "Bad crack", "recommended_fix": "Fill it"}'
+
+def test_batch_validator_fast_path_handles_fences_and_prose():
+    rows = [GOOD_ROW, "```json\n" + GOOD_ROW + "\n```", "Here is the analysis: " + GOOD_ROW + " Hope this helps."]
+    records, errors = validate_cortex_output_batch(rows)
+    assert errors == []
+    assert [r["defect"] for r in records] == ["Crack"] * 3
+
+def test_batch_validator_reports_row_errors_without_printing(capsys):
+    rows = [GOOD_ROW, "no json here", '{"defect": "Crack", "severity": 50', '{"defect": "Crack"}', GOOD_ROW + GOOD_ROW]
+    records, errors = validate_cortex_output_batch(rows)
+    assert capsys.readouterr().out == ""
+    assert records[0]["defect"] == "Crack"
+    assert all(r == FALLBACK_DEFECT for r in records[1:])
+    assert [(e["row"], e["stage"]) for e in errors] == [(1, "extract"), (2, "extract"), (3, "validate"), (4, "parse")]
+
+def test_batch_validator_orjson_path_matches_default():
+    pytest.importorskip("orjson")
+    rows = [GOOD_ROW, "junk", '{"defect": "Mold", "severity": 70, "visual_description": "x", "recommended_fix": "y"}']
+    assert validate_cortex_output_batch(rows, use_orjson=True)[0] == validate_cortex_output_batch(rows)[0]
+
+# 14. Test Schema-Constrained Repair
+from backend.validators import repair_cortex_output, get_repair_stats, reset_repair_stats
+
+def test_repair_coerces_severity_words_strings_and_range():
+    reset_repair_stats()
+    base = '{"defect": "Crack", "severity": %s, "visual_description": "Bad crack", "recommended_fix": "Fill it"}'
+    assert validate_cortex_output(base % '"HIGH"')["severity"] == 65
+    assert validate_cortex_output(base % '"75%"')["severity"] == 75
+    assert validate_cortex_output(base % '140')["severity"] == 100
+    assert validate_cortex_output(base % '42.6')["severity"] == 43
+    stats = get_repair_stats()
+    assert stats["salvaged"] == 4
+    assert stats["severity_word"] == stats["severity_numeric_string"] == stats["severity_clamped"] == stats["severity_rounded"] == 1
+
+def test_repair_closes_truncated_json():
+    reset_repair_stats()
+    truncated = '```json\n{"defect": "Mold", "severity": 70, "visual_description": "Black spots", "recommended_fix": "Remediate and dry'
+    result = validate_cortex_output(truncated)
+    assert result["defect"] == "Mold" and result["recommended_fix"] == "Remediate and dry"
+    dangling = '{"defect": "Leak", "severity": 30, "visual_description": "Stain", "recommended_fix": "Patch", "notes": "'
+    assert repair_cortex_output(dangling)["defect"] == "Leak"
+    dangling_key = '{"defect": "Leak", "severity": 30, "visual_description": "Stain", "recommended_fix": "Patch", "no'
+    assert repair_cortex_output(dangling_key)["defect"] == "Leak"
+    assert get_repair_stats()["truncated_json"] == 3
+
+def test_repair_never_invents_missing_fields():
+    reset_repair_stats()
+    assert repair_cortex_output('{"defect": "Crack", "severity": "HIGH"}') is None
+    assert repair_cortex_output('{"defect": "Crack", "severity": "very bad", "visual_description": "x", "recommended_fix": "y"}') is None
+    assert get_repair_stats() == {"unrecoverable": 2}
+
+def test_batch_validator_salvages_repairable_rows():
+    rows = [GOOD_ROW, GOOD_ROW.replace("50", '"moderate"'), '{"defect": "Crack"}']
+    records, errors = validate_cortex_output_batch(rows)
+    assert records[1]["severity"] == 35
+    assert [e["row"] for e in errors] == [2]
+
+# 15. Test Vision Analysis Cache
+from backend.analysis_cache import AnalysisCache, image_content_hash
+
+def test_analysis_cache_skips_model_for_duplicate_images(tmp_path):
+    cache = AnalysisCache(str(tmp_path))
+    calls = []
+    def fake_model(image):
+        calls.append(image)
+        return GOOD_ROW
+    photo = b"\x89PNG fake bytes"
+    path = tmp_path / "copy.png"
+    path.write_bytes(photo)
+
+    assert cache.get_or_analyze(photo, fake_model) == GOOD_ROW
+    assert cache.get_or_analyze(str(path), fake_model) == GOOD_ROW  # same content, different upload
+    assert cache.get_or_analyze(b"other photo", fake_model) == GOOD_ROW
+    assert len(calls) == 2
+    assert cache.stats() == {"hits": 1, "misses": 2, "hit_rate": 1 / 3}
+    assert image_content_hash(photo) == image_content_hash(str(path))
+
+def test_analysis_cache_key_includes_model_and_prompt_version(tmp_path):
+    AnalysisCache(str(tmp_path)).put(image_content_hash(b"img"), GOOD_ROW)
+    assert AnalysisCache(str(tmp_path)).get(image_content_hash(b"img")) == GOOD_ROW
+    assert AnalysisCache(str(tmp_path), prompt_version="v2").get(image_content_hash(b"img")) is None
+    assert AnalysisCache(str(tmp_path), model="other-model").get(image_content_hash(b"img")) is None
+
+# 16. Test Incremental Pipeline (local harness)
+import json as _json
+from backend.pipeline import LocalStage, run_local_pipeline, parse_asset_path
+
+def _fake_stage(root, files):
+    for rel, content in files.items():
+        path = root / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(content)
+
+def test_local_pipeline_processes_only_new_files(tmp_path):
+    stage_dir = tmp_path / "stage"
+    _fake_stage(stage_dir, {
+        "Maple/Kitchen/a.jpg": b"img-a", "Maple/Kitchen/b.jpg": b"img-b",
+        "Maple/Bath/c.png": b"img-c", "Maple/Bath/notes.txt": b"ignored",
+    })
+    results = tmp_path / "results.jsonl"
+    calls = []
+    def model(path):
+        calls.append(path)
+        return "not json" if path.endswith("c.png") else GOOD_ROW
+
+    first = run_local_pipeline(LocalStage(str(stage_dir)), model, str(results), batch_size=2)
+    assert first == {"files": 3, "batches": 2, "invalid": 1, "cache_hits": 0, "near_duplicates": 0}
+
+    _fake_stage(stage_dir, {"Maple/Living/d.jpg": b"img-d"})
+    second = run_local_pipeline(LocalStage(str(stage_dir)), model, str(results), batch_size=2)
+    assert second["files"] == 1
+    assert len(calls) == 4
+    assert run_local_pipeline(LocalStage(str(stage_dir)), model, str(results))["files"] == 0
+
+    rows = [_json.loads(line) for line in results.read_text().splitlines()]
+    assert sorted(r["FILE_NAME"] for r in rows) == ["Maple/Bath/c.png", "Maple/Kitchen/a.jpg", "Maple/Kitchen/b.jpg", "Maple/Living/d.jpg"]
+    bath = next(r for r in rows if r["ROOM"] == "Bath")
+    assert bath["IS_VALID"] is False and bath["DEFECT"] == FALLBACK_DEFECT["defect"]
+    assert {r["PROPERTY_ID"] for r in rows} == {"Maple"}
+
+def test_local_pipeline_duplicates_hit_cache(tmp_path):
+    stage_dir = tmp_path / "stage"
+    _fake_stage(stage_dir, {"P/Kitchen/1.jpg": b"same", "P/Kitchen/2.jpg": b"same", "P/Bath/3.jpg": b"other"})
+    calls = []
+    cache = AnalysisCache(str(tmp_path / "cache"))
+    summary = run_local_pipeline(LocalStage(str(stage_dir)), lambda p: calls.append(p) or GOOD_ROW,
+                                 str(tmp_path / "out.jsonl"), cache=cache)
+    assert len(calls) == 2
+    assert summary["cache_hits"] == 1
+    assert parse_asset_path("loose.jpg") == ("Unassigned", "Unassigned")
+
+class _FakeStageFiles:
+    """session.file stand-in: streams files from a {relative path: bytes} dict."""
+    def __init__(self, files):
+        self.files = files
+
+    def get_stream(self, stage_location):
+        return io.BytesIO(self.files[stage_location.split("/", 1)[1]])
+
+class _PipelineSession(FakeSession):
+    """Serves one pending batch (all cache hits) and can fail a chosen statement."""
+    def __init__(self, batch, fail_on=None, model_rows=None, files=None, representatives=None):
+        super().__init__()
+        self.batch, self.fail_on, self.model_rows = batch, fail_on, model_rows or []
+        self.representatives = representatives or []
+        self.file = _FakeStageFiles(files or {})
+
+    def sql(self, query, params=None):
+        self.queries.append((query, params))
+        if self.fail_on and self.fail_on in query:
+            raise RuntimeError("warehouse went away")
+        if "LIMIT ?" in query:
+            self.rows = self.batch
+        elif "AI_COMPLETE" in query:
+            self.rows = self.model_rows
+        elif "PHASH IS NOT NULL" in query:
+            self.rows = self.representatives
+        else:
+            self.rows = []
+        return self
+
+def _pending(path, md5, cached=GOOD_ROW, attempts=0):
+    return {"RELATIVE_PATH": path, "MD5": md5, "LAST_MODIFIED": None, "ATTEMPTS": attempts, "CACHED_RAW": cached}
+
+def test_warehouse_batch_writes_and_dequeues_in_one_transaction():
+    from backend.pipeline import run_incremental_batch
+    session = _PipelineSession([_pending("P/Bath/1.jpg", "m1"), _pending("P/Bath/2.jpg", "m2")])
+    summary = run_incremental_batch(session, batch_size=2, max_batches=1)
+    assert summary["files"] == 2 and summary["cache_hits"] == 2
+    statements = [q.split()[0] for q, _ in session.queries[2:]]
+    assert statements == ["BEGIN;", "INSERT", "DELETE", "COMMIT;"]
+    delete, params = session.queries[4]
+    assert "P.MD5 = D.MD5" in delete and params == ["P/Bath/1.jpg", "m1", "P/Bath/2.jpg", "m2"]
+
+def test_warehouse_batch_keeps_assets_without_model_result_queued():
+    from backend.pipeline import run_incremental_batch
+    session = _PipelineSession([_pending("P/Bath/1.jpg", "m1", cached=None), _pending("P/Bath/2.jpg", "m2", cached=None)],
+                               model_rows=[{"CONTENT_HASH": "m1", "AI_ANALYSIS_RAW": None},
+                                           {"CONTENT_HASH": "m2", "AI_ANALYSIS_RAW": GOOD_ROW}])
+    summary = run_incremental_batch(session, batch_size=2)  # stops instead of re-fetching m1
+    assert summary["files"] == 1 and summary["deferred"] == 1 and summary["invalid"] == 0
+    merge = next(p for q, p in session.queries if "MERGE INTO ANALYSIS_CACHE" in q)
+    assert merge == ["m2", GOOD_ROW]  # empty results are never cached
+    delete = next(p for q, p in session.queries if q.lstrip().startswith("DELETE"))
+    assert delete == ["P/Bath/2.jpg", "m2"]
+    update = next(p for q, p in session.queries if "SET ATTEMPTS" in q)
+    assert update == ["P/Bath/1.jpg", "m1"]
+
+def test_warehouse_batch_gives_up_after_max_attempts():
+    from backend.pipeline import MAX_ANALYSIS_ATTEMPTS, run_incremental_batch
+    session = _PipelineSession([_pending("P/Bath/1.jpg", "m1", cached=None, attempts=MAX_ANALYSIS_ATTEMPTS - 1)],
+                               model_rows=[{"CONTENT_HASH": "m1", "AI_ANALYSIS_RAW": None}])
+    summary = run_incremental_batch(session, batch_size=1, max_batches=1)
+    assert summary["files"] == 1 and summary["invalid"] == 1 and summary["deferred"] == 0
+
+def test_warehouse_batch_rolls_back_when_dequeue_fails():
+    from backend.pipeline import run_incremental_batch
+    session = _PipelineSession([_pending("P/Bath/1.jpg", "m1")], fail_on="DELETE FROM PENDING_ASSETS")
+    with pytest.raises(RuntimeError):
+        run_incremental_batch(session, batch_size=1, max_batches=1)
+    assert session.queries[-1][0] == "ROLLBACK;"
+    assert not any(q.startswith("COMMIT") for q, _ in session.queries)
+
+# 17. Test Ingest Image Preprocessing
+import io
+from PIL import Image
+from backend.image_preprocessing import preprocess_upload, MODEL_MAX_SIDE, UI_SIZE
+
+def _jpeg_bytes(size=(3000, 2000), orientation=None):
+    img = Image.new("RGB", size, (180, 120, 60))
+    img.paste((20, 40, 200), (0, 0, size[0] // 3, size[1] // 2))
+    buf = io.BytesIO()
+    exif = Image.Exif()
+    if orientation:
+        exif[0x0112] = orientation
+    img.save(buf, "JPEG", exif=exif.tobytes())
+    return buf.getvalue()
+
+def test_preprocess_upload_creates_variants(tmp_path):
+    meta = preprocess_upload(_jpeg_bytes(), out_dir=str(tmp_path), filename="wall.JPG")
+    assert (meta["width"], meta["height"]) == (3000, 2000)
+    assert meta["original_path"].endswith("original.jpg")
+    assert max(Image.open(meta["model_path"]).size) <= MODEL_MAX_SIDE
+    assert Image.open(meta["ui_path"]).size == UI_SIZE
+    assert len(meta["phash"]) == 16
+
+def test_preprocess_upload_applies_exif_and_is_idempotent(tmp_path):
+    data = _jpeg_bytes(orientation=6)  # rotated 90 degrees
+    meta = preprocess_upload(data, out_dir=str(tmp_path))
+    assert (meta["width"], meta["height"]) == (2000, 3000)
+    model_w, model_h = Image.open(meta["model_path"]).size
+    assert model_h > model_w
+    mtime = os.path.getmtime(meta["model_path"])
+    assert preprocess_upload(io.BytesIO(data), out_dir=str(tmp_path)) == meta
+    assert os.path.getmtime(meta["model_path"]) == mtime
+
+# 18. Test Near-Duplicate Detection
+from backend.dedup import MultiIndexHash, dedupe_images, hamming_distance, phash_batch
+from backend.image_preprocessing import perceptual_hash
+
+def _scene(seed, size=(320, 240)):
+    rng = np.random.default_rng(seed)
+    coarse = rng.integers(0, 255, size=(6, 8, 3), dtype=np.uint8)
+    return Image.fromarray(coarse).resize(size, Image.Resampling.BICUBIC)
+
+def _reshoot(img, brightness=12):
+    buf = io.BytesIO()
+    shifted = np.clip(np.asarray(img, dtype=np.int16) + brightness, 0, 255).astype(np.uint8)
+    Image.fromarray(shifted).resize((300, 225)).save(buf, "JPEG", quality=70)
+    return Image.open(io.BytesIO(buf.getvalue()))
+
+def test_dedupe_images_keeps_one_representative_per_cluster():
+    a, b = _scene(1), _scene(2)
+    result = dedupe_images([a, _reshoot(a), b, _reshoot(a, -10), _reshoot(b)])
+    assert result["labels"].tolist() == [0, 0, 2, 0, 2]
+    assert result["representatives"].tolist() == [0, 2]
+    assert perceptual_hash(a) == f"{int(phash_batch([a])[0]):016x}"
+
+def test_multi_index_hash_matches_brute_force():
+    rng = np.random.default_rng(0)
+    hashes = rng.integers(0, 2**63, size=2000, dtype=np.int64).astype(np.uint64)
+    hashes[1000:1100] = hashes[:100] ^ np.uint64(0b1011)  # 3-bit neighbours
+    index = MultiIndexHash(max_distance=6)
+    for i, h in enumerate(hashes):
+        index.add(h, i)
+    for q in (0, 5, 1500):
+        expected = sorted(np.flatnonzero(hamming_distance(hashes, hashes[q]) <= 6).tolist())
+        assert sorted(key for _, key in index.query(hashes[q])) == expected
+
+def _jpeg(img):
+    buf = io.BytesIO()
+    img.convert("RGB").save(buf, "JPEG")
+    return buf.getvalue()
+
+def test_warehouse_batch_sends_only_cluster_representatives_to_model():
+    from backend.pipeline import RESULT_COLUMNS, run_incremental_batch
+    files = {"P/Attic/1.jpg": _jpeg(_scene(7)), "P/Attic/2.jpg": _jpeg(_reshoot(_scene(7))),
+             "P/Attic/3.jpg": _jpeg(_scene(8))}
+    session = _PipelineSession([_pending(path, f"m{i}", cached=None) for i, path in enumerate(files, 1)],
+                               model_rows=[{"CONTENT_HASH": "m1", "AI_ANALYSIS_RAW": GOOD_ROW},
+                                           {"CONTENT_HASH": "m3", "AI_ANALYSIS_RAW": GOOD_ROW}],
+                               files=files)
+    summary = run_incremental_batch(session, batch_size=3, max_batches=1)
+    assert summary["files"] == 3 and summary["near_duplicates"] == 1 and summary["invalid"] == 0
+    model_query, params = next((q, p) for q, p in session.queries if "AI_COMPLETE" in q)
+    assert params[1:] == ["m1", "P/Attic/1.jpg", "m3", "P/Attic/3.jpg"]
+    insert = next(p for q, p in session.queries if q.startswith("INSERT INTO INSPECTION_RESULTS"))
+    rows = [dict(zip(RESULT_COLUMNS, insert[i:i + len(RESULT_COLUMNS)]))
+            for i in range(0, len(insert), len(RESULT_COLUMNS))]
+    assert [r["DUPLICATE_OF"] for r in rows] == [None, "P/Attic/1.jpg", None]
+    assert rows[1]["AI_ANALYSIS_RAW"] == GOOD_ROW and rows[1]["CACHE_HIT"] is False
+    assert all(len(r["PHASH"]) == 16 and len(r["DHASH"]) == 16 for r in rows)
+
+def test_warehouse_batch_reuses_representative_from_earlier_run():
+    from backend.dedup import image_hashes
+    from backend.pipeline import run_incremental_batch
+    phashes, dhashes = image_hashes([_scene(7)])
+    stored = {"PROPERTY_ID": "P", "FILE_NAME": "P/Attic/1.jpg", "PHASH": f"{int(phashes[0]):016x}",
+              "DHASH": f"{int(dhashes[0]):016x}", "AI_ANALYSIS_RAW": GOOD_ROW}
+    session = _PipelineSession([_pending("P/Attic/2.jpg", "m2", cached=None)],
+                               files={"P/Attic/2.jpg": _jpeg(_reshoot(_scene(7)))}, representatives=[stored])
+    summary = run_incremental_batch(session, batch_size=1, max_batches=1)
+    assert summary["near_duplicates"] == 1 and summary["invalid"] == 0
+    assert not any("AI_COMPLETE" in q for q, _ in session.queries)
+    reps_query, params = next((q, p) for q, p in session.queries if "PHASH IS NOT NULL" in q)
+    assert params == ["P"]
+
+def test_local_pipeline_reuses_near_duplicate_analysis(tmp_path):
+    stage_dir = tmp_path / "stage"
+    shots = {}
+    for name, img in {"P/Attic/1.jpg": _scene(7), "P/Attic/2.jpg": _reshoot(_scene(7)), "P/Attic/3.jpg": _scene(8)}.items():
+        buf = io.BytesIO()
+        img.convert("RGB").save(buf, "JPEG")
+        shots[name] = buf.getvalue()
+    _fake_stage(stage_dir, shots)
+    calls = []
+    results = tmp_path / "out.jsonl"
+    summary = run_local_pipeline(LocalStage(str(stage_dir)), lambda p: calls.append(p) or GOOD_ROW,
+                                 str(results), batch_size=2, near_duplicate_distance=10)
+    assert len(calls) == 2 and summary["cache_hits"] == 0 and summary["near_duplicates"] == 1
+    rows = {r["FILE_NAME"]: r for r in map(_json.loads, results.read_text().splitlines())}
+    assert rows["P/Attic/2.jpg"]["DUPLICATE_OF"] == "P/Attic/1.jpg"
+    assert rows["P/Attic/2.jpg"]["CACHE_HIT"] is False  # not an exact-content hit
+    assert rows["P/Attic/3.jpg"]["DUPLICATE_OF"] is None
+
+def test_pipeline_imports_without_image_packages():
+    # Image packages are only needed once a run hashes images; the handler module imports without them.
+    import subprocess
+    code = ("import sys; sys.modules.update(dict.fromkeys(['numpy', 'PIL', 'scipy', 'scipy.fft'])); "
+            "import backend.pipeline; print('backend.dedup' in sys.modules)")
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                         cwd=os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+    assert out.stdout.strip() == "False", out.stderr
+
+# 19. Test Theme Markup (static background)
+from frontend.theme import background_html, theme_markup, STATIC_URL
+
+def test_theme_references_static_background():
+    markup = theme_markup(static_serving=True)
+    assert f"{STATIC_URL}/background_frame.png" in markup
+    assert "base64" not in markup and len(markup) < 50_000
+
+def test_theme_inline_fallback(tmp_path):
+    assert "data:image/png;base64," in background_html(static_serving=False)
+    assert "linear-gradient" in background_html(static_dir=str(tmp_path))
+
+# 20. Test Resized Image Cache
+from backend.image_cache import ResizedImageCache
+
+def test_resized_image_cache_hits_and_invalidates(tmp_path):
+    path = tmp_path / "room.png"
+    Image.new("RGB", (2400, 1600), (10, 20, 30)).save(path)
+    cache = ResizedImageCache()
+    assert cache.warm([str(path), str(tmp_path / "missing.png")]) == 1
+    img = cache.get_path(str(path))
+    assert img.size == UI_SIZE and cache.get_path(str(path)) is img
+    assert cache.stats()["hits"] == 2 and cache.stats()["misses"] == 1
+
+    Image.new("RGB", (2400, 1600), (200, 20, 30)).save(path)
+    os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 10**9))
+    assert cache.get_path(str(path)).getpixel((0, 0)) == (200, 20, 30)
+
+def test_resized_image_cache_evicts_least_recent():
+    one = 100 * 100 * 3
+    cache = ResizedImageCache(max_bytes=2 * one)
+    loads = []
+    def loader(key):
+        return lambda: loads.append(key) or Image.new("RGB", (400, 400))
+    for key in ("a", "b", "a", "c"):
+        cache.get_image(key, (100, 100), loader(key))
+    assert len(cache) == 2 and cache.stats()["bytes"] == 2 * one
+    cache.get_image("a", (100, 100), loader("a"))
+    cache.get_image("b", (100, 100), loader("b"))
+    assert loads == ["a", "b", "c", "b"]
+
+# 21. Test Dashboard Data Layer
+from backend.dashboard_data import (
+    PROPERTY_AGGREGATE_SQL, create_demo_database, defect_cost_key, load_property_dashboard,
+)
+
+def test_dashboard_demo_aggregates_per_room():
+    stats = load_property_dashboard(create_demo_database(), "123 Maple Street")
+    assert stats["Bedroom"] == {"score": 100, "defects": 0, "cost_usd": 0.0, "serious": 0}
+    assert stats["Kitchen"]["defects"] == 3 and stats["Kitchen"]["serious"] == 1
+    assert stats["Bath"]["score"] < stats["Kitchen"]["score"]
+    assert stats["Living"]["cost_usd"] == 2250.0  # structural_crack, moderate band
+    assert defect_cost_key("Missing GFCI outlet") == "electrical_issue"
+
+def test_dashboard_excludes_duplicates_and_invalid_rows():
+    conn = create_demo_database([("P", "Bath", "Black mold", 90)])
+    conn.execute("INSERT INTO INSPECTION_RESULTS VALUES ('b', 'P', 'Bath', 'Black mold', 90, 1, 'a')")
+    conn.execute("INSERT INTO INSPECTION_RESULTS VALUES ('c', 'P', 'Bath', 'Pending', 0, 0, NULL)")
+    assert load_property_dashboard(conn, "P")["Bath"]["defects"] == 1
+
+def test_dashboard_issues_one_query_per_property():
+    session = FakeSession([
+        {"ROOM": "Kitchen", "DEFECT": "Water stain", "SEVERITY": 40, "N": 2},
+        {"ROOM": "Bath", "DEFECT": "Roof leak", "SEVERITY": 90, "N": 1},
+    ])
+    stats = load_property_dashboard(session, "123 Maple Street")
+    assert session.queries == [(PROPERTY_AGGREGATE_SQL, ["123 Maple Street"])]
+    assert stats["Kitchen"] == {"score": 92, "defects": 2, "cost_usd": 1500.0, "serious": 0}
+    assert stats["Bath"]["serious"] == 1
+
+# 22. Test Session Pool
+import threading
+from backend.session_manager import MockSession, SessionPool, is_connection_error
+
+def test_session_pool_reuses_sessions_across_threads():
+    created = []
+    pool = SessionPool(lambda: created.append(MockSession()) or created[-1], size=2)
+    barrier = threading.Barrier(6)
+    def worker():
+        barrier.wait()
+        for _ in range(5):
+            pool.run(lambda s: s.sql("SELECT 1").collect())
+    threads = [threading.Thread(target=worker) for _ in range(6)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert 1 <= len(created) <= 2
+    assert sum(len(s.queries) for s in created) == 30
+    assert pool.stats()["idle"] == len(created)
+
+def test_session_pool_reconnects_expired_sessions():
+    created = []
+    pool = SessionPool(lambda: created.append(MockSession([("ROOM", [{"N": 1}])])) or created[-1], size=1)
+    with pool.session() as s:
+        s.expire()
+    assert pool.run(lambda s: s.sql("SELECT ROOM").collect()) == [{"N": 1}]
+    assert len(created) == 2 and created[0].closed and pool.stats()["reconnects"] == 1
+
+    pool.health_check_interval = 0.0
+    created[1].expire()  # dies while idle: caught by the health check, not the caller
+    assert pool.run(lambda s: s.sql("SELECT ROOM").collect()) == [{"N": 1}]
+    assert len(created) == 3
+    assert not is_connection_error(ValueError("SQL compilation error: invalid identifier"))
+
+def test_session_pool_wakes_waiter_when_a_dead_session_is_discarded():
+    created = []
+    pool = SessionPool(lambda: created.append(MockSession()) or created[-1], size=1, acquire_timeout=5.0)
+    holding, waiter_got = threading.Event(), []
+    def waiter():
+        holding.wait()
+        t0 = time.monotonic()
+        waiter_got.append(pool.run(lambda s: s.sql("SELECT 1").collect() or s.id))
+        waiter_got.append(time.monotonic() - t0)
+    thread = threading.Thread(target=waiter)
+    thread.start()
+    with pytest.raises(RuntimeError):
+        with pool.session() as s:
+            holding.set()
+            time.sleep(0.2)  # the waiter is now blocked on the only slot
+            s.expire()
+            s.sql("SELECT 1")
+    thread.join(timeout=5.0)
+    assert waiter_got and waiter_got[0] == created[1].id and waiter_got[1] < 2.0
+    assert pool.stats() == {"size": 1, "open": 1, "idle": 1, "reconnects": 1}
+
+def test_dashboard_reads_through_session_pool():
+    session = MockSession([("INSPECTION_RESULTS", [{"ROOM": "Bath", "DEFECT": "Mold", "SEVERITY": 90, "N": 1}])])
+    stats = load_property_dashboard(SessionPool(lambda: session), "P")
+    assert stats["Bath"]["serious"] == 1 and session.queries[0][1] == ["P"]
+
+# 23. Test Video Job API (fake Higgsfield server)
+import backend.video_generator as video_generator
+from backend.fake_higgsfield import FakeHiggsfieldServer
+from backend.video_generator import HiggsfieldClient, SUCCEEDED, FAILED
+
+def test_video_jobs_run_concurrently_against_fake_server(tmp_path):
+    image = tmp_path / "wall.png"
+    image.write_bytes(b"png-bytes")
+    done = []
+    with FakeHiggsfieldServer(latency=0.3) as server:
+        client = HiggsfieldClient(api_key="test", base_url=server.url, poll_interval=0.05)
+        t0 = time.perf_counter()
+        jobs = [client.submit(str(image), f"repair {i}", callback=done.append) for i in range(6)]
+        assert time.perf_counter() - t0 < 0.2  # submit never waits on the provider
+        results = [client.result(j, timeout=5) for j in jobs]
+        elapsed = time.perf_counter() - t0
+        failed = client.result(client.submit(str(image), "FAIL please"), timeout=5)
+    assert all(r["state"] == SUCCEEDED and r["video_url"].startswith(server.url) for r in results)
+    assert elapsed < 6 * 0.3  # faster than running the jobs back to back
+    assert failed["state"] == FAILED and "failed" in failed["message"].lower()
+    assert len(done) == 6 and server.requests["submit"] == 7
+
+def test_video_mock_mode_keeps_blocking_wrapper(monkeypatch):
+    monkeypatch.setattr(video_generator, "MOCK_LATENCY_S", 0.0)
+    monkeypatch.delenv("HIGGSFIELD_API_KEY", raising=False)
+    out = HiggsfieldClient().generate_repair_video("wall.png", "pan left")
+    assert out["status"] == "mock_success" and out["video_url"] == video_generator.MOCK_VIDEO_URL
+
+def test_video_finished_jobs_are_bounded_and_forgettable(monkeypatch):
+    monkeypatch.setattr(video_generator, "MOCK_LATENCY_S", 0.0)
+    monkeypatch.delenv("HIGGSFIELD_API_KEY", raising=False)
+    client = HiggsfieldClient(max_finished_jobs=3)
+    jobs = []
+    for i in range(6):
+        jobs.append(client.submit("wall.png", f"pan {i}"))
+        client.result(jobs[-1], timeout=5)
+    time.sleep(0.05)  # done-callbacks run just after result() returns
+    assert len(client._jobs) == len(client._futures) == 3
+    assert client.status(jobs[-1])["state"] == SUCCEEDED
+    assert client.forget(jobs[-1]) and jobs[-1] not in client._jobs
+    assert not client.forget("unknown")
+    for lookup in (client.result, client.future, client.status):
+        with pytest.raises(KeyError, match="forgotten"):
+            lookup(jobs[0])  # retired when newer jobs finished
+
+# 24. Test Video Transport (pooling, retries, streaming)
+import tracemalloc
+from backend.video_generator import MultipartFileStream
+
+def test_multipart_stream_matches_declared_length(tmp_path):
+    image = tmp_path / "wall.png"
+    image.write_bytes(os.urandom(200_000))
+    body = MultipartFileStream({"prompt": "pan left"}, "image", str(image))
+    data = b"".join(iter(lambda: body.read(8192), b""))
+    assert len(data) == len(body)
+    assert b'name="prompt"\r\n\r\npan left\r\n' in data and image.read_bytes() in data
+
+def test_retry_after_is_capped():
+    import requests
+    from backend.video_generator import RETRY_MAX_S, _retry_delay
+    response = requests.Response()
+    response.headers["Retry-After"] = "3600"
+    assert _retry_delay(0, response) == RETRY_MAX_S
+    response.headers["Retry-After"] = "1.5"
+    assert _retry_delay(0, response) == 1.5
+
+def test_video_transport_retries_and_reuses_connections(tmp_path):
+    image = tmp_path / "wall.png"
+    image.write_bytes(b"png")
+    with FakeHiggsfieldServer(latency=0.1, throttle=3) as server:
+        client = HiggsfieldClient(api_key="test", base_url=server.url, poll_interval=0.02,
+                                  max_workers=1, video_dir=str(tmp_path / "videos"))
+        results = [client.result(client.submit(str(image), f"pan {i}"), timeout=10) for i in range(3)]
+    assert all(r["state"] == SUCCEEDED for r in results)
+    assert server.requests["throttled"] == 3 and server.requests["submit"] == 3
+    assert server.connections == 1  # one keep-alive connection for every POST and poll
+
+def test_video_submit_is_not_retried_after_provider_accepts(tmp_path):
+    image = tmp_path / "wall.png"
+    image.write_bytes(b"png")
+    with FakeHiggsfieldServer(latency=0.05, fail_after_submit=1) as server:
+        client = HiggsfieldClient(api_key="test", base_url=server.url, poll_interval=0.02)
+        final = client.result(client.submit(str(image), "pan left"), timeout=10)
+    assert final["state"] == FAILED and "503" in final["message"]
+    assert server.requests["submit"] == 1  # no second paid generation
+
+def test_video_submit_retries_when_provider_unreachable(tmp_path, monkeypatch):
+    image = tmp_path / "wall.png"
+    image.write_bytes(b"png")
+    monkeypatch.setattr(video_generator, "RETRY_BASE_S", 0.0)
+    client = HiggsfieldClient(api_key="test", base_url="http://127.0.0.1:1", poll_interval=0.02)
+    attempts = []
+    send = client.http.request
+    client.http.request = lambda *a, **kw: attempts.append(a[0]) or send(*a, **kw)
+    final = client.result(client.submit(str(image), "pan left"), timeout=10)
+    assert final["state"] == FAILED
+    assert attempts == ["POST"] * (video_generator.MAX_RETRIES + 1)
+
+def test_video_upload_and_download_stream_with_flat_memory(tmp_path):
+    image = tmp_path / "huge.png"
+    with open(image, "wb") as f:
+        f.truncate(24 * 1024 * 1024)
+    with FakeHiggsfieldServer(latency=0.05, video_bytes=32 * 1024 * 1024) as server:
+        client = HiggsfieldClient(api_key="test", base_url=server.url, poll_interval=0.02,
+                                  video_dir=str(tmp_path / "videos"))
+        tracemalloc.start()
+        job = client.submit(str(image), "pan left", download=True)
+        final = client.result(job, timeout=30)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        assert client.download_video(job) == final["local_path"]
+    assert final["state"] == SUCCEEDED
+    assert os.path.getsize(final["local_path"]) == 32 * 1024 * 1024
+    assert server.jobs[final["provider_id"]]["bytes"] > 24 * 1024 * 1024
+    assert peak < 8 * 1024 * 1024
+    assert server.requests["download"] == 1
+
+# 25. Test Video Result Cache & Request Coalescing
+from backend.video_cache import VideoResultCache
+
+def test_video_cache_serves_repeat_requests_without_upstream_call(tmp_path):
+    image = tmp_path / "wall.png"
+    image.write_bytes(b"png")
+    cache = VideoResultCache(str(tmp_path / "cache"))
+    with FakeHiggsfieldServer(latency=0.05) as server:
+        client = HiggsfieldClient(api_key="test", base_url=server.url, poll_interval=0.02, cache=cache)
+        first = client.result(client.submit(str(image), "pan left", download=True), timeout=10)
+        # A fresh client (e.g. after an app restart) still hits the on-disk cache.
+        client = HiggsfieldClient(api_key="test", base_url=server.url, poll_interval=0.02, cache=cache)
+        again = client.result(client.submit(str(image), "pan left", download=True), timeout=10)
+        other = client.result(client.submit(str(image), "pan right"), timeout=10)
+    assert first["state"] == again["state"] == other["state"] == SUCCEEDED
+    assert again["local_path"] == first["local_path"] and os.path.exists(again["local_path"])
+    # Cacheable results are always downloaded: cache entries never rely on provider URLs.
+    assert server.requests["submit"] == 2 and server.requests["download"] == 2
+    assert other["local_path"] and os.path.exists(other["local_path"])
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+def test_video_identical_inflight_requests_are_coalesced(tmp_path):
+    image = tmp_path / "wall.png"
+    image.write_bytes(b"png")
+    cache = VideoResultCache(str(tmp_path / "cache"))
+    with FakeHiggsfieldServer(latency=0.3) as server:
+        client = HiggsfieldClient(api_key="test", base_url=server.url, poll_interval=0.02, cache=cache)
+        ids = [None] * 8
+        def submit(i):
+            ids[i] = client.submit(str(image), "pan left")
+        threads = [threading.Thread(target=submit, args=(i,)) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        final = client.result(ids[0], timeout=10)
+    assert len(set(ids)) == 1 and final["state"] == SUCCEEDED
+    assert server.requests["submit"] == 1
+    stats = cache.stats()
+    assert stats["coalesced"] == 7 and stats["generations_avoided"] == 7
+
+def test_video_coalesced_download_request_gets_the_file(tmp_path):
+    image = tmp_path / "wall.png"
+    image.write_bytes(b"png")
+    cache = VideoResultCache(str(tmp_path / "cache"))
+    with FakeHiggsfieldServer(latency=0.2) as server:
+        client = HiggsfieldClient(api_key="test", base_url=server.url, poll_interval=0.02, cache=cache)
+        first = client.submit(str(image), "pan left")
+        second = client.submit(str(image), "pan left", download=True)
+        final = client.result(second, timeout=10)
+    assert second == first and final["state"] == SUCCEEDED
+    assert final["local_path"] and os.path.exists(final["local_path"])
+    assert server.requests["submit"] == 1 and server.requests["download"] == 1
+
+def test_video_cache_lookup_does_not_block_other_submits(tmp_path):
+    image = tmp_path / "wall.png"
+    image.write_bytes(b"png")
+    entered, release = threading.Event(), threading.Event()
+    class SlowDiskCache(VideoResultCache):
+        def get(self, key):
+            entered.set()
+            release.wait(5)
+            return super().get(key)
+    cache = SlowDiskCache(str(tmp_path / "cache"))
+    with FakeHiggsfieldServer(latency=0.05) as server:
+        client = HiggsfieldClient(api_key="test", base_url=server.url, poll_interval=0.02, cache=cache)
+        first = []
+        thread = threading.Thread(target=lambda: first.append(client.submit(str(image), "pan left")))
+        thread.start()
+        entered.wait(5)
+        t0 = time.monotonic()
+        second = client.submit(str(image), "pan left")  # coalesces while the first lookup is on disk
+        elapsed = time.monotonic() - t0
+        release.set()
+        thread.join()
+        final = client.result(second, timeout=10)
+    assert elapsed < 1.0 and first == [second] and final["state"] == SUCCEEDED
+    assert server.requests["submit"] == 1
+
+def test_video_missing_image_fails_the_job(tmp_path):
+    client = HiggsfieldClient(api_key="test", base_url="http://127.0.0.1:9",
+                              cache=VideoResultCache(str(tmp_path / "cache")))
+    final = client.result(client.submit(str(tmp_path / "missing.png"), "pan left"), timeout=5)
+    assert final["state"] == FAILED and "missing.png" in final["message"]
+
+def test_video_cache_record_without_video_is_stale(tmp_path):
+    cache = VideoResultCache(str(tmp_path))
+    key = cache.key("hash", "pan left", "dop-v1")
+    cache.put(key, {"state": SUCCEEDED, "video_url": "https://signed.example/expired.mp4"})
+    assert cache.get(key) is None and cache.stats()["misses"] == 1
+
+def test_video_failures_are_not_cached(tmp_path):
+    image = tmp_path / "wall.png"
+    image.write_bytes(b"png")
+    cache = VideoResultCache(str(tmp_path / "cache"))
+    with FakeHiggsfieldServer(latency=0.05) as server:
+        client = HiggsfieldClient(api_key="test", base_url=server.url, poll_interval=0.02, cache=cache)
+        for _ in range(2):
+            assert client.result(client.submit(str(image), "FAIL"), timeout=10)["state"] == FAILED
+    assert server.requests["submit"] == 2
+
+def test_video_cache_evicts_least_recently_used(tmp_path):
+    cache = VideoResultCache(str(tmp_path), max_bytes=3000)
+    keys = [cache.key(f"hash{i}", "pan left", "dop-v1") for i in range(3)]
+    for i, key in enumerate(keys):
+        with open(cache.video_path(key), "wb") as f:
+            f.write(bytes(1200))
+        os.utime(cache.video_path(key), (i, i))
+        cache.put(key, {"state": SUCCEEDED, "video_url": f"https://v/{i}.mp4"})
+        os.utime(os.path.join(str(tmp_path), f"{key}.json"), (i, i))
+    assert cache.get(keys[0]) is None  # oldest entry evicted once the third pushed it over budget
+    assert cache.get(keys[2])["local_path"] == cache.video_path(keys[2])
+
+# 26. Test PDF Report Generation (in-memory, concurrent)
+from concurrent.futures import ThreadPoolExecutor
+import re
+import zlib
+from backend.report_generator import generate_inspection_report, render_inspection_report
+
+def _pdf_text(pdf: bytes) -> bytes:
+    """Inflated page content streams (fpdf compresses them)."""
+    return b"".join(zlib.decompress(m) for m in re.findall(rb"stream\n(.*?)\nendstream", pdf, re.DOTALL))
+
+def test_report_renders_in_memory():
+    pdf = render_inspection_report("123 Maple Street", {"Kitchen": "2 defects"})
+    assert pdf.startswith(b"%PDF") and pdf.rstrip().endswith(b"%%EOF")
+    assert b"123 Maple Street" in _pdf_text(pdf) and b"Kitchen: 2 defects" in _pdf_text(pdf)
+
+def test_report_replaces_characters_outside_latin1():
+    pdf = render_inspection_report("Café “Rue” — 東京", {"Bath": "mold… 🧪"})
+    text = _pdf_text(pdf)
+    assert "Café \"Rue\" - ??".encode("latin-1") in text and b"Bath: mold... ?" in text
+
+def test_report_long_findings_repeat_template_header():
+    pdf = render_inspection_report("Industrial Lofts A", {f"Finding {i}": i for i in range(60)})
+    assert _pdf_text(pdf).count(b"SafeHaven AI Inspection Report") >= 2
+
+def test_concurrent_report_exports_do_not_clobber(tmp_path):
+    def export(i):
+        return i, generate_inspection_report(f"Property {i}", {"Status": f"Export {i}"}, str(tmp_path))
+    with ThreadPoolExecutor(16) as pool:
+        paths = list(pool.map(export, range(64)))
+    assert len({path for _, path in paths}) == 64
+    for i, path in paths:
+        with open(path, "rb") as f:
+            data = _pdf_text(f.read())
+        assert f"Property {i})".encode() in data and f"Export {i})".encode() in data
+
+# 27. Test Portfolio Batch Export
+import zipfile
+from backend.report_generator import export_reports_zip
+
+def test_batch_export_streams_generator_into_zip(tmp_path):
+    records = ((f"{i} Elm Street", {"Status": f"Unit {i}"}) for i in range(40))
+    seen = []
+    summary = export_reports_zip(records, str(tmp_path / "portfolio.zip"), workers=2,
+                                 progress=lambda done, total: seen.append((done, total)))
+    assert summary["reports"] == 40 and summary["failed"] == []
+    assert seen[-1] == (40, None) and [d for d, _ in seen] == list(range(1, 41))
+    with zipfile.ZipFile(tmp_path / "portfolio.zip") as archive:
+        names = archive.namelist()
+        assert names == [f"{i:05d}_{i}_Elm_Street.pdf" for i in range(40)]  # input order
+        assert b"Unit 7)" in _pdf_text(archive.read("00007_7_Elm_Street.pdf"))
+
+def test_batch_export_reports_failures_and_continues(tmp_path):
+    records = [("123 Maple Street", {"Status": "ok"}), ("Casa Rota", None)]  # no findings dict
+    summary = export_reports_zip(records, str(tmp_path / "out.zip"), workers=1)
+    assert summary["reports"] == 1
+    assert [(index, address) for index, address, _ in summary["failed"]] == [(1, "Casa Rota")]
+
+# 28. Test Linear-Time Sanitizer & Batch API
+from backend.utils import sanitize_many
+
+def test_sanitize_strips_blocklisted_tags_and_drops_unclosed_scripts():
+    assert sanitize_input("<script>bad</script>Good") == "Good"
+    assert sanitize_input("<IFRAME src=x>Note</iframe> ok") == "Note ok"
+    assert sanitize_input("a <style\n b>") == "a <style\n b>"  # no '>' on the line: not a tag
+    assert sanitize_input("Leak under sink <script src=x>alert(1)") == "Leak under sink"
+    assert sanitize_input("see <scripture notes, then <scripted retest") == "see <scripture notes, then <scripted retest"
+
+def test_sanitize_keeps_prose_that_only_starts_like_a_tag():
+    note = "Note <scripted retest. Pressure > 30 psi, fine."
+    assert sanitize_input(note) == note
+    assert sanitize_input("<scripture notes>\nline 2") == "<scripture notes>\nline 2"
+    assert sanitize_input("see <linked report> and <metadata> tab") == "see <linked report> and <metadata> tab"
+    assert sanitize_input("<scripted> text <script/>x</script> end") == "<scripted> text  end"
+
+def test_sanitize_adversarial_input_is_linear():
+    payload = "<script " * 150_000 + "<iframe " * 150_000  # ~2.4 MB, no closing '>'
+    t0 = time.perf_counter()
+    assert sanitize_input(payload) == payload.strip()  # no '>' anywhere: nothing is a tag
+    assert sanitize_input(payload + ">") == ""  # one opened, never closed script: dropped
+    assert sanitize_input("x" + "<iframe " * 150_000) == ("x" + "<iframe " * 150_000).strip()
+    assert time.perf_counter() - t0 < 2.0
+
+def test_sanitize_many_keeps_series_index():
+    notes = pd.Series(["ok", "<script>x</script>Mold", None, "ok"], index=[10, 11, 12, 13])
+    clean = sanitize_many(notes)
+    assert list(clean.index) == [10, 11, 12, 13]
+    assert list(clean) == ["ok", "Mold", "", "ok"]
+    assert sanitize_many(["<meta a>b", 3]) == ["b", ""]
@@ -46,6 +46,7 @@ def run_verification():
         pdf_path = generate_inspection_report("123 Test Lane", {"Status": "Verified"})
         if os.path.exists(pdf_path):
             print(f"PASS ✅ (Created {os.path.basename(pdf_path)})")
+            os.remove(pdf_path)
         else:
             print("FAIL ❌ (File not found)")
     except Exception as e: